@@ -7,3 +7,82 @@ TRUST_SERVER_CERT = True
 
 WORKDAY_START_HOUR = 9
 WORKDAY_END_HOUR = 18
+
+# Пул соединений (db.ConnectionPool)
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 10
+POOL_TIMEOUT_SEC = 10.0          # сколько ждать свободное соединение
+POOL_IDLE_TIMEOUT_SEC = 300.0    # простаивающие сверх MIN_SIZE закрываем
+POOL_VALIDATE_AFTER_SEC = 10.0   # SELECT 1 при выдаче, если соединение простаивало дольше
+
+# Индекс интервалов для быстрой проверки конфликтов (services.interval_index)
+INTERVAL_INDEX_ENABLED = True
+INTERVAL_INDEX_LOOKBACK_HOURS = 24   # брони, закончившиеся раньше, не загружаем
+INTERVAL_INDEX_MAX_AGE_SEC = 60.0    # «занято» доверяем, пока данные ресурса свежее
+
+# Аналитика
+ANALYTICS_CHUNK_SIZE = 5000      # строк на fetchmany при загрузке броней
+ANALYTICS_USE_ROLLUPS = False    # длинные периоды считать по dbo.AnalyticsDailyRollups
+ANALYTICS_ROLLUP_MIN_DAYS = 31   # с какой длины периода переключаться на агрегаты
+ANALYTICS_ROLLUP_LAG_SEC = 300   # запас при поиске изменённых броней
+ANALYTICS_CACHE_ENABLED = False  # локальный кэш закрытых месяцев (services.analytics_cache)
+ANALYTICS_CACHE_DIR = "cache/analytics"
+ANALYTICS_CACHE_MAX_MB = 256
+
+# Интерфейс
+UI_WORKERS = 4                   # фоновые потоки для запросов и отчётов (ui.task_runner)
+UI_PAGE_SIZE = 200               # строк, подгружаемых в список броней за раз
+
+# Аутентификация
+BCRYPT_ROUNDS = 12               # при изменении хэши пересчитываются при входе
+
+# Бэкенд БД: "mssql" — SQL Server (параметры выше), "sqlite" — локальный файл
+# для прогонов и бенчмарков без сервера (схема: sql/schema_sqlite.sql,
+# данные: scripts/gen_synthetic.py)
+DB_BACKEND = "mssql"
+SQLITE_PATH = "officebank.sqlite3"
+SQLITE_TIMEOUT_SEC = 10.0        # сколько ждать снятия блокировки записи
+
+# Инструментирование запросов (db.query_stats)
+QUERY_STATS_ENABLED = False
+QUERY_SLOW_MS = 200.0            # медленнее — в лог officebank.sql
+QUERY_STATS_DUMP = ""            # путь JSON-снимка при выходе ("" — не писать)
+QUERY_METRICS_PORT = 0           # >0 — /metrics и /stats.json на 127.0.0.1:порт
+
+# Переиспользование курсоров (db.DB): сколько последних текстов SQL держать
+# с готовым курсором на соединение; 0 — новый курсор на каждый вызов
+DB_CURSOR_CACHE = 32
+
+# Повтор пишущих транзакций при взаимоблокировке/таймауте (db.transactional)
+DB_RETRY_ATTEMPTS = 4            # всего попыток, включая первую
+DB_RETRY_BASE_MS = 50.0          # потолок задержки растёт вдвое с каждой попыткой
+DB_RETRY_MAX_MS = 1000.0
+DB_RETRY_BUDGET_SEC = 5.0        # на все попытки одной операции
+
+# Журнал действий dbo.AuditLogs (services.audit): пишется фоновым потоком пачками
+AUDIT_ENABLED = True
+AUDIT_QUEUE_SIZE = 10000
+AUDIT_BATCH_SIZE = 200
+AUDIT_FLUSH_INTERVAL_SEC = 1.0   # сколько ждать первое событие пачки
+AUDIT_OVERFLOW = "drop"          # очередь полна: "drop" — терять, "block" — ждать AUDIT_BLOCK_TIMEOUT_SEC
+AUDIT_BLOCK_TIMEOUT_SEC = 0.05
+AUDIT_CLOSE_TIMEOUT_SEC = 5.0    # сколько дописывать очередь при выходе
+
+# Уведомления dbo.Notifications (services.notifications): диспетчер в фоне
+NOTIFY_ENABLED = True
+NOTIFY_QUEUE_SIZE = 10000
+NOTIFY_BATCH_SIZE = 200          # броней на пачку (IN-список в запросе получателей)
+NOTIFY_FLUSH_INTERVAL_SEC = 1.0
+NOTIFY_LINGER_SEC = 0.5          # сколько копить пачку: однотипное одному пользователю склеивается
+NOTIFY_OVERFLOW = "drop"         # "drop" или "block" (ждать NOTIFY_BLOCK_TIMEOUT_SEC)
+NOTIFY_BLOCK_TIMEOUT_SEC = 0.05
+NOTIFY_CLOSE_TIMEOUT_SEC = 5.0
+NOTIFY_UNREAD_TTL_SEC = 30.0     # как часто перечитывать счётчик непрочитанных из БД
+UI_NOTIFY_POLL_SEC = 5           # опрос счётчика в окне
+
+# Лента изменений (booking_service.changes_since)
+DB_CHANGES_LAG_SEC = 10          # запас на транзакции, закоммиченные после отметки
+UI_CHANGES_POLL_SEC = 10         # окно опрашивает изменения и обновляет только затронутое
+
+# Согласующий для заявок в закрытую зону (services/approvers.py)
+APPROVER_POLICY = "least_pending"   # "first" — всегда FAC с наименьшим UserID
@@ -1,9 +1,370 @@
 from __future__ import annotations
-import pyodbc
-from dataclasses import dataclass
-from typing import Any, Iterable, Optional
+import json
+import logging
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from functools import lru_cache, wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
 import config
 
+# Бэкенд выбирается config.DB_BACKEND: "mssql" — рабочий SQL Server через pyodbc,
+# "sqlite" — локальный файл для тестов и бенчмарков без сервера и ODBC-драйвера.
+# Сервисы пишут на T-SQL; диалект переводит то немногое, что переводится
+# механически (OFFSET/FETCH, табличные хинты), а многооператорные пакеты
+# (DECLARE, #temp, MERGE ... OUTPUT) сервисы выполняют по шагам, если
+# dialect.tsql_batches ложно.
+
+class Dialect:
+    name = "base"
+    tsql_batches = False       # можно отправлять пакеты T-SQL одним запросом
+    fast_executemany = False   # поддержка pyodbc fast_executemany
+    tables_sql = ""            # COUNT(*) AS cnt таблиц из списка {names}
+
+    def sql(self, text: str) -> str:
+        return text
+
+    def params(self, params: Iterable[Any]) -> tuple:
+        return tuple(params)
+
+    def begin_write(self, db: "DB") -> None:
+        # начать пишущую транзакцию с блокировкой, если диалект это требует
+        pass
+
+    def retryable(self, exc: BaseException) -> bool:
+        # ошибка конкурентного доступа: транзакцию можно откатить и повторить
+        return False
+
+# 40001 — жертва взаимоблокировки (1205), HYT00/HYT01 — таймаут запроса или
+# соединения (conn.timeout), 1222 — истекло ожидание блокировки (LOCK_TIMEOUT)
+_MSSQL_RETRY_STATES = frozenset({"40001", "HYT00", "HYT01"})
+_MSSQL_RETRY_CODES = re.compile(r"\((?:1205|1222)\)")
+
+class MSSQLDialect(Dialect):
+    name = "mssql"
+    tsql_batches = True
+    fast_executemany = True
+    tables_sql = "SELECT COUNT(*) AS cnt FROM sys.tables WHERE name IN ({names})"
+
+    def retryable(self, exc: BaseException) -> bool:
+        # pyodbc кладёт SQLSTATE первым аргументом, номер ошибки сервера — в текст
+        if type(exc).__module__ != "pyodbc":
+            return False
+        state = exc.args[0] if exc.args and isinstance(exc.args[0], str) else ""
+        return state in _MSSQL_RETRY_STATES or bool(_MSSQL_RETRY_CODES.search(str(exc)))
+
+_OFFSET_FETCH = re.compile(r"OFFSET\s+(\?|\d+)\s+ROWS\s+FETCH\s+NEXT\s+(\?|\d+)\s+ROWS\s+ONLY", re.I)
+_TABLE_HINTS = re.compile(r"\s+WITH\s*\(\s*(?:NOLOCK|UPDLOCK|HOLDLOCK|ROWLOCK|READPAST)"
+                          r"(?:\s*,\s*(?:NOLOCK|UPDLOCK|HOLDLOCK|ROWLOCK|READPAST))*\s*\)", re.I)
+
+@lru_cache(maxsize=1024)
+def _sqlite_sql(text: str) -> str:
+    # LIMIT offset, count — тот же порядок параметров, что у OFFSET ? ... FETCH NEXT ?
+    text = _OFFSET_FETCH.sub(r"LIMIT \1, \2", text)
+    return _TABLE_HINTS.sub("", text)
+
+def _sqlite_param(v: Any) -> Any:
+    # datetime2(0): секунды без долей, формат совпадает с SYSUTCDATETIME() ниже
+    if isinstance(v, datetime):
+        return v.isoformat(" ", timespec="seconds")
+    if isinstance(v, date):
+        return v.isoformat()
+    if isinstance(v, bool):
+        return int(v)
+    return v
+
+# Дат в SQLite нет — храним текст ISO. Обратно превращаются только колонки
+# с датой по имени (…At, Day, now — так названы все datetime2/date в схеме
+# и псевдонимы в запросах); текст пользователя вида «2025-01-01» остаётся строкой.
+_DATE_COLUMN = re.compile(r"At$|^Day$|^now$")
+
+def _sqlite_value(v: Any) -> Any:
+    if type(v) is str and len(v) in (10, 19) and v[4:5] == "-" and v[7:8] == "-":
+        try:
+            return datetime.fromisoformat(v) if len(v) == 19 else date.fromisoformat(v)
+        except ValueError:
+            pass
+    return v
+
+class SQLiteDialect(Dialect):
+    name = "sqlite"
+    tables_sql = "SELECT COUNT(*) AS cnt FROM dbo.sqlite_master WHERE type = 'table' AND name IN ({names})"
+
+    def sql(self, text: str) -> str:
+        return _sqlite_sql(text)
+
+    def params(self, params: Iterable[Any]) -> tuple:
+        return tuple(_sqlite_param(v) for v in params)
+
+    def begin_write(self, db: "DB") -> None:
+        # Блокировка записи на всю базу до COMMIT/ROLLBACK — замена UPDLOCK+HOLDLOCK
+        if not db.conn.in_transaction:
+            db.conn.execute("BEGIN IMMEDIATE")
+
+    def retryable(self, exc: BaseException) -> bool:
+        # SQLITE_BUSY/SQLITE_LOCKED — «database is locked» после timeout соединения
+        if not isinstance(exc, sqlite3.OperationalError):
+            return False
+        code = getattr(exc, "sqlite_errorcode", None)
+        if code is not None:
+            return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+        return "locked" in str(exc) or "busy" in str(exc)
+
+MSSQL = MSSQLDialect()
+SQLITE = SQLiteDialect()
+
+@lru_cache(maxsize=256)
+def _sqlite_row_type(names: tuple[str, ...]):
+    # -> (тип строки, номера колонок с датой)
+    return (namedtuple("Row", names, rename=True),
+            frozenset(i for i, name in enumerate(names) if _DATE_COLUMN.search(name)))
+
+def _sqlite_row(cursor: sqlite3.Cursor, values: tuple) -> tuple:
+    # как pyodbc.Row: доступ и по имени колонки, и по индексу
+    cls, dates = _sqlite_row_type(tuple(d[0] for d in cursor.description))
+    if not dates:
+        return cls._make(values)
+    return cls._make(_sqlite_value(v) if i in dates else v for i, v in enumerate(values))
+
+def _sqlite_utcnow() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+# Инструментирование запросов: время каждого оператора (гистограмма по
+# нормализованному тексту SQL), строки, ошибки и число round trip'ов на
+# логическую операцию (query_stats.operation("create_booking") — её открывают
+# TaskRunner и стенд нагрузки). Выключено — одна проверка флага на запрос.
+# Медленные (>= QUERY_SLOW_MS) пишутся в лог officebank.sql без параметров:
+# среди них бывают хэши паролей.
+
+STATS_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+_slow_log = logging.getLogger("officebank.sql")
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql: str) -> str:
+    # пробелы схлопываем, списки IN (?, ?, ?) — в один «?, ...»
+    text = " ".join(sql.split())
+    return re.sub(r"\?(?:\s*,\s*\?)+", "?, ...", text)
+
+@dataclass
+class StatementStats:
+    count: int = 0
+    errors: int = 0
+    rows: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    buckets: list[int] = field(default_factory=lambda: [0] * (len(STATS_BUCKETS_MS) + 1))
+
+    def add(self, ms: float, rows: int, error: bool) -> None:
+        self.count += 1
+        self.errors += error
+        self.rows += rows
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        for i, bound in enumerate(STATS_BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile(self, q: float) -> float:
+        # верхняя граница корзины, в которую попадает q-я доля
+        need = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets[:-1]):
+            seen += n
+            if seen >= need and n:
+                return float(STATS_BUCKETS_MS[i])
+        return self.max_ms
+
+@dataclass
+class OperationStats:
+    count: int = 0
+    round_trips: int = 0
+    max_round_trips: int = 0
+    total_ms: float = 0.0
+
+class _Timer:
+    __slots__ = ("stats", "sql", "rows", "t0")
+
+    def __init__(self, stats: "QueryStats", sql: str):
+        self.stats = stats
+        self.sql = sql
+        self.rows = 0
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stats.record(self.sql, (time.perf_counter() - self.t0) * 1000.0, self.rows, exc_type is not None)
+
+class QueryStats:
+    def __init__(self):
+        self.enabled = False
+        self.slow_ms = 200.0
+        self._lock = threading.Lock()
+        self._statements: dict[str, StatementStats] = {}
+        self._operations: dict[str, OperationStats] = {}
+        self._retries: dict[str, list[int]] = {}   # операция -> [повторы, исчерпан бюджет]
+        self._local = threading.local()
+        self.slow: deque = deque(maxlen=100)   # последние медленные запросы
+
+    def enable(self, slow_ms: Optional[float] = None) -> None:
+        self.slow_ms = slow_ms if slow_ms is not None else getattr(config, "QUERY_SLOW_MS", 200.0)
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._statements.clear()
+            self._operations.clear()
+            self._retries.clear()
+            self.slow.clear()
+
+    def timer(self, sql: str) -> _Timer:
+        return _Timer(self, sql)
+
+    def record(self, sql: str, ms: float, rows: int = 0, error: bool = False) -> None:
+        key = normalize_sql(sql)
+        op = getattr(self._local, "op", None)
+        if op is not None:
+            op[1] += 1
+        with self._lock:
+            st = self._statements.get(key)
+            if st is None:
+                st = self._statements[key] = StatementStats()
+            st.add(ms, rows, error)
+        if ms >= self.slow_ms:
+            name = op[0] if op is not None else "-"
+            self.slow.append({"at": datetime.now().isoformat(timespec="seconds"), "ms": round(ms, 2),
+                              "rows": rows, "operation": name, "sql": key})
+            _slow_log.warning("slow query %.1f ms, %d rows, op=%s: %s", ms, rows, name, key[:500])
+
+    def record_retry(self, name: str, exhausted: bool = False) -> None:
+        # повторы транзакций редки и считаются всегда, даже при выключенной статистике
+        with self._lock:
+            st = self._retries.setdefault(name, [0, 0])
+            st[exhausted] += 1
+
+    @contextmanager
+    def operation(self, name: str) -> Iterator[None]:
+        # вложенные операции считаются в объемлющей
+        if not self.enabled or getattr(self._local, "op", None) is not None:
+            yield
+            return
+        op = self._local.op = [name, 0]
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.op = None
+            ms = (time.perf_counter() - t0) * 1000.0
+            with self._lock:
+                st = self._operations.get(name)
+                if st is None:
+                    st = self._operations[name] = OperationStats()
+                st.count += 1
+                st.round_trips += op[1]
+                st.max_round_trips = max(st.max_round_trips, op[1])
+                st.total_ms += ms
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            statements = sorted(self._statements.items(), key=lambda kv: -kv[1].total_ms)
+            operations = sorted(self._operations.items())
+            retries = sorted((name, list(st)) for name, st in self._retries.items())
+            slow = list(self.slow)
+        return {
+            "statements": [{
+                "sql": sql, "count": st.count, "errors": st.errors, "rows": st.rows,
+                "total_ms": round(st.total_ms, 3), "mean_ms": round(st.total_ms / st.count, 3),
+                "p50_ms": st.quantile(0.5), "p95_ms": st.quantile(0.95), "max_ms": round(st.max_ms, 3),
+                "histogram_ms": dict(zip([f"<={b}" for b in STATS_BUCKETS_MS] + [f">{STATS_BUCKETS_MS[-1]}"],
+                                         st.buckets)),
+            } for sql, st in statements],
+            "operations": [{
+                "name": name, "count": op.count, "round_trips": op.round_trips,
+                "round_trips_mean": round(op.round_trips / op.count, 2), "round_trips_max": op.max_round_trips,
+                "mean_ms": round(op.total_ms / op.count, 3),
+            } for name, op in operations],
+            "retries": [{"name": name, "retries": r, "exhausted": x} for name, (r, x) in retries],
+            "slow": slow,
+        }
+
+    def dump_json(self, path: Path) -> None:
+        Path(path).write_text(json.dumps(self.snapshot(), ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def prometheus_text(self) -> str:
+        def label(text: str) -> str:
+            return text[:200].replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+        with self._lock:
+            statements = list(self._statements.items())
+            operations = list(self._operations.items())
+            retries = [(name, list(st)) for name, st in self._retries.items()]
+        out = ["# HELP officebank_sql_duration_seconds Время выполнения оператора SQL.",
+               "# TYPE officebank_sql_duration_seconds histogram"]
+        for sql, st in statements:
+            q = label(sql)
+            acc = 0
+            for bound, n in zip(STATS_BUCKETS_MS, st.buckets):
+                acc += n
+                out.append(f'officebank_sql_duration_seconds_bucket{{query="{q}",le="{bound / 1000:g}"}} {acc}')
+            out.append(f'officebank_sql_duration_seconds_bucket{{query="{q}",le="+Inf"}} {st.count}')
+            out.append(f'officebank_sql_duration_seconds_sum{{query="{q}"}} {st.total_ms / 1000:.6f}')
+            out.append(f'officebank_sql_duration_seconds_count{{query="{q}"}} {st.count}')
+        out += ["# TYPE officebank_sql_rows_total counter"]
+        out += [f'officebank_sql_rows_total{{query="{label(sql)}"}} {st.rows}' for sql, st in statements]
+        out += ["# TYPE officebank_sql_errors_total counter"]
+        out += [f'officebank_sql_errors_total{{query="{label(sql)}"}} {st.errors}' for sql, st in statements]
+        out += ["# HELP officebank_operation_round_trips Запросов к БД на логическую операцию.",
+                "# TYPE officebank_operation_round_trips summary"]
+        for name, op in operations:
+            out.append(f'officebank_operation_round_trips_sum{{operation="{label(name)}"}} {op.round_trips}')
+            out.append(f'officebank_operation_round_trips_count{{operation="{label(name)}"}} {op.count}')
+        out += ["# HELP officebank_tx_retries_total Повторы транзакций после взаимоблокировки или таймаута.",
+                "# TYPE officebank_tx_retries_total counter"]
+        out += [f'officebank_tx_retries_total{{operation="{label(name)}"}} {r}' for name, (r, _) in retries]
+        out += ["# TYPE officebank_tx_retry_exhausted_total counter"]
+        out += [f'officebank_tx_retry_exhausted_total{{operation="{label(name)}"}} {x}' for name, (_, x) in retries]
+        return "\n".join(out) + "\n"
+
+query_stats = QueryStats()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path == "/metrics":
+            body, ctype = query_stats.prometheus_text(), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/stats.json":
+            body, ctype = json.dumps(query_stats.snapshot(), ensure_ascii=False), "application/json; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+def serve_metrics(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    # /metrics (Prometheus) и /stats.json в фоновом потоке; остановка — .shutdown()
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="query-metrics", daemon=True).start()
+    return server
+
 def _conn_str() -> str:
     parts = [
         f"DRIVER={config.DRIVER}",
@@ -15,36 +376,190 @@ def _conn_str() -> str:
         parts.append("TrustServerCertificate=yes")
     return ";".join(parts) + ";"
 
+# Курсоры переиспользуются: LRU на соединение по тексту SQL (DB_CURSOR_CACHE).
+# pyodbc не готовит запрос заново, если курсор выполняет тот же текст, что и
+# в прошлый раз; sqlite3 берёт готовый оператор из кэша соединения. После
+# fetchone результат дочитывается — иначе открытый набор строк мешает другим
+# курсорам (без MARS) и держит снимок чтения в SQLite. iter_chunks всегда
+# берёт отдельный курсор: пока вызывающий читает порции, тот же текст может
+# выполниться снова.
+class Prepared:
+    # Запрос, закреплённый за соединением: свой курсор вне LRU, текст
+    # переводится диалектом один раз. Получать через db.prepare(sql).
+    __slots__ = ("db", "sql", "text", "cur")
+
+    def __init__(self, db: "DB", sql: str):
+        self.db = db
+        self.sql = sql
+        self.text = db.dialect.sql(sql)
+        self.cur = db.conn.cursor()
+
+    def _run(self, params: Iterable[Any], mode: str) -> Any:
+        try:
+            return self.db._run(self.cur, self.sql, self.text, params, mode)
+        except Exception:
+            self.cur = self.db.conn.cursor()
+            raise
+
+    def fetchone(self, params: Iterable[Any] = ()) -> Optional[Any]:
+        return self._run(params, "one")
+
+    def fetchall(self, params: Iterable[Any] = ()) -> list[Any]:
+        return self._run(params, "all")
+
+    def execute(self, params: Iterable[Any] = ()) -> int:
+        return self._run(params, "count")
+
 @dataclass
 class DB:
-    conn: pyodbc.Connection
+    conn: Any                  # pyodbc.Connection или sqlite3.Connection
+    dialect: Dialect = MSSQL
+    cursor_cache_size: int = field(default_factory=lambda: getattr(config, "DB_CURSOR_CACHE", 32))
+    cursor_hits: int = 0
+    cursor_misses: int = 0
+    _cursors: OrderedDict = field(default_factory=OrderedDict, repr=False)
+    _prepared: dict = field(default_factory=dict, repr=False)
 
     @staticmethod
     def connect() -> "DB":
+        if getattr(config, "DB_BACKEND", "mssql") == "sqlite":
+            return DB.connect_sqlite(config.SQLITE_PATH)
+        import pyodbc   # драйвер нужен только для SQL Server
         conn = pyodbc.connect(_conn_str(), autocommit=False)
         conn.timeout = 5
         return DB(conn)
 
+    @staticmethod
+    def connect_sqlite(path: str, timeout: Optional[float] = None) -> "DB":
+        # Основная база пустая, файл подключается как схема dbo — запросы
+        # с «dbo.Таблица» работают без переписывания. path может быть URI
+        # (file:name?mode=memory&cache=shared).
+        conn = sqlite3.connect("file::memory:", uri=True, check_same_thread=False,
+                               timeout=timeout if timeout is not None else getattr(config, "SQLITE_TIMEOUT_SEC", 10.0))
+        conn.execute("ATTACH DATABASE ? AS dbo", (str(path),))
+        conn.execute("PRAGMA dbo.journal_mode = WAL")
+        conn.execute("PRAGMA dbo.synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.create_function("SYSUTCDATETIME", 0, _sqlite_utcnow)
+        conn.row_factory = _sqlite_row
+        return DB(conn, SQLITE)
+
     def close(self) -> None:
+        self._cursors.clear()
+        self._prepared.clear()
         try:
             self.conn.close()
         except Exception:
             pass
 
-    def fetchone(self, sql: str, params: Iterable[Any] = ()) -> Optional[pyodbc.Row]:
-        cur = self.conn.cursor()
-        cur.execute(sql, tuple(params))
-        return cur.fetchone()
+    def ping(self) -> bool:
+        try:
+            cur = self.conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            return True
+        except Exception:
+            return False
+
+    def server_now(self) -> datetime:
+        return self.fetchone("SELECT SYSUTCDATETIME() AS now").now
+
+    def prepare(self, sql: str) -> Prepared:
+        # один объект на соединение и текст: сервисы вызывают db.prepare(SQL) на каждом проходе
+        stmt = self._prepared.get(sql)
+        if stmt is None:
+            stmt = self._prepared[sql] = Prepared(self, sql)
+        return stmt
+
+    def _cursor_for(self, text: str):
+        if self.cursor_cache_size <= 0:
+            return self.conn.cursor()
+        cur = self._cursors.get(text)
+        if cur is not None:
+            self._cursors.move_to_end(text)
+            self.cursor_hits += 1
+            return cur
+        self.cursor_misses += 1
+        cur = self._cursors[text] = self.conn.cursor()
+        if len(self._cursors) > self.cursor_cache_size:
+            self._cursors.popitem(last=False)
+        return cur
+
+    def _run(self, cur, sql: str, text: str, params: Iterable[Any], mode: str) -> Any:
+        # mode: one — строка или None, all — список, count — rowcount
+        if not query_stats.enabled:
+            return self._exec(cur, text, params, mode)
+        with query_stats.timer(sql) as t:
+            res = self._exec(cur, text, params, mode)
+            t.rows = res if mode == "count" else len(res) if mode == "all" else int(res is not None)
+        return res
+
+    def _exec(self, cur, text: str, params: Iterable[Any], mode: str) -> Any:
+        cur.execute(text, self.dialect.params(params))
+        if mode == "all":
+            return cur.fetchall()
+        if mode == "one":
+            row = cur.fetchone()
+            if row is not None:
+                cur.fetchall()
+            return row
+        return cur.rowcount
 
-    def fetchall(self, sql: str, params: Iterable[Any] = ()) -> list[pyodbc.Row]:
+    def _call(self, sql: str, params: Iterable[Any], mode: str) -> Any:
+        text = self.dialect.sql(sql)
+        cur = self._cursor_for(text)
+        try:
+            return self._run(cur, sql, text, params, mode)
+        except Exception:
+            # курсор после ошибки драйвера в кэше не оставляем
+            if self._cursors.get(text) is cur:
+                del self._cursors[text]
+            raise
+
+    def fetchone(self, sql: str, params: Iterable[Any] = ()) -> Optional[Any]:
+        return self._call(sql, params, "one")
+
+    def fetchall(self, sql: str, params: Iterable[Any] = ()) -> list[Any]:
+        return self._call(sql, params, "all")
+
+    def iter_chunks(self, sql: str, params: Iterable[Any] = (), size: int = 1000) -> Iterator[list[Any]]:
+        # время — до первой порции; строки — сколько выдано всего
+        measure = query_stats.enabled
+        t0 = time.perf_counter()
         cur = self.conn.cursor()
-        cur.execute(sql, tuple(params))
-        return cur.fetchall()
+        cur.execute(self.dialect.sql(sql), self.dialect.params(params))
+        first_ms = (time.perf_counter() - t0) * 1000.0
+        rows = 0
+        try:
+            while True:
+                chunk = cur.fetchmany(size)
+                if not chunk:
+                    break
+                rows += len(chunk)
+                yield chunk
+        finally:
+            cur.close()
+            if measure:
+                query_stats.record(sql, first_ms, rows)
 
     def execute(self, sql: str, params: Iterable[Any] = ()) -> int:
-        cur = self.conn.cursor()
-        cur.execute(sql, tuple(params))
-        return cur.rowcount
+        return self._call(sql, params, "count")
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Iterable[Any]], fast: bool = False) -> None:
+        # fast=True — параметры уходят на сервер массивом (pyodbc fast_executemany)
+        rows = [self.dialect.params(p) for p in seq_of_params]
+        if not rows:
+            return
+        text = self.dialect.sql(sql)
+        cur = self._cursor_for(text)
+        if self.dialect.fast_executemany:
+            cur.fast_executemany = fast
+        if not query_stats.enabled:
+            cur.executemany(text, rows)
+            return
+        with query_stats.timer(sql) as t:
+            t.rows = len(rows)
+            cur.executemany(text, rows)
 
     def commit(self) -> None:
         self.conn.commit()
@@ -52,11 +567,293 @@ class DB:
     def rollback(self) -> None:
         self.conn.rollback()
 
+# Повтор пишущих транзакций. SQL Server выбирает жертву взаимоблокировки,
+# ожидание блокировки или запроса упирается в таймаут; SQLite отвечает
+# «database is locked». Такую единицу работы откатываем целиком и выполняем
+# заново с экспоненциальной задержкой и случайным разбросом, пока есть
+# попытки (DB_RETRY_ATTEMPTS) и бюджет времени (DB_RETRY_BUDGET_SEC).
+# Любая ошибка — сначала ROLLBACK. Вложенные вызовы сами не повторяются:
+# после 1205 сервер уже откатил всю транзакцию, повторить можно только внешнюю.
+_retry_log = logging.getLogger("officebank.db")
+_tx_local = threading.local()
+
+def _rollback_quietly(db: DB) -> None:
+    try:
+        db.rollback()
+    except Exception:
+        _retry_log.exception("rollback после ошибки не удался")
+
+def retry_delay(attempt: int, base_ms: float, max_ms: float) -> float:
+    # секунды; равномерно от 0 до base * 2^(attempt-1), не больше max_ms
+    return random.uniform(0, min(max_ms, base_ms * 2 ** (attempt - 1))) / 1000.0
+
+def run_transaction(
+    db: DB,
+    fn: Callable[[DB], Any],
+    name: Optional[str] = None,
+    attempts: Optional[int] = None,
+    budget_sec: Optional[float] = None,
+) -> Any:
+    if getattr(_tx_local, "active", False):
+        return fn(db)
+    attempts = attempts if attempts is not None else getattr(config, "DB_RETRY_ATTEMPTS", 4)
+    budget_sec = budget_sec if budget_sec is not None else getattr(config, "DB_RETRY_BUDGET_SEC", 5.0)
+    base_ms = getattr(config, "DB_RETRY_BASE_MS", 50.0)
+    max_ms = getattr(config, "DB_RETRY_MAX_MS", 1000.0)
+    name = name or getattr(fn, "__name__", "transaction")
+    deadline = time.monotonic() + budget_sec
+    attempt = 0
+    _tx_local.active = True
+    try:
+        while True:
+            try:
+                return fn(db)
+            except Exception as e:
+                _rollback_quietly(db)
+                if not db.dialect.retryable(e):
+                    raise
+                attempt += 1
+                delay = retry_delay(attempt, base_ms, max_ms)
+                if attempt >= attempts or time.monotonic() + delay > deadline:
+                    query_stats.record_retry(name, exhausted=True)
+                    _retry_log.warning("%s: повторы исчерпаны (%d попыток): %s", name, attempt, e)
+                    raise
+                query_stats.record_retry(name)
+                time.sleep(delay)
+    finally:
+        _tx_local.active = False
+
+def transactional(fn: Optional[Callable] = None, *, attempts: Optional[int] = None,
+                  budget_sec: Optional[float] = None):
+    # @transactional над функцией сервиса f(db, ...): повтор при конфликте доступа
+    def wrap(f: Callable) -> Callable:
+        @wraps(f)
+        def wrapper(db, *args, **kwargs):
+            return run_transaction(db, lambda d: f(d, *args, **kwargs), f.__name__, attempts, budget_sec)
+        return wrapper
+    return wrap(fn) if fn is not None else wrap
+
+class PoolTimeout(RuntimeError):
+    pass
+
+@dataclass
+class PoolStats:
+    hits: int = 0                 # выдано готовое соединение из пула
+    misses: int = 0               # пришлось открывать новое
+    waits: int = 0                # сколько раз ждали освобождения (и дождавшиеся, и нет)
+    timeouts: int = 0             # не дождались за timeout — PoolTimeout
+    wait_time_total: float = 0.0  # секунды
+    wait_time_max: float = 0.0
+    validation_failures: int = 0
+    reconnects: int = 0
+    idle_evicted: int = 0
+    discarded: int = 0            # закрыты как сломанные при возврате
+
+    def snapshot(self) -> dict[str, float]:
+        return dict(self.__dict__)
+
+@dataclass
+class _Slot:
+    db: DB
+    returned_at: float = field(default_factory=time.monotonic)
+
+# Пул соединений: min_size держим открытыми, не больше max_size одновременно.
+# Поток, уже держащий соединение, при повторном lease() получает то же самое,
+# поэтому вложенные вызовы сервисов работают в одной транзакции.
+class ConnectionPool:
+    def __init__(
+        self,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+        validate_after: Optional[float] = None,
+        connect: Callable[[], DB] = DB.connect,
+    ):
+        self.min_size = min_size if min_size is not None else getattr(config, "POOL_MIN_SIZE", 1)
+        self.max_size = max_size if max_size is not None else getattr(config, "POOL_MAX_SIZE", 10)
+        self.timeout = timeout if timeout is not None else getattr(config, "POOL_TIMEOUT_SEC", 10.0)
+        self.idle_timeout = idle_timeout if idle_timeout is not None else getattr(config, "POOL_IDLE_TIMEOUT_SEC", 300.0)
+        self.validate_after = validate_after if validate_after is not None else getattr(config, "POOL_VALIDATE_AFTER_SEC", 10.0)
+        if self.max_size < 1 or self.min_size > self.max_size:
+            raise ValueError("Некорректные размеры пула.")
+        self._connect = connect
+        self._idle: list[_Slot] = []   # LIFO: сверху самое «тёплое» соединение
+        self._total = 0                # открыто всего (в пуле + выдано)
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._closed = False
+        self.stats = PoolStats()
+
+    @contextmanager
+    def lease(self) -> Iterator[DB]:
+        held = getattr(self._local, "db", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        db = self._acquire()
+        self._local.db = db
+        self._local.depth = 1
+        try:
+            yield db
+        finally:
+            self._local.db = None
+            self._local.depth = 0
+            self._release(db)
+
+    def _acquire(self) -> DB:
+        deadline = time.monotonic() + self.timeout
+        waited = 0.0
+        stale: list[_Slot] = []
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Пул соединений закрыт.")
+                stale += self._evict_idle_locked()
+                if self._idle:
+                    slot = self._idle.pop()
+                    self.stats.hits += 1
+                    break
+                if self._total < self.max_size:
+                    self._total += 1
+                    slot = None
+                    self.stats.misses += 1
+                    break
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    slot = False
+                    break
+                t0 = time.monotonic()
+                self._cond.wait(left)
+                waited += time.monotonic() - t0
+            if waited:
+                self.stats.waits += 1
+                self.stats.wait_time_total += waited
+                self.stats.wait_time_max = max(self.stats.wait_time_max, waited)
+            if slot is False:
+                self.stats.timeouts += 1
+
+        # сетевые операции — вне блокировки
+        for old in stale:
+            old.db.close()
+        if slot is False:
+            raise PoolTimeout(f"Нет свободного соединения за {self.timeout:.1f} с.")
+        if slot is None:
+            return self._open()
+        if time.monotonic() - slot.returned_at >= self.validate_after and not slot.db.ping():
+            with self._cond:
+                self.stats.validation_failures += 1
+                self.stats.reconnects += 1
+            slot.db.close()
+            return self._open()
+        return slot.db
+
+    def _open(self) -> DB:
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, db: DB) -> None:
+        # незакоммиченное не должно «протечь» к следующему арендатору
+        try:
+            db.rollback()
+            ok = True
+        except Exception:
+            ok = False
+        with self._cond:
+            if ok and not self._closed:
+                self._idle.append(_Slot(db))
+            else:
+                self._total -= 1
+                if not ok:
+                    self.stats.discarded += 1
+            self._cond.notify()
+        if not ok or self._closed:
+            db.close()
+
+    def _evict_idle_locked(self) -> list[_Slot]:
+        # вынимает из пула простоявшие дольше idle_timeout; закрывает их вызывающий — после блокировки
+        if not self._idle or self.idle_timeout <= 0:
+            return []
+        now = time.monotonic()
+        keep: list[_Slot] = []
+        stale: list[_Slot] = []
+        # самые старые лежат внизу стека
+        for slot in self._idle:
+            if now - slot.returned_at > self.idle_timeout and self._total - len(stale) > self.min_size:
+                stale.append(slot)
+            else:
+                keep.append(slot)
+        if stale:
+            self._idle = keep
+            self._total -= len(stale)
+            self.stats.idle_evicted += len(stale)
+        return stale
+
+    def warmup(self) -> None:
+        with self._cond:
+            need = max(0, self.min_size - self._total)
+            self._total += need
+        for _ in range(need):
+            db = self._open()
+            with self._cond:
+                self._idle.append(_Slot(db))
+                self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for slot in idle:
+            slot.db.close()
+
+    @property
+    def size(self) -> int:
+        return self._total
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
 def init_db_check(db: DB) -> None:
-    row = db.fetchone("""
-        SELECT COUNT(*) AS cnt
-        FROM sys.tables
-        WHERE name IN ('UserAccounts','Resources','Bookings','BookingStatuses')
-    """)
+    names = ", ".join(f"'{t}'" for t in ("UserAccounts", "Resources", "Bookings", "BookingStatuses"))
+    row = db.fetchone(db.dialect.tables_sql.format(names=names))
     if not row or row.cnt < 4:
         raise RuntimeError("В базе нет нужных таблиц.")
+
+SQLITE_SCHEMA = Path(__file__).resolve().parent / "sql" / "schema_sqlite.sql"
+
+def init_sqlite_schema(db: DB) -> None:
+    # Таблицы из sql/schema.sql (и агрегаты аналитики) в синтаксисе SQLite
+    if db.dialect is not SQLITE:
+        raise ValueError("Схема sql/schema_sqlite.sql — только для SQLite.")
+    db.commit()
+    db.conn.executescript(SQLITE_SCHEMA.read_text(encoding="utf-8"))
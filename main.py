@@ -1,13 +1,32 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from db import DB, init_db_check
+from db import init_db_check, get_pool, close_pool, query_stats, serve_metrics
+from services.audit import close_audit, enable_audit
+from services.common import refdata
+from services.interval_index import enable_index
+from services.notifications import close_notifications, enable_notifications
+import config
 from ui.login_window import LoginWindow
 from ui.main_window import MainWindow
+from ui.task_runner import TaskRunner
 
 def main():
+    metrics = None
+    if getattr(config, "QUERY_STATS_ENABLED", False):
+        query_stats.enable()
+        if getattr(config, "QUERY_METRICS_PORT", 0):
+            metrics = serve_metrics(config.QUERY_METRICS_PORT)
     try:
-        db = DB.connect()
-        init_db_check(db)
+        pool = get_pool()
+        with pool.lease() as db:
+            init_db_check(db)
+            refdata.refresh(db)
+            if getattr(config, "INTERVAL_INDEX_ENABLED", False):
+                enable_index(db)
+        if getattr(config, "AUDIT_ENABLED", False):
+            enable_audit()
+        if getattr(config, "NOTIFY_ENABLED", False):
+            enable_notifications()
     except Exception as e:
         messagebox.showerror("Ошибка БД", str(e))
         return
@@ -20,19 +39,28 @@ def main():
     except Exception:
         pass
 
+    runner = TaskRunner(root, pool)
+
     container = ttk.Frame(root)
     container.pack(fill="both", expand=True)
 
     def on_login(user):
         for w in container.winfo_children():
             w.destroy()
-        MainWindow(container, db, user).pack(fill="both", expand=True)
+        MainWindow(container, runner, user).pack(fill="both", expand=True)
 
-    LoginWindow(container, db, on_login).pack(fill="both", expand=True)
+    LoginWindow(container, runner, on_login).pack(fill="both", expand=True)
 
     def on_close():
         try:
-            db.close()
+            runner.close()
+            close_audit()
+            close_notifications()
+            close_pool()
+            if metrics is not None:
+                metrics.shutdown()
+            if query_stats.enabled and getattr(config, "QUERY_STATS_DUMP", ""):
+                query_stats.dump_json(config.QUERY_STATS_DUMP)
         finally:
             root.destroy()
 
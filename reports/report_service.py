@@ -1,31 +1,39 @@
 from datetime import datetime
 from pathlib import Path
+from typing import Optional
 import pandas as pd
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from docx import Document
 from docx.shared import Inches
+from services.occupancy_cube import OccupancyCube
 
 def save_csv(df: pd.DataFrame, path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     df.to_csv(path, index=False, encoding="utf-8-sig")
 
 def save_util_chart(util_df: pd.DataFrame, path_png: Path) -> None:
+    # Figure без pyplot: отчёт строится в фоновом потоке, а pyplot не потокобезопасен
     path_png.parent.mkdir(parents=True, exist_ok=True)
-    plt.figure(figsize=(8,4))
+    fig = Figure(figsize=(8,4))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
     if util_df.empty:
-        plt.title("Загрузка: нет данных")
+        ax.set_title("Загрузка: нет данных")
     else:
-        plt.plot(util_df["Date"], util_df["UtilizationPct"])
-        plt.xticks(rotation=45, ha="right")
-        plt.ylabel("Загрузка, %")
-        plt.title("Загрузка офиса по дням")
-        plt.tight_layout()
-    plt.savefig(path_png, dpi=200)
-    plt.close()
+        ax.plot(util_df["Date"], util_df["UtilizationPct"])
+        ax.tick_params(axis="x", labelrotation=45)
+        for lbl in ax.get_xticklabels():
+            lbl.set_horizontalalignment("right")
+        ax.set_ylabel("Загрузка, %")
+        ax.set_title("Загрузка офиса по дням")
+        fig.tight_layout()
+    fig.savefig(path_png, dpi=200)
 
 def save_docx_summary(start_at: datetime, end_at: datetime,
                       util_df: pd.DataFrame, top_df: pd.DataFrame,
-                      chart_png: Path, out_path: Path) -> None:
+                      chart_png: Path, out_path: Path,
+                      cube: Optional[OccupancyCube] = None) -> None:
     out_path.parent.mkdir(parents=True, exist_ok=True)
     doc = Document()
     doc.add_heading("Отчёт по загрузке офисных ресурсов", level=1)
@@ -61,4 +69,20 @@ def save_docx_summary(start_at: datetime, end_at: datetime,
             row[0].text = str(r["Resource"])
             row[1].text = str(int(r["Minutes"]))
 
+    if cube is not None:
+        doc.add_heading("3. Загрузка по этажам и зонам", level=2)
+        by_zone = cube.rollup(["Floor", "Zone"])
+        if by_zone.empty:
+            doc.add_paragraph("Нет данных.")
+        else:
+            t3 = doc.add_table(rows=1, cols=4)
+            for i, h in enumerate(("Этаж", "Зона", "Ресурсов", "Загрузка, %")):
+                t3.rows[0].cells[i].text = h
+            for _, r in by_zone.iterrows():
+                row = t3.add_row().cells
+                row[0].text = "" if pd.isna(r["Floor"]) else str(int(r["Floor"]))
+                row[1].text = str(r["Zone"])
+                row[2].text = str(int(r["Resources"]))
+                row[3].text = str(r["UtilizationPct"])
+
     doc.save(str(out_path))
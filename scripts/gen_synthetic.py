@@ -0,0 +1,175 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+import config
+from db import DB, init_sqlite_schema
+from security import hash_password
+from scripts.set_passwords import USERS
+
+# Синтетическая база для DB_BACKEND = "sqlite": справочники, офис с тремя зонами
+# (зона «Дирекция» закрыта, доступ FAC/ADM), переговорные, столы, сотрудники
+# и история броней без пересечений на одном ресурсе.
+#   python scripts/gen_synthetic.py --path officebank.sqlite3 --rooms 40 --bookings 50000
+# Демо-учётки из scripts/set_passwords.py: ivanov (EMP), petrov (FAC), sidorov (ADM);
+# остальные user0001… с паролем DEFAULT_PASSWORD.
+
+DEFAULT_PASSWORD = "Passw0rd!"
+SLOT_MIN = 30   # шаг сетки броней
+
+_REFERENCE = {
+    "BookingStatuses(StatusCode, StatusName)": [
+        ("PENDING", "На согласовании"), ("APPROVED", "Подтверждена"),
+        ("REJECTED", "Отклонена"), ("CANCELLED", "Отменена")],
+    "ApprovalStatuses(StatusCode, StatusName)": [
+        ("PENDING", "Ожидает"), ("APPROVED", "Согласовано"), ("REJECTED", "Отклонено")],
+    "ResourceStatuses(StatusCode, StatusName)": [("ACTIVE", "Доступен"), ("INACTIVE", "Выведен")],
+    "Roles(RoleCode, RoleName)": [("EMP", "Сотрудник"), ("FAC", "Администратор офиса"), ("ADM", "Администратор")],
+    "AuditActionTypes(ActionCode, ActionName)": [
+        ("LOGIN", "Вход"), ("BOOKING_CREATE", "Создание брони"),
+        ("BOOKING_CANCEL", "Отмена брони"), ("APPROVAL_DECIDE", "Решение по согласованию")],
+    "Equipments(EquipmentName)": [("Проектор",), ("Экран",), ("ВКС",), ("Доска",)],
+}
+
+def _ids(db: DB, table: str, id_col: str, code_col: str) -> dict[str, int]:
+    return {str(r.code): int(r.id) for r in db.fetchall(f"SELECT {id_col} AS id, {code_col} AS code FROM dbo.{table}")}
+
+def populate(
+    db: DB,
+    rooms: int = 40,
+    restricted_rooms: int = 5,
+    desks: int = 100,
+    users: int = 50,
+    bookings: int = 20000,
+    days: int = 60,
+    seed: int = 1,
+    rounds: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> dict[str, int]:
+    # Брони — в рабочие часы за последние days дней и неделю вперёд, сетка SLOT_MIN.
+    # Возвращает число созданных строк по таблицам.
+    rng = random.Random(seed)
+    rounds = rounds or config.BCRYPT_ROUNDS
+    now = (now or datetime.now()).replace(minute=0, second=0, microsecond=0)
+
+    for table, rows in _REFERENCE.items():
+        cols = table[table.index("(") + 1:-1]
+        db.executemany(f"INSERT INTO dbo.{table} VALUES ({', '.join('?' * len(cols.split(',')))})", rows)
+    roles = _ids(db, "Roles", "RoleID", "RoleCode")
+    booking_st = _ids(db, "BookingStatuses", "BookingStatusID", "StatusCode")
+    approval_st = _ids(db, "ApprovalStatuses", "ApprovalStatusID", "StatusCode")
+    active = _ids(db, "ResourceStatuses", "ResourceStatusID", "StatusCode")["ACTIVE"]
+
+    db.execute("INSERT INTO dbo.Offices(OfficeID, OfficeName, City, Address) VALUES (1, ?, ?, ?)",
+               ("Главный офис", "Москва", "ул. Примерная, 1"))
+    db.executemany("INSERT INTO dbo.Departments(DepartmentID, OfficeID, DepartmentName) VALUES (?, 1, ?)",
+                   [(1, "Разработка"), (2, "Операции")])
+    db.executemany("INSERT INTO dbo.Zones(ZoneID, OfficeID, ZoneName, FloorNo, IsRestricted) VALUES (?, 1, ?, ?, ?)",
+                   [(1, "Open space", 2, 0), (2, "Переговорные", 3, 0), (3, "Дирекция", 5, 1)])
+    db.executemany("INSERT INTO dbo.ZoneAccess(ZoneID, RoleID) VALUES (3, ?)", [(roles["FAC"],), (roles["ADM"],)])
+
+    # пользователи: сначала демо-учётки, затем user0001…
+    accounts = [(lg, pw, role) for (lg, pw), role in zip(USERS, ("EMP", "FAC", "ADM"))]
+    common_hash = hash_password(DEFAULT_PASSWORD, rounds)
+    accounts += [(f"user{i:04d}", None, "EMP") for i in range(1, max(0, users - len(accounts)) + 1)]
+    db.executemany("INSERT INTO dbo.Employees(EmployeeID, DepartmentID, FullName, Email) VALUES (?, ?, ?, ?)",
+                   [(n, 1 + n % 2, lg.capitalize(), f"{lg}@example.com") for n, (lg, _, _) in enumerate(accounts, 1)])
+    db.executemany("INSERT INTO dbo.UserAccounts(UserID, EmployeeID, Login, PasswordHash) VALUES (?, ?, ?, ?)",
+                   [(n, n, lg, hash_password(pw, rounds) if pw else common_hash)
+                    for n, (lg, pw, _) in enumerate(accounts, 1)])
+    db.executemany("INSERT INTO dbo.UserRoles(UserID, RoleID) VALUES (?, ?)",
+                   [(n, roles[role]) for n, (_, _, role) in enumerate(accounts, 1)])
+    approver = next(n for n, (_, _, role) in enumerate(accounts, 1) if role == "FAC")
+
+    # ресурсы: переговорные (последние restricted_rooms — в закрытой зоне), затем столы
+    res, room_rows, desk_rows, equip = [], [], [], []
+    for i in range(1, rooms + 1):
+        zone = 3 if i > rooms - restricted_rooms else 2
+        res.append((i, zone, "R", f"Переговорная {i:03d}", active))
+        room_rows.append((i, rng.choice((4, 6, 8, 12, 20)), 1 if i % 3 == 0 else 0))
+        equip += [(i, e) for e in range(1, 5) if rng.random() < 0.4]
+    for j in range(1, desks + 1):
+        rid = rooms + j
+        res.append((rid, 1, "D", f"Стол {j:03d}", active))
+        desk_rows.append((rid, f"D-{j:03d}", 1 if j % 4 else 0))
+    db.executemany("INSERT INTO dbo.Resources(ResourceID, ZoneID, ResourceKind, DisplayName, ResourceStatusID) "
+                   "VALUES (?, ?, ?, ?, ?)", res)
+    db.executemany("INSERT INTO dbo.Rooms(ResourceID, Capacity, HasVideoConf) VALUES (?, ?, ?)", room_rows)
+    db.executemany("INSERT INTO dbo.Desks(ResourceID, DeskCode, IsHotDesk) VALUES (?, ?, ?)", desk_rows)
+    db.executemany("INSERT INTO dbo.ResourceEquipments(ResourceID, EquipmentID) VALUES (?, ?)", equip)
+
+    # брони: случайный ресурс, день и слот; занятые слоты пропускаем
+    slots_per_day = (config.WORKDAY_END_HOUR - config.WORKDAY_START_HOUR) * 60 // SLOT_MIN
+    first_day = now.replace(hour=config.WORKDAY_START_HOUR) - timedelta(days=days)
+    taken: set[tuple[int, int]] = set()
+    statuses = [booking_st["APPROVED"]] * 8 + [booking_st["CANCELLED"], booking_st["PENDING"]]
+    user_ids = list(range(1, len(accounts) + 1))
+    all_rids = [r[0] for r in res]
+    book_rows, appr_rows = [], []
+    attempts = 0
+    while len(book_rows) < bookings and attempts < bookings * 5:
+        attempts += 1
+        rid = rng.choice(all_rids)
+        day = rng.randrange(days + 7)
+        slot = rng.randrange(slots_per_day)
+        length = min(rng.choice((1, 2, 2, 3, 4)), slots_per_day - slot)
+        cells = [(rid, day * slots_per_day + slot + k) for k in range(length)]
+        if any(c in taken for c in cells):
+            continue
+        status = rng.choice(statuses)
+        if status != booking_st["CANCELLED"]:
+            taken.update(cells)
+        s = first_day + timedelta(days=day, minutes=slot * SLOT_MIN)
+        bid = len(book_rows) + 1
+        book_rows.append((bid, rid, rng.choice(user_ids), s, s + timedelta(minutes=length * SLOT_MIN),
+                          "Встреча", status, min(now, s - timedelta(days=rng.randrange(1, 14)))))
+        if status == booking_st["PENDING"]:
+            appr_rows.append((bid, approver, approval_st["PENDING"]))
+    db.executemany("INSERT INTO dbo.Bookings(BookingID, ResourceID, RequestedByUserID, StartAt, EndAt, Title, "
+                   "BookingStatusID, CreatedAt) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", book_rows)
+    db.executemany("INSERT INTO dbo.BookingApprovals(BookingID, ApproverUserID, ApprovalStatusID) VALUES (?, ?, ?)",
+                   appr_rows)
+    db.commit()
+    return {"users": len(accounts), "resources": len(res), "bookings": len(book_rows), "approvals": len(appr_rows)}
+
+def create_database(path: Path, replace: bool = False, **kwargs) -> dict[str, int]:
+    if path.exists():
+        if not replace:
+            raise FileExistsError(f"{path} уже существует (--replace, чтобы пересоздать)")
+        for p in (path, path.with_name(path.name + "-wal"), path.with_name(path.name + "-shm")):
+            p.unlink(missing_ok=True)
+    db = DB.connect_sqlite(str(path))
+    try:
+        init_sqlite_schema(db)
+        return populate(db, **kwargs)
+    finally:
+        db.close()
+
+def main():
+    ap = argparse.ArgumentParser(description="Синтетическая база SQLite для OfficeBankIS")
+    ap.add_argument("--path", type=Path, default=Path(config.SQLITE_PATH))
+    ap.add_argument("--replace", action="store_true", help="удалить существующий файл")
+    ap.add_argument("--rooms", type=int, default=40)
+    ap.add_argument("--restricted-rooms", type=int, default=5)
+    ap.add_argument("--desks", type=int, default=100)
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--bookings", type=int, default=20000)
+    ap.add_argument("--days", type=int, default=60, help="глубина истории, дней")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--rounds", type=int, default=None, help="стоимость bcrypt (по умолчанию BCRYPT_ROUNDS)")
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    counts = create_database(args.path, args.replace, rooms=args.rooms, restricted_rooms=args.restricted_rooms,
+                             desks=args.desks, users=args.users, bookings=args.bookings, days=args.days,
+                             seed=args.seed, rounds=args.rounds)
+    print(f"OK. {args.path}: " + ", ".join(f"{k}={v}" for k, v in counts.items())
+          + f" за {time.perf_counter() - t0:.1f} с")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,15 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+import config
 from db import DB
 from security import hash_password
 
@@ -11,7 +20,99 @@ USERS = [
     ("sidorov", "S1d0r0v123"),
 ]
 
-def main():
+# Массовый режим: python scripts/set_passwords.py --csv users.csv
+# CSV — login,password (заголовок необязателен). Хэши считаются на всех ядрах,
+# в БД уходят пачками через временную таблицу. После каждой пачки номер
+# последней записанной строки сохраняется в <csv>.progress — повторный запуск
+# продолжит с неё.
+
+_STAGE_SQL = """
+IF OBJECT_ID('tempdb..#PwdStage') IS NOT NULL DROP TABLE #PwdStage;
+CREATE TABLE #PwdStage (Login nvarchar(100) NOT NULL PRIMARY KEY, PasswordHash nvarchar(200) NOT NULL);
+"""
+
+def _hash_one(args: tuple[str, str, int]) -> tuple[str, str]:
+    login, password, rounds = args
+    return login, hash_password(password, rounds)
+
+def iter_csv(path: Path, skip: int = 0) -> Iterator[tuple[str, str]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        seen = 0   # корректные строки данных: по ним же считается прогресс
+        for n, row in enumerate(csv.reader(f)):
+            if n == 0 and [c.strip().lower() for c in row[:2]] == ["login", "password"]:
+                continue
+            if len(row) < 2 or not row[0].strip():
+                continue
+            seen += 1
+            if seen > skip:
+                yield row[0].strip(), row[1]
+
+def _read_progress(path: Optional[Path]) -> int:
+    try:
+        return int(path.read_text().strip()) if path else 0
+    except (OSError, ValueError):
+        return 0
+
+def _write_progress(path: Optional[Path], done: int) -> None:
+    if path is None:
+        return
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(str(done))
+    os.replace(tmp, path)
+
+def _write_batch(db: DB, hashed: list[tuple[str, str]]) -> int:
+    if not db.dialect.tsql_batches:
+        # SQLite: без временной таблицы, UPDATE по каждой учётке в одной транзакции
+        n = sum(db.execute("UPDATE dbo.UserAccounts SET PasswordHash=? WHERE Login=?", (h, lg))
+                for lg, h in hashed)
+        db.commit()
+        return n
+    db.execute("TRUNCATE TABLE #PwdStage")
+    db.executemany("INSERT INTO #PwdStage(Login, PasswordHash) VALUES (?, ?)", hashed, fast=True)
+    n = db.execute("""
+        UPDATE u SET PasswordHash = s.PasswordHash
+        FROM dbo.UserAccounts u JOIN #PwdStage s ON s.Login = u.Login
+    """)
+    db.commit()
+    return n
+
+def bulk_set_passwords(
+    db: DB,
+    rows: Iterable[tuple[str, str]],
+    executor: Executor,
+    batch: int = 500,
+    rounds: Optional[int] = None,
+    progress: Optional[Path] = None,
+    start: int = 0,
+) -> tuple[int, int]:
+    # rows — уже без обработанных строк; start — сколько их было пропущено.
+    # Пустые/битые строки iter_csv пропускает, поэтому прогресс считается по выданным.
+    # Возвращает (обработано строк, обновлено учёток).
+    rounds = rounds or config.BCRYPT_ROUNDS
+    if db.dialect.tsql_batches:
+        db.execute(_STAGE_SQL)
+    it = iter(rows)
+    done = updated = 0
+    t0 = time.perf_counter()
+    while True:
+        chunk = list(islice(it, batch))
+        if not chunk:
+            break
+        hashed = list(executor.map(_hash_one, [(lg, pw, rounds) for lg, pw in chunk],
+                                   chunksize=max(1, len(chunk) // 32)))
+        # повтор логина в CSV — берём последний пароль
+        updated += _write_batch(db, list(dict(hashed).items()))
+        done += len(chunk)
+        _write_progress(progress, start + done)
+        rate = done / max(time.perf_counter() - t0, 1e-9)
+        print(f"\r{start + done} строк, обновлено {updated}, {rate:.1f} хэшей/с", end="", flush=True)
+    print()
+    if db.dialect.tsql_batches:
+        db.execute("DROP TABLE #PwdStage")
+        db.commit()
+    return done, updated
+
+def set_demo_passwords():
     db = DB.connect()
     try:
         for login, pw in USERS:
@@ -23,5 +124,34 @@ def main():
     finally:
         db.close()
 
+def main():
+    ap = argparse.ArgumentParser(description="Установка паролей (демо-пользователи или CSV login,password)")
+    ap.add_argument("--csv", type=Path, help="CSV login,password для массовой смены")
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--rounds", type=int, default=None, help="стоимость bcrypt (по умолчанию BCRYPT_ROUNDS)")
+    ap.add_argument("--restart", action="store_true", help="начать сначала, игнорируя .progress")
+    args = ap.parse_args()
+    if args.csv is None:
+        set_demo_passwords()
+        return
+
+    progress = args.csv.with_name(args.csv.name + ".progress")
+    skip = 0 if args.restart else _read_progress(progress)
+    if skip:
+        print(f"Продолжаем со строки {skip} ({progress})")
+    db = DB.connect()
+    t0 = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(args.workers) as ex:
+            done, updated = bulk_set_passwords(db, iter_csv(args.csv, skip), ex, args.batch,
+                                               args.rounds, progress, skip)
+    finally:
+        db.close()
+    total = time.perf_counter() - t0
+    print(f"OK. Строк: {done}, обновлено учёток: {updated}, {total:.1f} с "
+          f"({done / max(total, 1e-9):.1f} хэшей/с, процессов: {args.workers})")
+    progress.unlink(missing_ok=True)
+
 if __name__ == "__main__":
     main()
@@ -1,7 +1,16 @@
+from typing import Optional
 import bcrypt
+import config
 
-def hash_password(plain: str) -> str:
-    salt = bcrypt.gensalt(rounds=12)
+# bcrypt.hashpw/checkpw отпускают GIL, поэтому проверки из нескольких потоков
+# выполняются параллельно. Стоимость берётся из config.BCRYPT_ROUNDS; хэши со
+# старой стоимостью пересчитываются при следующем успешном входе (needs_rehash).
+
+def _rounds() -> int:
+    return int(getattr(config, "BCRYPT_ROUNDS", 12))
+
+def hash_password(plain: str, rounds: Optional[int] = None) -> str:
+    salt = bcrypt.gensalt(rounds=rounds or _rounds())
     return bcrypt.hashpw(plain.encode("utf-8"), salt).decode("utf-8")
 
 def verify_password(plain: str, hashed: str) -> bool:
@@ -9,3 +18,23 @@ def verify_password(plain: str, hashed: str) -> bool:
         return bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8"))
     except Exception:
         return False
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    # "$2b$12$..." -> 12
+    parts = (hashed or "").split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+def needs_rehash(hashed: str, rounds: Optional[int] = None) -> bool:
+    return hash_rounds(hashed) != (rounds or _rounds())
+
+_dummy_hash: Optional[str] = None
+
+def burn_verify(plain: str) -> None:
+    # Для несуществующего логина тратим столько же времени, сколько на проверку,
+    # чтобы по задержке нельзя было отличить «нет пользователя» от «неверный пароль».
+    global _dummy_hash
+    if _dummy_hash is None or needs_rehash(_dummy_hash):
+        _dummy_hash = hash_password("dummy-password")
+    verify_password(plain, _dummy_hash)
@@ -0,0 +1,146 @@
+import json
+import os
+import shutil
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional
+import numpy as np
+import pandas as pd
+import config
+
+# Локальный колоночный кэш броней закрытых месяцев: каталог YYYY-MM, в нём
+# по .npy на колонку (категории — коды + словарь в meta.json). Читается через
+# np.load(mmap_mode="r"), так что повторные отчёты не ходят на сервер за историей.
+
+_PLAIN = ("BookingID", "ResourceID", "StartAt", "EndAt")
+_CATEGORICAL = ("Resource", "Kind", "Zone", "Status")
+
+def month_key(d: date) -> str:
+    return f"{d.year:04d}-{d.month:02d}"
+
+def month_bounds(key: str) -> tuple[datetime, datetime]:
+    y, m = int(key[:4]), int(key[5:7])
+    start = datetime(y, m, 1)
+    end = datetime(y + (m == 12), m % 12 + 1, 1)
+    return start, end
+
+def months_between(start_at: datetime, end_at: datetime) -> list[str]:
+    keys = []
+    cur = datetime(start_at.year, start_at.month, 1)
+    while cur < end_at:
+        keys.append(month_key(cur))
+        cur = month_bounds(keys[-1])[1]
+    return keys
+
+class AnalyticsCache:
+    def __init__(self, root: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.root = Path(root or getattr(config, "ANALYTICS_CACHE_DIR", "cache/analytics"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            getattr(config, "ANALYTICS_CACHE_MAX_MB", 256) * 1024 * 1024)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _dir(self, key: str) -> Path:
+        return self.root / key
+
+    def _meta(self, key: str) -> Optional[dict]:
+        try:
+            return json.loads((self._dir(key) / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def has(self, key: str) -> bool:
+        return self._meta(key) is not None
+
+    def snapshot_at(self, key: str) -> Optional[datetime]:
+        meta = self._meta(key)
+        return datetime.fromisoformat(meta["snapshot_at"]) if meta else None
+
+    def write(self, key: str, df: pd.DataFrame, snapshot_at: datetime) -> None:
+        tmp = self.root / f".{key}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        np.save(tmp / "BookingID.npy", df["BookingID"].to_numpy(dtype=np.int64))
+        np.save(tmp / "ResourceID.npy", df["ResourceID"].to_numpy(dtype=np.int64))
+        np.save(tmp / "StartAt.npy", df["StartAt"].to_numpy(dtype="datetime64[us]"))
+        np.save(tmp / "EndAt.npy", df["EndAt"].to_numpy(dtype="datetime64[us]"))
+        floor = pd.array(df["Floor"], dtype="Int64")
+        np.save(tmp / "Floor.npy", floor.to_numpy(dtype=np.int64, na_value=0))
+        np.save(tmp / "FloorNA.npy", floor.isna())
+        categories = {}
+        for c in _CATEGORICAL:
+            cat = pd.Categorical(df[c].astype(str)) if len(df) else pd.Categorical([])
+            np.save(tmp / f"{c}.npy", cat.codes.astype(np.int32))
+            categories[c] = [str(x) for x in cat.categories]
+        meta = {"rows": len(df), "snapshot_at": snapshot_at.isoformat(), "categories": categories}
+        (tmp / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        with self._lock:
+            shutil.rmtree(self._dir(key), ignore_errors=True)
+            os.replace(tmp, self._dir(key))
+        self.evict()
+
+    def read(self, key: str) -> Optional[pd.DataFrame]:
+        meta = self._meta(key)
+        if meta is None:
+            self.misses += 1
+            return None
+        d = self._dir(key)
+        try:
+            cols = {c: np.load(d / f"{c}.npy", mmap_mode="r") for c in _PLAIN + _CATEGORICAL + ("Floor", "FloorNA")}
+        except (OSError, ValueError):
+            self.invalidate(key)
+            self.misses += 1
+            return None
+        os.utime(d / "meta.json")   # для LRU-вытеснения
+        self.hits += 1
+        cat = {c: pd.Categorical.from_codes(cols[c], categories=meta["categories"][c]) for c in _CATEGORICAL}
+        return pd.DataFrame({
+            "BookingID": cols["BookingID"],
+            "ResourceID": cols["ResourceID"],
+            "Resource": cat["Resource"],
+            "Kind": cat["Kind"],
+            "Zone": cat["Zone"],
+            "Floor": pd.arrays.IntegerArray(np.array(cols["Floor"]), np.array(cols["FloorNA"])),
+            "StartAt": cols["StartAt"].astype("datetime64[ns]"),
+            "EndAt": cols["EndAt"].astype("datetime64[ns]"),
+            "Status": cat["Status"],
+        })
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        with self._lock:
+            if key is None:
+                shutil.rmtree(self.root, ignore_errors=True)
+            else:
+                shutil.rmtree(self._dir(key), ignore_errors=True)
+
+    def invalidate_range(self, start_at: datetime, end_at: datetime) -> None:
+        for key in months_between(start_at, end_at):
+            self.invalidate(key)
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        out = []
+        if not self.root.exists():
+            return out
+        for d in self.root.iterdir():
+            meta = d / "meta.json"
+            if d.name.startswith(".") or not meta.exists():
+                continue
+            size = sum(f.stat().st_size for f in d.iterdir())
+            out.append((meta.stat().st_mtime, size, d.name))
+        return out
+
+    def size_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> None:
+        entries = sorted(self._entries())   # самые давно читанные — первыми
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            self.invalidate(key)
+            total -= size
+            self.evictions += 1
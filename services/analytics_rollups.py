@@ -0,0 +1,151 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+import numpy as np
+import pandas as pd
+from db import DB
+import config
+from services.analytics_service import bookings_df, day_segments, utilization_frame
+
+# Материализованные минуты «день × ресурс» (sql/analytics_rollups.sql).
+# После первичного заполнения пересчитываются только дни, которых коснулись
+# брони с CreatedAt/UpdatedAt позже водяной отметки. Отметка — время сервера
+# на начало прохода, а изменения ищем с запасом ANALYTICS_ROLLUP_LAG_SEC,
+# чтобы не потерять транзакции, закоммиченные уже после нашего чтения.
+# Пересчёт — DELETE + INSERT по дням, поэтому клиенты делают его по одному:
+# проход начинается с чтения отметки под UPDLOCK+HOLDLOCK (нет строки — блокировка
+# диапазона ключа), на SQLite — под dialect.begin_write. Второй клиент ждёт
+# COMMIT первого и пересчитывает только то, что изменилось после новой отметки.
+
+WATERMARK_NAME = "DailyRollups"
+ROLLUP_COLUMNS = ["Day", "ResourceID", "BookedMinutes", "TotalMinutes"]
+
+def get_watermark(db: DB) -> Optional[datetime]:
+    row = db.fetchone("SELECT WatermarkAt FROM dbo.AnalyticsWatermarks WHERE Name = ?", (WATERMARK_NAME,))
+    return row.WatermarkAt if row else None
+
+def _lock_watermark(db: DB) -> Optional[datetime]:
+    # отметка, которую до COMMIT/ROLLBACK не прочитает под блокировкой никто другой
+    db.dialect.begin_write(db)
+    row = db.fetchone("SELECT WatermarkAt FROM dbo.AnalyticsWatermarks WITH (UPDLOCK, HOLDLOCK) WHERE Name = ?",
+                      (WATERMARK_NAME,))
+    return row.WatermarkAt if row else None
+
+def _set_watermark(db: DB, value: datetime) -> None:
+    n = db.execute("UPDATE dbo.AnalyticsWatermarks SET WatermarkAt = ? WHERE Name = ?", (value, WATERMARK_NAME))
+    if n == 0:
+        db.execute("INSERT INTO dbo.AnalyticsWatermarks(Name, WatermarkAt) VALUES (?, ?)", (WATERMARK_NAME, value))
+
+def daily_resource_minutes(df: pd.DataFrame, first_day: date, n_days: int) -> pd.DataFrame:
+    if df.empty or n_days <= 0:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    rid = df["ResourceID"].to_numpy(dtype=np.int64)
+    rows_w, day_w, min_w = day_segments(df, first_day, n_days, config.WORKDAY_START_HOUR, config.WORKDAY_END_HOUR)
+    rows_t, day_t, min_t = day_segments(df, first_day, n_days, 0, 24)
+    work = pd.DataFrame({"Day": day_w, "ResourceID": rid[rows_w], "BookedMinutes": min_w}) \
+        .groupby(["Day", "ResourceID"])["BookedMinutes"].sum()
+    total = pd.DataFrame({"Day": day_t, "ResourceID": rid[rows_t], "TotalMinutes": min_t}) \
+        .groupby(["Day", "ResourceID"])["TotalMinutes"].sum()
+    out = pd.concat([work, total], axis=1).fillna(0).astype(np.int64).reset_index()
+    out["Day"] = [first_day + timedelta(days=int(d)) for d in out["Day"]]
+    return out[ROLLUP_COLUMNS]
+
+def _rebuild_days(db: DB, first_day: date, n_days: int) -> int:
+    start = datetime.combine(first_day, time())
+    df = bookings_df(db, start, start + timedelta(days=n_days))
+    agg = daily_resource_minutes(df, first_day, n_days)
+    db.execute("DELETE FROM dbo.AnalyticsDailyRollups WHERE [Day] >= ? AND [Day] < ?",
+               (first_day, first_day + timedelta(days=n_days)))
+    db.executemany(
+        "INSERT INTO dbo.AnalyticsDailyRollups([Day], ResourceID, BookedMinutes, TotalMinutes) VALUES (?, ?, ?, ?)",
+        [(r.Day, int(r.ResourceID), int(r.BookedMinutes), int(r.TotalMinutes)) for r in agg.itertuples(index=False)],
+        fast=True,
+    )
+    return len(agg)
+
+def _day_runs(days: set[date], max_run: int = 31) -> list[tuple[date, int]]:
+    # Соседние дни пересчитываем одним запросом, но не длиннее max_run
+    runs: list[tuple[date, int]] = []
+    for d in sorted(days):
+        if runs and runs[-1][0] + timedelta(days=runs[-1][1]) == d and runs[-1][1] < max_run:
+            runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+        else:
+            runs.append((d, 1))
+    return runs
+
+def backfill_rollups(db: DB, first_day: Optional[date] = None, last_day: Optional[date] = None) -> int:
+    _lock_watermark(db)
+    mark = db.server_now()
+    if first_day is None or last_day is None:
+        row = db.fetchone("SELECT MIN(StartAt) AS FirstStartAt, MAX(EndAt) AS LastEndAt FROM dbo.Bookings")
+        if not row or row.FirstStartAt is None:
+            _set_watermark(db, mark)
+            db.commit()
+            return 0
+        first_day = first_day or row.FirstStartAt.date()
+        last_day = last_day or row.LastEndAt.date()
+    days = {first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)}
+    for d, n in _day_runs(days):
+        _rebuild_days(db, d, n)
+    _set_watermark(db, mark)
+    db.commit()
+    return len(days)
+
+def refresh_rollups(db: DB) -> int:
+    wm = _lock_watermark(db)
+    if wm is None:
+        return backfill_rollups(db)
+    mark = db.server_now()
+    since = wm - timedelta(seconds=getattr(config, "ANALYTICS_ROLLUP_LAG_SEC", 300))
+    rows = db.fetchall("""
+        SELECT StartAt, EndAt FROM dbo.Bookings WHERE CreatedAt > ?
+        UNION
+        SELECT StartAt, EndAt FROM dbo.Bookings WHERE UpdatedAt > ?
+    """, (since, since))
+    days: set[date] = set()
+    for r in rows or []:
+        d, last = r.StartAt.date(), r.EndAt.date()
+        while d <= last:
+            days.add(d)
+            d += timedelta(days=1)
+    for d, n in _day_runs(days):
+        _rebuild_days(db, d, n)
+    _set_watermark(db, mark)
+    db.commit()
+    return len(days)
+
+def load_rollups(db: DB, first_day: date, last_day: date) -> pd.DataFrame:
+    rows = db.fetchall("""
+        SELECT x.[Day], x.ResourceID, r.DisplayName, x.BookedMinutes, x.TotalMinutes
+        FROM dbo.AnalyticsDailyRollups x
+        JOIN dbo.Resources r ON r.ResourceID = x.ResourceID
+        WHERE x.[Day] >= ? AND x.[Day] <= ?
+    """, (first_day, last_day))
+    return pd.DataFrame({
+        "Day": [r.Day for r in rows],
+        "ResourceID": np.array([r.ResourceID for r in rows], dtype=np.int64),
+        "Resource": pd.Categorical([str(r.DisplayName) for r in rows]),
+        "BookedMinutes": np.array([r.BookedMinutes for r in rows], dtype=np.int64),
+        "TotalMinutes": np.array([r.TotalMinutes for r in rows], dtype=np.int64),
+    })
+
+# Ответы из агрегатов совпадают с utilization_by_day/top_resources по сырым
+# броням с точностью до целых дней: частичные дни на краях периода берутся целиком.
+def utilization_from_rollups(rollups: pd.DataFrame, start_at: datetime, end_at: datetime) -> pd.DataFrame:
+    if rollups.empty:
+        return pd.DataFrame(columns=["Date","BookedMinutes","UtilizationPct"])
+    first_day = start_at.date()
+    n_days = (end_at.date() - first_day).days + 1
+    if n_days <= 0:
+        return pd.DataFrame([])
+    day = np.array([(d - first_day).days for d in rollups["Day"]], dtype=np.int64)
+    keep = (day >= 0) & (day < n_days)
+    booked = np.bincount(day[keep], weights=rollups["BookedMinutes"].to_numpy()[keep],
+                         minlength=n_days).astype(np.int64).tolist()
+    return utilization_frame(first_day, booked)
+
+def top_resources_from_rollups(rollups: pd.DataFrame, top_n: int = 10) -> pd.DataFrame:
+    if rollups.empty:
+        return pd.DataFrame(columns=["Resource","Minutes"])
+    return (rollups.groupby("Resource", as_index=False, observed=True)["TotalMinutes"].sum()
+            .rename(columns={"TotalMinutes": "Minutes"})
+            .sort_values("Minutes", ascending=False).head(top_n))
@@ -1,62 +1,201 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import Iterator, Optional
+import numpy as np
 import pandas as pd
 from db import DB
+from services.analytics_cache import AnalyticsCache, month_bounds, months_between
 import config
 
-def bookings_df(db: DB, start_at: datetime, end_at: datetime) -> pd.DataFrame:
+BOOKING_COLUMNS = ["BookingID", "ResourceID", "Resource", "Kind", "Zone", "Floor", "StartAt", "EndAt", "Status"]
+_CATEGORICAL = ("Resource", "Kind", "Zone", "Status")
+
+_BOOKINGS_SQL = """
+    SELECT b.BookingID, b.ResourceID, r.DisplayName, r.ResourceKind, z.ZoneName, z.FloorNo,
+           b.StartAt, b.EndAt, bs.StatusCode
+    FROM dbo.Bookings b
+    JOIN dbo.Resources r ON r.ResourceID=b.ResourceID
+    JOIN dbo.Zones z ON z.ZoneID=r.ZoneID
+    JOIN dbo.BookingStatuses bs ON bs.BookingStatusID=b.BookingStatusID
+    WHERE b.StartAt < ? AND b.EndAt > ?
+      AND bs.StatusCode IN ('APPROVED','PENDING')
+"""
+
+class _BookingBuffers:
+    # Колонки копятся в numpy-буферах (рост удвоением), строки сразу
+    # кодируются в коды категорий — без dict на строку и без pd.to_datetime.
+    def __init__(self, capacity: int, categories: Optional[dict[str, dict[str, int]]] = None):
+        self.n = 0
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.resource_ids = np.empty(capacity, dtype=np.int64)
+        self.floors = np.empty(capacity, dtype=np.int64)
+        self.floor_na = np.empty(capacity, dtype=bool)
+        self.starts = np.empty(capacity, dtype="datetime64[us]")
+        self.ends = np.empty(capacity, dtype="datetime64[us]")
+        self.codes = {c: np.empty(capacity, dtype=np.int32) for c in _CATEGORICAL}
+        self.categories = categories if categories is not None else {c: {} for c in _CATEGORICAL}
+
+    def _grow(self, need: int) -> None:
+        cap = len(self.ids)
+        if need <= cap:
+            return
+        cap = max(need, cap * 2)
+        for name in ("ids", "resource_ids", "floors", "floor_na", "starts", "ends"):
+            arr = getattr(self, name)
+            new = np.empty(cap, dtype=arr.dtype)
+            new[:self.n] = arr[:self.n]
+            setattr(self, name, new)
+        for c, arr in self.codes.items():
+            new = np.empty(cap, dtype=arr.dtype)
+            new[:self.n] = arr[:self.n]
+            self.codes[c] = new
+
+    def append(self, rows: list) -> None:
+        k = len(rows)
+        self._grow(self.n + k)
+        i, j = self.n, self.n + k
+        bid, rid, name, kind, zone, floor, start, end, status = zip(*rows)
+        self.ids[i:j] = bid
+        self.resource_ids[i:j] = rid
+        self.floor_na[i:j] = [f is None for f in floor]
+        self.floors[i:j] = [0 if f is None else f for f in floor]
+        self.starts[i:j] = np.array(start, dtype="datetime64[us]")
+        self.ends[i:j] = np.array(end, dtype="datetime64[us]")
+        for c, values in zip(_CATEGORICAL, (name, kind, zone, status)):
+            cats = self.categories[c]
+            self.codes[c][i:j] = [cats.setdefault(str(v), len(cats)) for v in values]
+        self.n = j
+
+    def frame(self, lo: int = 0, hi: Optional[int] = None) -> pd.DataFrame:
+        hi = self.n if hi is None else hi
+        cat = {c: pd.Categorical.from_codes(self.codes[c][lo:hi], categories=list(self.categories[c]))
+               for c in _CATEGORICAL}
+        return pd.DataFrame({
+            "BookingID": self.ids[lo:hi],
+            "ResourceID": self.resource_ids[lo:hi],
+            "Resource": cat["Resource"],
+            "Kind": cat["Kind"],
+            "Zone": cat["Zone"],
+            "Floor": pd.arrays.IntegerArray(self.floors[lo:hi].copy(), self.floor_na[lo:hi].copy()),
+            "StartAt": self.starts[lo:hi].astype("datetime64[ns]"),
+            "EndAt": self.ends[lo:hi].astype("datetime64[ns]"),
+            "Status": cat["Status"],
+        }, columns=BOOKING_COLUMNS)
+
+def _chunk_size(chunk_size: Optional[int]) -> int:
+    return chunk_size or getattr(config, "ANALYTICS_CHUNK_SIZE", 5000)
+
+def _load_period(db: DB, start_at: datetime, end_at: datetime, chunk_size: Optional[int]) -> pd.DataFrame:
+    size = _chunk_size(chunk_size)
+    buf = _BookingBuffers(size)
+    for rows in db.iter_chunks(_BOOKINGS_SQL, (end_at, start_at), size):
+        buf.append(rows)
+    return buf.frame()
+
+def bookings_df(db: DB, start_at: datetime, end_at: datetime, chunk_size: Optional[int] = None,
+                cache: Optional[AnalyticsCache] = None) -> pd.DataFrame:
+    if cache is None:
+        return _load_period(db, start_at, end_at, chunk_size)
+    return _bookings_df_cached(db, start_at, end_at, chunk_size, cache)
+
+def _drop_stale_months(db: DB, cache: AnalyticsCache, keys: list[str]) -> None:
+    snaps = {k: cache.snapshot_at(k) for k in keys if cache.has(k)}
+    if not snaps:
+        return
+    oldest = min(snaps.values())
     rows = db.fetchall("""
-        SELECT b.BookingID, r.DisplayName, r.ResourceKind, z.ZoneName,
-               b.StartAt, b.EndAt, bs.StatusCode
-        FROM dbo.Bookings b
-        JOIN dbo.Resources r ON r.ResourceID=b.ResourceID
-        JOIN dbo.Zones z ON z.ZoneID=r.ZoneID
-        JOIN dbo.BookingStatuses bs ON bs.BookingStatusID=b.BookingStatusID
-        WHERE b.StartAt < ? AND b.EndAt > ?
-          AND bs.StatusCode IN ('APPROVED','PENDING')
-    """, (end_at, start_at))
-    data = []
-    for x in rows:
-        data.append({
-            "BookingID": int(x.BookingID),
-            "Resource": str(x.DisplayName),
-            "Kind": str(x.ResourceKind),
-            "Zone": str(x.ZoneName),
-            "StartAt": pd.to_datetime(x.StartAt),
-            "EndAt": pd.to_datetime(x.EndAt),
-            "Status": str(x.StatusCode),
-        })
-    return pd.DataFrame(data)
+        SELECT StartAt, EndAt, COALESCE(UpdatedAt, CreatedAt) AS ChangedAt
+        FROM dbo.Bookings
+        WHERE (CreatedAt > ? OR UpdatedAt > ?) AND StartAt < ? AND EndAt > ?
+    """, (oldest, oldest, month_bounds(max(snaps))[1], month_bounds(min(snaps))[0]))
+    for r in rows or []:
+        for k in months_between(r.StartAt, r.EndAt):
+            if k in snaps and r.ChangedAt > snaps[k]:
+                cache.invalidate(k)
 
-def utilization_by_day(df: pd.DataFrame, start_at: datetime, end_at: datetime) -> pd.DataFrame:
-    wd_start = config.WORKDAY_START_HOUR
-    wd_end = config.WORKDAY_END_HOUR
-    work_minutes = (wd_end - wd_start) * 60
+def _bookings_df_cached(db: DB, start_at: datetime, end_at: datetime,
+                        chunk_size: Optional[int], cache: AnalyticsCache) -> pd.DataFrame:
+    # Закрытые месяцы (раньше текущего) — из кэша, открытый «хвост» — из БД
+    today = datetime.now()
+    open_from = datetime(today.year, today.month, 1)
+    closed = months_between(start_at, min(end_at, open_from))
+    if not closed:
+        return _load_period(db, start_at, end_at, chunk_size)
 
+    _drop_stale_months(db, cache, closed)
+    parts = []
+    mark = None
+    for key in closed:
+        part = cache.read(key)
+        if part is None:
+            mark = mark or db.server_now()
+            m0, m1 = month_bounds(key)
+            part = _load_period(db, m0, m1, chunk_size)
+            cache.write(key, part, mark)
+        parts.append(part)
+    tail_from = month_bounds(closed[-1])[1]
+    if end_at > tail_from:
+        parts.append(_load_period(db, tail_from, end_at, chunk_size))
+
+    # брони на стыке месяцев лежат в обеих партициях
+    df = pd.concat(parts, ignore_index=True).drop_duplicates("BookingID")
+    df = df[(df["StartAt"] < end_at) & (df["EndAt"] > start_at)].reset_index(drop=True)
+    for c in _CATEGORICAL:
+        df[c] = df[c].astype("category")
+    return df[BOOKING_COLUMNS]
+
+def iter_bookings_df(db: DB, start_at: datetime, end_at: datetime,
+                     chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    # Для агрегации «вне памяти»: по кадру на пачку, словари категорий общие,
+    # поэтому коды совпадают между пачками.
+    size = _chunk_size(chunk_size)
+    categories: dict[str, dict[str, int]] = {c: {} for c in _CATEGORICAL}
+    for rows in db.iter_chunks(_BOOKINGS_SQL, (end_at, start_at), size):
+        buf = _BookingBuffers(len(rows), categories)
+        buf.append(rows)
+        yield buf.frame()
+
+def day_segments(df: pd.DataFrame, first_day: date, n_days: int,
+                 from_hour: int, to_hour: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Каждую бронь «размножаем» по дням, которые она задевает внутри периода,
+    # и обрезаем окном [from_hour, to_hour) дня. Возвращает (номер строки df,
+    # номер дня от first_day, целые минуты) только для непустых кусков.
+    d0 = np.datetime64(first_day, "D")
+    s = df["StartAt"].to_numpy(dtype="datetime64[us]")
+    e = df["EndAt"].to_numpy(dtype="datetime64[us]")
+    first = np.maximum((s.astype("datetime64[D]") - d0).astype(np.int64), 0)
+    last = np.minimum((e.astype("datetime64[D]") - d0).astype(np.int64), n_days - 1)
+    counts = np.maximum(last - first + 1, 0)
+
+    rep = np.repeat(np.arange(len(df)), counts)
+    offset = np.arange(len(rep)) - np.repeat(np.cumsum(counts) - counts, counts)
+    day = first[rep] + offset
+
+    day_start = (d0 + day).astype("datetime64[us]") + np.timedelta64(from_hour, "h")
+    day_end = (d0 + day).astype("datetime64[us]") + np.timedelta64(to_hour, "h")
+    seg_us = (np.minimum(e[rep], day_end) - np.maximum(s[rep], day_start)).astype(np.int64)
+    pos = seg_us > 0
+    return rep[pos], day[pos], seg_us[pos] // 60_000_000
+
+def utilization_frame(first_day: date, booked: list[int]) -> pd.DataFrame:
+    work_minutes = (config.WORKDAY_END_HOUR - config.WORKDAY_START_HOUR) * 60
+    return pd.DataFrame({
+        "Date": [(first_day + timedelta(days=i)).isoformat() for i in range(len(booked))],
+        "BookedMinutes": booked,
+        "UtilizationPct": [round(100.0 * b / max(1, work_minutes), 2) for b in booked],
+    })
+
+def utilization_by_day(df: pd.DataFrame, start_at: datetime, end_at: datetime) -> pd.DataFrame:
     if df.empty:
         return pd.DataFrame(columns=["Date","BookedMinutes","UtilizationPct"])
 
-    records = []
-    cur = start_at.date()
-    last = end_at.date()
-    while cur <= last:
-        day_start = datetime(cur.year, cur.month, cur.day, wd_start, 0, 0)
-        day_end = datetime(cur.year, cur.month, cur.day, wd_end, 0, 0)
-        mask = (df["StartAt"] < day_end) & (df["EndAt"] > day_start)
-        day_df = df[mask]
-        booked = 0
-        for _, r in day_df.iterrows():
-            s = max(r["StartAt"].to_pydatetime(), day_start)
-            e = min(r["EndAt"].to_pydatetime(), day_end)
-            if e > s:
-                booked += int((e - s).total_seconds() // 60)
-        records.append({
-            "Date": cur.isoformat(),
-            "BookedMinutes": booked,
-            "UtilizationPct": round(100.0 * booked / max(1, work_minutes), 2),
-        })
-        cur = cur + timedelta(days=1)
-
-    return pd.DataFrame(records)
+    first_day = start_at.date()
+    n_days = (end_at.date() - first_day).days + 1
+    if n_days <= 0:
+        return pd.DataFrame([])
+
+    _, day, minutes = day_segments(df, first_day, n_days, config.WORKDAY_START_HOUR, config.WORKDAY_END_HOUR)
+    booked = np.bincount(day, weights=minutes, minlength=n_days).astype(np.int64).tolist()
+    return utilization_frame(first_day, booked)
 
 def top_resources(df: pd.DataFrame, top_n: int = 10) -> pd.DataFrame:
     if df.empty:
@@ -64,4 +203,4 @@ def top_resources(df: pd.DataFrame, top_n: int = 10) -> pd.DataFrame:
     mins = (df["EndAt"] - df["StartAt"]).dt.total_seconds() // 60
     tmp = df.copy()
     tmp["Minutes"] = mins.astype(int)
-    return tmp.groupby("Resource", as_index=False)["Minutes"].sum().sort_values("Minutes", ascending=False).head(top_n)
+    return tmp.groupby("Resource", as_index=False, observed=True)["Minutes"].sum().sort_values("Minutes", ascending=False).head(top_n)
@@ -0,0 +1,51 @@
+import heapq
+from typing import Optional
+
+import config
+from db import DB
+
+# Кому из FAC отдать заявку в закрытую зону. APPROVER_POLICY:
+#   "first"         — всегда FAC с наименьшим UserID (прежнее поведение);
+#   "least_pending" — тот, у кого меньше всего открытых согласований; серия
+#                     заявок раскладывается по одной, каждый раз самому свободному.
+# Нагрузка — один агрегатный запрос по IX_BookingApprovals_ApproverStatus
+# (sql/approvers.sql). Пакеты T-SQL в booking_service считают то же самое на
+# сервере; READPAST — чужие незакоммиченные заявки не ждём, счёт приблизительный.
+
+POLICIES = ("first", "least_pending")
+
+_LOAD_SQL = """
+    SELECT ur.UserID, COUNT(a.ApprovalID) AS Pending
+    FROM dbo.UserRoles ur
+    JOIN dbo.Roles r ON r.RoleID = ur.RoleID
+    LEFT JOIN dbo.BookingApprovals a WITH (READPAST)
+        ON a.ApproverUserID = ur.UserID
+       AND a.ApprovalStatusID = (SELECT ApprovalStatusID FROM dbo.ApprovalStatuses WHERE StatusCode = 'PENDING')
+    WHERE r.RoleCode = 'FAC'
+    GROUP BY ur.UserID
+"""
+
+def approver_policy(policy: Optional[str] = None) -> str:
+    policy = policy or getattr(config, "APPROVER_POLICY", "least_pending")
+    if policy not in POLICIES:
+        raise ValueError(f"APPROVER_POLICY: {' или '.join(POLICIES)}, не {policy!r}")
+    return policy
+
+def approver_load(db: DB) -> dict[int, int]:
+    # UserID FAC -> открытых согласований
+    return {int(r.UserID): int(r.Pending) for r in db.fetchall(_LOAD_SQL)}
+
+def assign(load: dict[int, int], n: int, policy: Optional[str] = None) -> list[int]:
+    # n согласующих подряд; load не меняется. Пусто — если FAC нет
+    if not load or n <= 0:
+        return []
+    if approver_policy(policy) == "first":
+        return [min(load)] * n
+    heap = [(pending, uid) for uid, pending in load.items()]
+    heapq.heapify(heap)
+    out = []
+    for _ in range(n):
+        pending, uid = heapq.heappop(heap)
+        out.append(uid)
+        heapq.heappush(heap, (pending + 1, uid))
+    return out
@@ -0,0 +1,98 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import config
+from db import DB
+from services.batch_writer import BatchWriter
+from services.common import get_id_by_code
+
+# Журнал действий dbo.AuditLogs вне горячего пути записи: сервис после commit
+# кладёт событие в очередь, services.batch_writer пишет их пачками
+# (executemany, на SQL Server — fast_executemany) на своём соединении.
+# Время события фиксируется при постановке в очередь. Очередь, пачка и
+# политика переполнения — AUDIT_* в config.py; close_audit() из main.on_close.
+# Коды действий на SQL Server заводит sql/audit_actions.sql; событие с
+# неизвестным кодом не пишется (ошибка в лог, в stats — failed).
+
+_log = logging.getLogger("officebank.audit")
+
+_INSERT_SQL = """
+    INSERT INTO dbo.AuditLogs(UserID, ActionTypeID, EntityName, EntityID, OccurredAt, Details)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+@dataclass(frozen=True)
+class AuditEvent:
+    user_id: int
+    action: str               # AuditActionTypes.ActionCode
+    entity: str
+    entity_id: Optional[int]
+    details: Optional[str]
+    occurred_at: datetime     # UTC, как SYSUTCDATETIME()
+
+class AuditWriter(BatchWriter):
+    name = "audit"
+
+    def __init__(
+        self,
+        connect: Callable[[], DB] = DB.connect,
+        max_queue: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        overflow: Optional[str] = None,
+        block_timeout: Optional[float] = None,
+    ):
+        super().__init__(
+            connect,
+            max_queue or getattr(config, "AUDIT_QUEUE_SIZE", 10000),
+            batch_size or getattr(config, "AUDIT_BATCH_SIZE", 200),
+            flush_interval if flush_interval is not None else getattr(config, "AUDIT_FLUSH_INTERVAL_SEC", 1.0),
+            overflow or getattr(config, "AUDIT_OVERFLOW", "drop"),
+            block_timeout if block_timeout is not None else getattr(config, "AUDIT_BLOCK_TIMEOUT_SEC", 0.05),
+            getattr(config, "AUDIT_CLOSE_TIMEOUT_SEC", 5.0),
+        )
+
+    def log(self, user_id: int, action: str, entity: str, entity_id: Optional[int] = None,
+            details: Optional[str] = None) -> bool:
+        # False — событие потеряно (очередь полна или писатель закрыт)
+        return self.put(AuditEvent(user_id, action, entity, entity_id, details,
+                                   datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)))
+
+    def _write(self, db: DB, batch: list[AuditEvent]) -> int:
+        rows = []
+        for e in batch:
+            try:
+                action_id = get_id_by_code(db, "AuditActionTypes", "ActionCode", "ActionTypeID", e.action)
+            except ValueError:
+                _log.error("audit: неизвестное действие %s", e.action)
+                continue
+            rows.append((e.user_id, action_id, e.entity, e.entity_id, e.occurred_at, e.details))
+        db.executemany(_INSERT_SQL, rows, fast=True)
+        db.commit()
+        return len(rows)
+
+_writer: Optional[AuditWriter] = None
+
+def get_audit() -> Optional[AuditWriter]:
+    return _writer
+
+def enable_audit(connect: Callable[[], DB] = DB.connect, **kwargs) -> AuditWriter:
+    global _writer
+    close_audit()
+    _writer = AuditWriter(connect, **kwargs)
+    return _writer
+
+def close_audit(timeout: Optional[float] = None) -> None:
+    global _writer
+    writer, _writer = _writer, None
+    if writer is not None:
+        writer.close(timeout)
+
+def audit(user_id: Optional[int], action: str, entity: str, entity_id: Optional[int] = None,
+          details: Optional[str] = None) -> None:
+    # вызывать после commit; без писателя или без пользователя — ничего не делает
+    writer = _writer
+    if writer is not None and user_id is not None:
+        writer.log(user_id, action, entity, entity_id, details)
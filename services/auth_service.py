@@ -1,8 +1,9 @@
+from contextlib import nullcontext
 from dataclasses import dataclass
-from typing import Optional
-from db import DB
-from security import verify_password
-from services.common import get_user_roles
+from typing import Callable, ContextManager, Optional
+from db import DB, ConnectionPool
+from services.audit import audit
+from security import burn_verify, hash_password, needs_rehash, verify_password
 
 @dataclass
 class AuthUser:
@@ -12,16 +13,55 @@ class AuthUser:
     full_name: str
     roles: set[str]
 
-def login(db: DB, login_text: str, password: str) -> Optional[AuthUser]:
-    row = db.fetchone("""
-        SELECT u.UserID, u.EmployeeID, u.Login, u.PasswordHash, e.FullName
-        FROM dbo.UserAccounts u
-        JOIN dbo.Employees e ON e.EmployeeID = u.EmployeeID
-        WHERE u.Login = ? AND u.IsLocked = 0
-    """, (login_text,))
-    if not row:
+# Учётка, хэш и роли — одним запросом (строка на каждую роль)
+_ACCOUNT_SQL = """
+    SELECT u.UserID, u.EmployeeID, u.Login, u.PasswordHash, e.FullName, r.RoleCode
+    FROM dbo.UserAccounts u
+    JOIN dbo.Employees e ON e.EmployeeID = u.EmployeeID
+    LEFT JOIN dbo.UserRoles ur ON ur.UserID = u.UserID
+    LEFT JOIN dbo.Roles r ON r.RoleID = ur.RoleID
+    WHERE u.Login = ? AND u.IsLocked = 0
+"""
+
+def _fetch_account(db: DB, login_text: str) -> tuple[Optional[AuthUser], Optional[str]]:
+    rows = db.fetchall(_ACCOUNT_SQL, (login_text,)) or []
+    if not rows:
+        return None, None
+    row = rows[0]
+    roles = {str(r.RoleCode) for r in rows if r.RoleCode is not None}
+    return AuthUser(int(row.UserID), int(row.EmployeeID), str(row.Login), str(row.FullName), roles), \
+        str(row.PasswordHash)
+
+def _store_rehash(db: DB, user_id: int, old_hash: str, new_hash: str) -> None:
+    # условие по старому хэшу: не затираем пароль, сменённый параллельно
+    db.execute("UPDATE dbo.UserAccounts SET PasswordHash=? WHERE UserID=? AND PasswordHash=?",
+               (new_hash, user_id, old_hash))
+    db.commit()
+
+def _check_password(user: Optional[AuthUser], hashed: Optional[str], password: str,
+                    lease: Callable[[], ContextManager[DB]]) -> Optional[AuthUser]:
+    # Общая часть login и login_pooled: bcrypt, перехэширование и журнал.
+    # lease() даёт соединение для записи нового хэша — только на время UPDATE.
+    if user is None:
+        burn_verify(password)
         return None
-    if not verify_password(password, row.PasswordHash):
+    if not verify_password(password, hashed):
         return None
-    roles = get_user_roles(db, int(row.UserID))
-    return AuthUser(int(row.UserID), int(row.EmployeeID), str(row.Login), str(row.FullName), roles)
+    if needs_rehash(hashed):
+        new_hash = hash_password(password)
+        with lease() as db:
+            _store_rehash(db, user.user_id, hashed, new_hash)
+    audit(user.user_id, "LOGIN", "UserAccounts", user.user_id)
+    return user
+
+def login(db: DB, login_text: str, password: str) -> Optional[AuthUser]:
+    user, hashed = _fetch_account(db, login_text)
+    return _check_password(user, hashed, password, lambda: nullcontext(db))
+
+def login_pooled(pool: ConnectionPool, login_text: str, password: str) -> Optional[AuthUser]:
+    # То же, что login, но соединение берётся только на время запросов:
+    # bcrypt (~250 мс при cost 12) не держит его занятым.
+    # Вызывать из рабочего потока (TaskRunner), не из потока Tk.
+    with pool.lease() as db:
+        user, hashed = _fetch_account(db, login_text)
+    return _check_password(user, hashed, password, pool.lease)
@@ -0,0 +1,171 @@
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from typing import Iterable, Optional, Sequence
+from db import DB
+import config
+
+# Поиск свободного вместо «угадай ResourceID и попробуй create_booking».
+# find_available_resources — один запрос: только ресурсы в статусе ACTIVE,
+# фильтры по ресурсу и анти-соединение (NOT EXISTS) с пересекающимися активными бронями. next_free_slots — окна
+# между отсортированными бронями одного ресурса.
+
+@dataclass
+class AvailableResource:
+    resource_id: int
+    kind: str
+    display_name: str
+    zone_name: str
+    floor_no: int | None
+    capacity: int | None
+    is_hotdesk: bool | None
+    requires_approval: bool   # зона с ограниченным доступом — бронь уйдёт на согласование
+
+_AVAILABLE_SQL = """
+    SELECT r.ResourceID, r.ResourceKind, r.DisplayName, z.ZoneName, z.FloorNo, z.IsRestricted,
+           rm.Capacity, d.IsHotDesk
+    FROM dbo.Resources r
+    JOIN dbo.Zones z ON z.ZoneID = r.ZoneID
+    JOIN dbo.ResourceStatuses rs ON rs.ResourceStatusID = r.ResourceStatusID
+    LEFT JOIN dbo.Rooms rm ON rm.ResourceID = r.ResourceID
+    LEFT JOIN dbo.Desks d ON d.ResourceID = r.ResourceID
+    WHERE rs.StatusCode = 'ACTIVE'
+      AND NOT EXISTS (
+        SELECT 1
+        FROM dbo.Bookings b
+        JOIN dbo.BookingStatuses bs ON bs.BookingStatusID = b.BookingStatusID
+        WHERE b.ResourceID = r.ResourceID
+          AND bs.StatusCode NOT IN ('CANCELLED','REJECTED')
+          AND b.StartAt < ?
+          AND b.EndAt   > ?
+    )"""
+
+def find_available_resources(
+    db: DB,
+    start_at: datetime,
+    end_at: datetime,
+    kind: Optional[str] = None,
+    min_capacity: Optional[int] = None,
+    floor: Optional[int] = None,
+    equipment: Optional[Sequence[str]] = None,
+    hotdesk: Optional[bool] = None,
+    user_id: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> list[AvailableResource]:
+    # equipment — названия из dbo.Equipments, нужны все сразу.
+    # user_id — скрыть закрытые зоны, куда у ролей пользователя нет доступа (dbo.ZoneAccess).
+    if end_at <= start_at:
+        raise ValueError("Окончание должно быть позже начала.")
+    sql = _AVAILABLE_SQL
+    params: list = [end_at, start_at]
+    if kind:
+        sql += "\n      AND r.ResourceKind = ?"
+        params.append(kind)
+    if min_capacity:
+        sql += "\n      AND rm.Capacity >= ?"
+        params.append(min_capacity)
+    if floor is not None:
+        sql += "\n      AND z.FloorNo = ?"
+        params.append(floor)
+    if hotdesk is not None:
+        sql += "\n      AND d.IsHotDesk = ?"
+        params.append(1 if hotdesk else 0)
+    names = sorted(set(equipment or ()))
+    if names:
+        sql += f"""
+      AND (SELECT COUNT(DISTINCT re.EquipmentID)
+           FROM dbo.ResourceEquipments re
+           JOIN dbo.Equipments e ON e.EquipmentID = re.EquipmentID
+           WHERE re.ResourceID = r.ResourceID
+             AND e.EquipmentName IN ({", ".join("?" * len(names))})) = ?"""
+        params += names + [len(names)]
+    if user_id is not None:
+        sql += """
+      AND (z.IsRestricted = 0 OR EXISTS (
+           SELECT 1 FROM dbo.ZoneAccess za
+           JOIN dbo.UserRoles ur ON ur.RoleID = za.RoleID
+           WHERE za.ZoneID = z.ZoneID AND ur.UserID = ?))"""
+        params.append(user_id)
+    sql += "\n    ORDER BY z.IsRestricted, z.FloorNo, r.DisplayName"
+    if limit:
+        sql += "\n    OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY"
+        params.append(limit)
+
+    out = []
+    for x in db.fetchall(sql, tuple(params)) or []:
+        out.append(AvailableResource(
+            int(x.ResourceID), str(x.ResourceKind), str(x.DisplayName), str(x.ZoneName),
+            int(x.FloorNo) if x.FloorNo is not None else None,
+            int(x.Capacity) if x.Capacity is not None else None,
+            bool(x.IsHotDesk) if x.IsHotDesk is not None else None,
+            bool(x.IsRestricted),
+        ))
+    return out
+
+def _windows(start_at: datetime, end_at: datetime, workday_only: bool) -> list[tuple[datetime, datetime]]:
+    if not workday_only:
+        return [(start_at, end_at)]
+    out = []
+    d = start_at.date()
+    while d <= end_at.date():
+        ws = max(start_at, datetime.combine(d, time(config.WORKDAY_START_HOUR)))
+        we = min(end_at, datetime.combine(d, time(config.WORKDAY_END_HOUR)))
+        if we > ws:
+            out.append((ws, we))
+        d += timedelta(days=1)
+    return out
+
+def free_gaps(
+    busy: Iterable[tuple[datetime, datetime]],
+    start_at: datetime,
+    end_at: datetime,
+    duration: timedelta,
+    workday_only: bool = True,
+    limit: Optional[int] = None,
+) -> list[tuple[datetime, datetime]]:
+    # Свободные промежутки не короче duration. busy может пересекаться и быть
+    # в любом порядке — сортируем и идём по нему одним проходом.
+    intervals = sorted((s, e) for s, e in busy if e > start_at and s < end_at)
+    gaps: list[tuple[datetime, datetime]] = []
+    i = 0
+    for ws, we in _windows(start_at, end_at, workday_only):
+        while i < len(intervals) and intervals[i][1] <= ws:
+            i += 1
+        cur = ws
+        j = i
+        while j < len(intervals) and intervals[j][0] < we:
+            s, e = intervals[j]
+            if s - cur >= duration:
+                gaps.append((cur, s))
+            cur = max(cur, e)
+            j += 1
+        if we - cur >= duration:
+            gaps.append((cur, we))
+        if limit and len(gaps) >= limit:
+            return gaps[:limit]
+    return gaps
+
+def next_free_slots(
+    db: DB,
+    resource_id: int,
+    duration: timedelta,
+    horizon: timedelta = timedelta(days=7),
+    start_at: Optional[datetime] = None,
+    workday_only: bool = True,
+    limit: int = 5,
+) -> list[tuple[datetime, datetime]]:
+    if duration <= timedelta(0):
+        raise ValueError("Длительность должна быть положительной.")
+    start_at = start_at or datetime.now().replace(second=0, microsecond=0)
+    end_at = start_at + horizon
+    rows = db.fetchall("""
+        SELECT b.StartAt, b.EndAt
+        FROM dbo.Bookings b
+        JOIN dbo.BookingStatuses bs ON bs.BookingStatusID = b.BookingStatusID
+        WHERE b.ResourceID = ?
+          AND bs.StatusCode NOT IN ('CANCELLED','REJECTED')
+          AND b.StartAt < ?
+          AND b.EndAt   > ?
+        ORDER BY b.StartAt
+    """, (resource_id, end_at, start_at))
+    return free_gaps(((r.StartAt, r.EndAt) for r in rows or []), start_at, end_at, duration,
+                     workday_only, limit)
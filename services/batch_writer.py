@@ -0,0 +1,140 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from db import DB, run_transaction
+
+# Фоновая запись пачками: сервис кладёт элемент в ограниченную очередь
+# (микросекунды), поток забирает сколько накопилось (до batch_size, ждёт
+# ещё linger после первого элемента) и пишет
+# на своём соединении одной транзакцией (run_transaction — с повтором при
+# блокировках). Полная очередь: overflow="drop" теряет элемент сразу,
+# "block" ждёт место до block_timeout; потерянные считаются в stats().
+# close() дописывает очередь. Наследники задают name и _write(db, batch).
+
+class BatchWriter:
+    name = "batch"
+
+    def __init__(
+        self,
+        connect: Callable[[], DB],
+        max_queue: int,
+        batch_size: int,
+        flush_interval: float,
+        overflow: str,
+        block_timeout: float,
+        close_timeout: float = 5.0,
+        linger: float = 0.0,
+    ):
+        if overflow not in ("drop", "block"):
+            raise ValueError(f"{self.name}: overflow — drop или block, не {overflow!r}")
+        self.connect = connect
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval   # сколько ждать первый элемент пачки
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.close_timeout = close_timeout
+        self.linger = linger                   # сколько ещё собирать пачку после первого элемента
+        self.logger = logging.getLogger(f"officebank.{self.name}")
+        self._queue: queue.Queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.written = 0
+        self.dropped = 0          # очередь полна или писатель закрыт
+        self.failed = 0           # не записаны из-за ошибки
+        self.batches = 0
+        self._thread = threading.Thread(target=self._loop, name=f"{self.name}-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, item: Any) -> bool:
+        # False — элемент потерян
+        if not self._stop.is_set():
+            try:
+                if self.overflow == "block":
+                    self._queue.put(item, timeout=self.block_timeout)
+                else:
+                    self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                pass
+        with self._lock:
+            self.dropped += 1
+        return False
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        # дождаться записи всего, что уже в очереди
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._thread.join(timeout if timeout is not None else self.close_timeout)
+        if self._thread.is_alive():
+            self.logger.warning("%s: не дописано при выходе: %d", self.name, self._queue.qsize())
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped,
+                    "failed": self.failed, "batches": self.batches}
+
+    def _write(self, db: DB, batch: list) -> int:
+        # записать и зафиксировать пачку; вернуть, сколько элементов записано
+        raise NotImplementedError
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            wait = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=wait) if wait > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _open(self) -> Optional[DB]:
+        try:
+            return self.connect()
+        except Exception:
+            self.logger.exception("%s: нет соединения с БД", self.name)
+            return None
+
+    def _loop(self) -> None:
+        db = self._open()
+        try:
+            while not (self._stop.is_set() and self._queue.empty()):
+                batch = self._next_batch()
+                if not batch:
+                    continue
+                if db is None:
+                    db = self._open()
+                try:
+                    if db is None:
+                        raise ConnectionError("нет соединения с БД")
+                    n = run_transaction(db, lambda d: self._write(d, batch), self.name)
+                    with self._lock:
+                        self.written += n
+                        self.failed += len(batch) - n
+                        self.batches += 1
+                except Exception:
+                    self.logger.exception("%s: пачка из %d не записана", self.name, len(batch))
+                    with self._lock:
+                        self.failed += len(batch)
+                    if db is not None:
+                        db.close()
+                        db = None
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            if db is not None:
+                db.close()
@@ -1,8 +1,21 @@
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from types import SimpleNamespace
 from typing import Optional
-from db import DB
-from services.common import get_id_by_code, get_user_roles
+import config
+from db import DB, transactional
+from services.approvers import approver_load, approver_policy, assign
+from services.audit import audit
+from services.common import get_id_by_code
+from services.interval_index import get_index
+from services.notifications import notify
+from services.recurrence import expand_recurrence, parse_rrule
+
+@dataclass
+class BookingConflict:
+    booking_id: int
+    start_at: datetime
+    end_at: datetime
 
 @dataclass
 class BookingResult:
@@ -10,40 +23,170 @@ class BookingResult:
     message: str
     booking_id: int | None = None
     requires_approval: bool = False
+    conflict: BookingConflict | None = None
+
+# Весь путь бронирования — один пакет T-SQL и один round trip.
+# UPDLOCK+HOLDLOCK берут блокировку диапазона по IX_Bookings_ResourceTime
+# на (ResourceID, StartAt < @EndAt): параллельная вставка в этот диапазон ждёт
+# нашего COMMIT/ROLLBACK, поэтому двойное бронирование невозможно, а два
+# одновременных претендента сериализуются на U-блокировке без взаимоблокировки.
+_CREATE_BOOKING_SQL = """
+SET NOCOUNT ON;
+DECLARE @ResourceID int = ?, @UserID int = ?,
+        @StartAt datetime2(0) = ?, @EndAt datetime2(0) = ?,
+        @Title nvarchar(200) = ?, @Notes nvarchar(500) = ?, @Participants smallint = ?,
+        @Policy varchar(20) = ?;
+DECLARE @Outcome varchar(20), @Restricted bit, @RequiresApproval bit = 0,
+        @ApproverID int, @BookingID bigint,
+        @ConflictID bigint, @ConflictStart datetime2(0), @ConflictEnd datetime2(0);
+DECLARE @ins TABLE (BookingID bigint);
+
+SELECT @Restricted = z.IsRestricted
+FROM dbo.Resources r
+JOIN dbo.Zones z ON z.ZoneID = r.ZoneID
+WHERE r.ResourceID = @ResourceID;
+
+SELECT TOP 1 @ConflictID = b.BookingID, @ConflictStart = b.StartAt, @ConflictEnd = b.EndAt
+FROM dbo.Bookings b WITH (UPDLOCK, HOLDLOCK)
+JOIN dbo.BookingStatuses bs ON bs.BookingStatusID = b.BookingStatusID
+WHERE b.ResourceID = @ResourceID
+  AND bs.StatusCode NOT IN ('CANCELLED','REJECTED')
+  AND b.StartAt < @EndAt
+  AND b.EndAt   > @StartAt
+ORDER BY b.StartAt;
+
+IF @Restricted = 1 AND NOT EXISTS (
+    SELECT 1 FROM dbo.UserRoles ur JOIN dbo.Roles r ON r.RoleID = ur.RoleID
+    WHERE ur.UserID = @UserID AND r.RoleCode IN ('FAC','ADM'))
+BEGIN
+    SET @RequiresApproval = 1;
+    SELECT TOP 1 @ApproverID = ur.UserID
+    FROM dbo.UserRoles ur
+    JOIN dbo.Roles r ON r.RoleID = ur.RoleID
+    LEFT JOIN dbo.BookingApprovals a WITH (READPAST)
+        ON a.ApproverUserID = ur.UserID
+       AND a.ApprovalStatusID = (SELECT ApprovalStatusID FROM dbo.ApprovalStatuses WHERE StatusCode = 'PENDING')
+    WHERE r.RoleCode = 'FAC'
+    GROUP BY ur.UserID
+    ORDER BY CASE WHEN @Policy = 'least_pending' THEN COUNT(a.ApprovalID) ELSE 0 END, ur.UserID;
+END
+
+IF @Restricted IS NULL
+    SET @Outcome = 'NO_RESOURCE';
+ELSE IF @ConflictID IS NOT NULL
+    SET @Outcome = 'CONFLICT';
+ELSE IF @RequiresApproval = 1 AND @ApproverID IS NULL
+    SET @Outcome = 'NO_APPROVER';
+ELSE
+BEGIN
+    INSERT INTO dbo.Bookings(
+        ResourceID, RequestedByUserID, StartAt, EndAt,
+        Title, Notes, ParticipantsCount, BookingStatusID
+    )
+    OUTPUT INSERTED.BookingID INTO @ins
+    SELECT @ResourceID, @UserID, @StartAt, @EndAt, @Title, @Notes, @Participants, bs.BookingStatusID
+    FROM dbo.BookingStatuses bs
+    WHERE bs.StatusCode = CASE WHEN @RequiresApproval = 1 THEN 'PENDING' ELSE 'APPROVED' END;
 
-def has_conflict(db: DB, resource_id: int, start_at: datetime, end_at: datetime) -> bool:
-    rows = db.fetchall("""
-        SELECT b.BookingID
-        FROM dbo.Bookings b
-        JOIN dbo.BookingStatuses bs ON bs.BookingStatusID = b.BookingStatusID
-        WHERE b.ResourceID = ?
-          AND bs.StatusCode NOT IN ('CANCELLED','REJECTED')
-          AND b.StartAt < ?
-          AND b.EndAt   > ?
-    """, (resource_id, end_at, start_at))
-
-    rows = rows or []   # защита на случай некорректного ответа драйвера/обёртки
-    return len(rows) > 0
-
-def _zone_is_restricted(db: DB, resource_id: int) -> bool:
-    row = db.fetchone("""
-        SELECT z.IsRestricted
-        FROM dbo.Resources r
-        JOIN dbo.Zones z ON z.ZoneID = r.ZoneID
-        WHERE r.ResourceID = ?
-    """, (resource_id,))
-    return bool(row.IsRestricted) if row else False
-
-def _pick_approver_user(db: DB) -> Optional[int]:
-    row = db.fetchone("""
-        SELECT TOP 1 ur.UserID
-        FROM dbo.UserRoles ur
-        JOIN dbo.Roles r ON r.RoleID = ur.RoleID
-        WHERE r.RoleCode = 'FAC'
-        ORDER BY ur.UserID
-    """)
-    return int(row.UserID) if row else None
+    SELECT @BookingID = BookingID FROM @ins;
 
+    IF @RequiresApproval = 1
+        INSERT INTO dbo.BookingApprovals(BookingID, ApproverUserID, ApprovalStatusID)
+        SELECT @BookingID, @ApproverID, aps.ApprovalStatusID
+        FROM dbo.ApprovalStatuses aps
+        WHERE aps.StatusCode = 'PENDING';
+
+    SET @Outcome = CASE WHEN @BookingID IS NULL THEN 'NO_ID' ELSE 'OK' END;
+END
+
+SELECT @Outcome AS Outcome, @BookingID AS BookingID, @RequiresApproval AS RequiresApproval,
+       @ConflictID AS ConflictBookingID, @ConflictStart AS ConflictStartAt, @ConflictEnd AS ConflictEndAt;
+"""
+
+# Те же проверки и вставки, что в _CREATE_BOOKING_SQL/_BATCH_CREATE_SQL, но
+# отдельными запросами — для диалектов без пакетов T-SQL (SQLite). Вместо
+# UPDLOCK+HOLDLOCK dialect.begin_write берёт блокировку записи до COMMIT.
+# items — (ItemNo, ResourceID, StartAt, EndAt, Title, Notes, Participants);
+# строки результата — как у _BATCH_CREATE_SQL.
+_PRIVILEGED_SQL = """
+    SELECT COUNT(*) AS cnt FROM dbo.UserRoles ur JOIN dbo.Roles r ON r.RoleID = ur.RoleID
+    WHERE ur.UserID = ? AND r.RoleCode IN ('FAC','ADM')
+"""
+
+_ZONE_SQL = """
+    SELECT z.IsRestricted FROM dbo.Resources r JOIN dbo.Zones z ON z.ZoneID = r.ZoneID
+    WHERE r.ResourceID = ?
+"""
+
+_CONFLICT_SQL = """
+    SELECT b.BookingID, b.StartAt, b.EndAt
+    FROM dbo.Bookings b
+    JOIN dbo.BookingStatuses bs ON bs.BookingStatusID = b.BookingStatusID
+    WHERE b.ResourceID = ?
+      AND bs.StatusCode NOT IN ('CANCELLED','REJECTED')
+      AND b.StartAt < ?
+      AND b.EndAt   > ?
+    ORDER BY b.StartAt
+"""
+
+_INSERT_BOOKING_SQL = """
+    INSERT INTO dbo.Bookings(ResourceID, RequestedByUserID, StartAt, EndAt, Title, Notes,
+                             ParticipantsCount, BookingStatusID)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    RETURNING BookingID
+"""
+
+def _create_stepwise(db: DB, user_id: int, items: list[tuple], all_or_nothing: bool) -> list:
+    db.dialect.begin_write(db)
+    privileged = db.fetchone(_PRIVILEGED_SQL, (user_id,)).cnt > 0
+    load = approver_load(db)
+    zone_q, conflict_q = db.prepare(_ZONE_SQL), db.prepare(_CONFLICT_SQL)
+    out = []
+    for n, rid, s, e, *_ in items:
+        zone = zone_q.fetchone((rid,))
+        c = conflict_q.fetchone((rid, e, s))
+        requires = zone is not None and bool(zone.IsRestricted) and not privileged
+        if zone is None:
+            outcome = "NO_RESOURCE"
+        elif c is not None:
+            outcome = "CONFLICT"
+        elif requires and not load:
+            outcome = "NO_APPROVER"
+        else:
+            outcome = "OK"
+        out.append(SimpleNamespace(
+            ItemNo=n, Outcome=outcome, BookingID=None, RequiresApproval=requires,
+            ConflictBookingID=c.BookingID if c else None,
+            ConflictStartAt=c.StartAt if c else None, ConflictEndAt=c.EndAt if c else None))
+    if all_or_nothing and any(o.Outcome != "OK" for o in out):
+        return out
+
+    pending = get_id_by_code(db, "BookingStatuses", "StatusCode", "BookingStatusID", "PENDING")
+    approved = get_id_by_code(db, "BookingStatuses", "StatusCode", "BookingStatusID", "APPROVED")
+    insert_q = db.prepare(_INSERT_BOOKING_SQL)
+    approvers = iter(assign(load, sum(o.Outcome == "OK" and o.RequiresApproval for o in out)))
+    for o, (n, rid, s, e, title, notes, participants) in zip(out, items):
+        if o.Outcome != "OK":
+            continue
+        status = pending if o.RequiresApproval else approved
+        o.BookingID = insert_q.fetchall((rid, user_id, s, e, title, notes, participants, status))[0].BookingID
+        if o.RequiresApproval:
+            db.execute("INSERT INTO dbo.BookingApprovals(BookingID, ApproverUserID, ApprovalStatusID) "
+                       "VALUES (?, ?, ?)",
+                       (o.BookingID, next(approvers),
+                        get_id_by_code(db, "ApprovalStatuses", "StatusCode", "ApprovalStatusID", "PENDING")))
+    return out
+
+
+_CONFLICT_MSG = "Конфликт: ресурс занят в выбранный период."
+
+_FAIL_MESSAGES = {
+    "NO_RESOURCE": "Ресурс не найден.",
+    "NO_APPROVER": "Нет согласующего с ролью FAC.",
+    "NO_ID": "Не удалось получить BookingID после вставки (проверь IDENTITY у BookingID).",
+}
+
+@transactional
 def create_booking(
     db: DB,
     resource_id: int,
@@ -58,76 +201,371 @@ def create_booking(
     if end_at <= start_at:
         return BookingResult(False, "End должен быть позже Start.")
 
-    if has_conflict(db, resource_id, start_at, end_at):
-        return BookingResult(False, "Конфликт: ресурс занят в выбранный период.")
-
-    # 2) Нужны ли согласования
-    roles = get_user_roles(db, requested_by_user_id)
-    restricted = _zone_is_restricted(db, resource_id)
-    requires_approval = restricted and ("FAC" not in roles) and ("ADM" not in roles)
-
-    # 3) Статус брони
-    bs_code = "PENDING" if requires_approval else "APPROVED"
-    booking_status_id = get_id_by_code(db, "BookingStatuses", "StatusCode", "BookingStatusID", bs_code)
-
-    # 4) Вставка с OUTPUT (надёжно получаем BookingID)
-    cur = db.conn.cursor()
-    cur.execute("""
-        INSERT INTO dbo.Bookings(
-            ResourceID, RequestedByUserID, StartAt, EndAt,
-            Title, Notes, ParticipantsCount, BookingStatusID
-        )
-        OUTPUT INSERTED.BookingID
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        resource_id, requested_by_user_id, start_at, end_at,
-        title or None, notes or None, participants, booking_status_id
-    ))
-
-    row = cur.fetchone()
-    if not row or row[0] is None:
-        db.rollback()
-        return BookingResult(False, "Не удалось получить BookingID после вставки (проверь IDENTITY у BookingID).", None)
+    # Индекс отсекает заведомо конфликтные попытки без обращения к серверу;
+    # «свободно» по индексу всё равно перепроверяется в БД.
+    index = get_index()
+    if index is not None and index.is_free(resource_id, start_at, end_at) is False:
+        return BookingResult(False, _CONFLICT_MSG)
 
-    booking_id = int(row[0])
+    # 2) Проверка конфликта, согласование, вставка брони и согласования — атомарно
+    if db.dialect.tsql_batches:
+        row = db.fetchone(_CREATE_BOOKING_SQL, (
+            resource_id, requested_by_user_id, start_at, end_at,
+            title or None, notes or None, participants, approver_policy(),
+        ))
+    else:
+        row = _create_stepwise(db, requested_by_user_id, [
+            (0, resource_id, start_at, end_at, title or None, notes or None, participants),
+        ], True)[0]
+    outcome = str(row.Outcome) if row else "NO_ID"
 
-    # 5) Если нужно согласование — создаём запись согласования
-    if requires_approval:
-        approver_id = _pick_approver_user(db)
-        if not approver_id:
-            db.rollback()
-            return BookingResult(False, "Нет согласующего с ролью FAC.", None)
+    if outcome == "CONFLICT":
+        db.rollback()
+        conflict = BookingConflict(int(row.ConflictBookingID), row.ConflictStartAt, row.ConflictEndAt)
+        if index is not None:
+            index.add(conflict.booking_id, resource_id, conflict.start_at, conflict.end_at)
+        return BookingResult(False, _CONFLICT_MSG, conflict=conflict)
 
-        approval_status_id = get_id_by_code(db, "ApprovalStatuses", "StatusCode", "ApprovalStatusID", "PENDING")
-        db.execute("""
-            INSERT INTO dbo.BookingApprovals(BookingID, ApproverUserID, ApprovalStatusID)
-            VALUES (?, ?, ?)
-        """, (booking_id, approver_id, approval_status_id))
+    if outcome != "OK":
+        db.rollback()
+        return BookingResult(False, _FAIL_MESSAGES.get(outcome, _FAIL_MESSAGES["NO_ID"]))
 
     db.commit()
+    booking_id = int(row.BookingID)
+    requires_approval = bool(row.RequiresApproval)
+    audit(requested_by_user_id, "BOOKING_CREATE", "Bookings", booking_id)
+    if requires_approval:
+        notify("PENDING", booking_id)
+    if index is not None:
+        index.add(booking_id, resource_id, start_at, end_at)
     msg = "Бронь подтверждена." if not requires_approval else "Заявка отправлена на согласование."
     return BookingResult(True, msg, booking_id, requires_approval)
 
 
-def list_bookings_for_period(db: DB, start_at: datetime, end_at: datetime) -> list:
-    return db.fetchall("""
+@dataclass
+class BookingRequest:
+    resource_id: int
+    start_at: datetime
+    end_at: datetime
+    title: str = ""
+    notes: str = ""
+    participants: Optional[int] = None
+
+@dataclass
+class BatchResult:
+    ok: bool                     # all_or_nothing: всё вставлено; иначе — хоть что-то
+    message: str
+    results: list[BookingResult]
+
+    @property
+    def booking_ids(self) -> list[int]:
+        return [r.booking_id for r in self.results if r.ok and r.booking_id is not None]
+
+# Пакетное бронирование: элементы заливаются во временную таблицу (executemany),
+# затем один пакет проверяет конфликты для всех сразу (CROSS APPLY с теми же
+# UPDLOCK+HOLDLOCK, что и у одиночной брони), вставляет брони через MERGE ... OUTPUT
+# (чтобы сопоставить ItemNo и BookingID) и создаёт согласования одним INSERT.
+# Итого три round trip'а независимо от длины серии.
+_BATCH_PREPARE_SQL = """
+IF OBJECT_ID('tempdb..#BatchItems') IS NOT NULL DROP TABLE #BatchItems;
+CREATE TABLE #BatchItems (
+    ItemNo int PRIMARY KEY, ResourceID int NOT NULL,
+    StartAt datetime2(0) NOT NULL, EndAt datetime2(0) NOT NULL,
+    Title nvarchar(200) NULL, Notes nvarchar(500) NULL, Participants smallint NULL
+);
+"""
+
+_BATCH_INSERT_SQL = """
+INSERT INTO #BatchItems(ItemNo, ResourceID, StartAt, EndAt, Title, Notes, Participants)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+_BATCH_CREATE_SQL = """
+SET NOCOUNT ON;
+DECLARE @UserID int = ?, @AllOrNothing bit = ?, @Policy varchar(20) = ?;
+DECLARE @Privileged bit = 0, @ApproverID int, @n int;
+DECLARE @load TABLE (UserID int PRIMARY KEY, Pending int NOT NULL);
+CREATE TABLE #BatchOutcome (
+    ItemNo int PRIMARY KEY, Outcome varchar(20) NOT NULL, RequiresApproval bit NOT NULL,
+    ConflictBookingID bigint NULL, ConflictStartAt datetime2(0) NULL, ConflictEndAt datetime2(0) NULL,
+    BookingID bigint NULL, ApproverID int NULL
+);
+
+IF EXISTS (SELECT 1 FROM dbo.UserRoles ur JOIN dbo.Roles r ON r.RoleID = ur.RoleID
+           WHERE ur.UserID = @UserID AND r.RoleCode IN ('FAC','ADM'))
+    SET @Privileged = 1;
+
+-- нагрузка согласующих (services/approvers.py); при "first" все равны и решает UserID
+INSERT INTO @load(UserID, Pending)
+SELECT ur.UserID, CASE WHEN @Policy = 'least_pending' THEN COUNT(a.ApprovalID) ELSE 0 END
+FROM dbo.UserRoles ur
+JOIN dbo.Roles r ON r.RoleID = ur.RoleID
+LEFT JOIN dbo.BookingApprovals a WITH (READPAST)
+    ON a.ApproverUserID = ur.UserID
+   AND a.ApprovalStatusID = (SELECT ApprovalStatusID FROM dbo.ApprovalStatuses WHERE StatusCode = 'PENDING')
+WHERE r.RoleCode = 'FAC'
+GROUP BY ur.UserID;
+
+SELECT TOP 1 @ApproverID = UserID FROM @load ORDER BY Pending, UserID;
+
+INSERT INTO #BatchOutcome(ItemNo, Outcome, RequiresApproval, ConflictBookingID, ConflictStartAt, ConflictEndAt)
+SELECT i.ItemNo,
+       CASE WHEN z.ZoneID IS NULL THEN 'NO_RESOURCE'
+            WHEN c.BookingID IS NOT NULL THEN 'CONFLICT'
+            WHEN z.IsRestricted = 1 AND @Privileged = 0 AND @ApproverID IS NULL THEN 'NO_APPROVER'
+            ELSE 'OK' END,
+       CASE WHEN z.IsRestricted = 1 AND @Privileged = 0 THEN 1 ELSE 0 END,
+       c.BookingID, c.StartAt, c.EndAt
+FROM #BatchItems i
+LEFT JOIN dbo.Resources r ON r.ResourceID = i.ResourceID
+LEFT JOIN dbo.Zones z ON z.ZoneID = r.ZoneID
+OUTER APPLY (
+    SELECT TOP 1 b.BookingID, b.StartAt, b.EndAt
+    FROM dbo.Bookings b WITH (UPDLOCK, HOLDLOCK)
+    JOIN dbo.BookingStatuses bs ON bs.BookingStatusID = b.BookingStatusID
+    WHERE b.ResourceID = i.ResourceID
+      AND bs.StatusCode NOT IN ('CANCELLED','REJECTED')
+      AND b.StartAt < i.EndAt
+      AND b.EndAt   > i.StartAt
+    ORDER BY b.StartAt
+) c;
+
+IF @AllOrNothing = 0 OR NOT EXISTS (SELECT 1 FROM #BatchOutcome WHERE Outcome <> 'OK')
+BEGIN
+    DECLARE @ins TABLE (ItemNo int, BookingID bigint);
+
+    MERGE dbo.Bookings AS t
+    USING (
+        SELECT i.*, o.RequiresApproval
+        FROM #BatchItems i JOIN #BatchOutcome o ON o.ItemNo = i.ItemNo
+        WHERE o.Outcome = 'OK'
+    ) AS s
+    ON 1 = 0
+    WHEN NOT MATCHED THEN
+        INSERT (ResourceID, RequestedByUserID, StartAt, EndAt, Title, Notes, ParticipantsCount, BookingStatusID)
+        VALUES (s.ResourceID, @UserID, s.StartAt, s.EndAt, s.Title, s.Notes, s.Participants,
+                (SELECT bs.BookingStatusID FROM dbo.BookingStatuses bs
+                 WHERE bs.StatusCode = CASE WHEN s.RequiresApproval = 1 THEN 'PENDING' ELSE 'APPROVED' END))
+    OUTPUT s.ItemNo, INSERTED.BookingID INTO @ins;
+
+    UPDATE o SET BookingID = x.BookingID
+    FROM #BatchOutcome o JOIN @ins x ON x.ItemNo = o.ItemNo;
+
+    -- заявки серии по одной самому свободному согласующему
+    SELECT @n = MIN(ItemNo) FROM #BatchOutcome WHERE RequiresApproval = 1 AND BookingID IS NOT NULL;
+    WHILE @n IS NOT NULL
+    BEGIN
+        SELECT TOP 1 @ApproverID = UserID FROM @load ORDER BY Pending, UserID;
+        UPDATE #BatchOutcome SET ApproverID = @ApproverID WHERE ItemNo = @n;
+        UPDATE @load SET Pending = Pending + 1 WHERE UserID = @ApproverID AND @Policy = 'least_pending';
+        SELECT @n = MIN(ItemNo) FROM #BatchOutcome
+        WHERE RequiresApproval = 1 AND BookingID IS NOT NULL AND ItemNo > @n;
+    END
+
+    INSERT INTO dbo.BookingApprovals(BookingID, ApproverUserID, ApprovalStatusID)
+    SELECT o.BookingID, o.ApproverID, aps.ApprovalStatusID
+    FROM #BatchOutcome o
+    CROSS JOIN dbo.ApprovalStatuses aps
+    WHERE o.RequiresApproval = 1 AND o.BookingID IS NOT NULL AND aps.StatusCode = 'PENDING';
+END
+
+SELECT ItemNo, Outcome, BookingID, RequiresApproval, ConflictBookingID, ConflictStartAt, ConflictEndAt
+FROM #BatchOutcome ORDER BY ItemNo;
+
+DROP TABLE #BatchOutcome;
+DROP TABLE #BatchItems;
+"""
+
+_BATCH_REJECTED_MSG = "Не выполнено: пакет отклонён."
+_OVERLAP_MSG = "Пересекается с другим интервалом этого же пакета."
+
+def _self_overlaps(items: list[BookingRequest]) -> set[int]:
+    # элементы пакета, пересекающиеся с более ранним элементом на том же ресурсе
+    bad: set[int] = set()
+    by_res: dict[int, list[tuple[datetime, datetime, int]]] = {}
+    for n, it in enumerate(items):
+        by_res.setdefault(it.resource_id, []).append((it.start_at, it.end_at, n))
+    for spans in by_res.values():
+        spans.sort()
+        last_end = None
+        for s, e, n in spans:
+            if last_end is not None and s < last_end:
+                bad.add(n)
+            last_end = e if last_end is None else max(last_end, e)
+    return bad
+
+@transactional
+def create_bookings_batch(
+    db: DB,
+    requested_by_user_id: int,
+    items: list[BookingRequest],
+    all_or_nothing: bool = True,
+) -> BatchResult:
+    if not items:
+        return BatchResult(False, "Пустой пакет.", [])
+    results: list[Optional[BookingResult]] = [None] * len(items)
+    for n, it in enumerate(items):
+        if it.end_at <= it.start_at:
+            results[n] = BookingResult(False, "End должен быть позже Start.")
+    for n in _self_overlaps(items):
+        results[n] = results[n] or BookingResult(False, _OVERLAP_MSG)
+
+    index = get_index()
+    if index is not None:
+        for n, it in enumerate(items):
+            if results[n] is None and index.is_free(it.resource_id, it.start_at, it.end_at) is False:
+                results[n] = BookingResult(False, _CONFLICT_MSG)
+
+    failed = [r for r in results if r is not None]
+    if failed and all_or_nothing:
+        return BatchResult(False, f"Пакет отклонён: {failed[0].message}",
+                           [r or BookingResult(False, _BATCH_REJECTED_MSG) for r in results])
+    todo = [n for n in range(len(items)) if results[n] is None]
+    if not todo:
+        return BatchResult(False, "Ни одна бронь не создана.", results)
+
+    staged = [
+        (n, items[n].resource_id, items[n].start_at, items[n].end_at,
+         items[n].title or None, items[n].notes or None, items[n].participants)
+        for n in todo
+    ]
+    if db.dialect.tsql_batches:
+        db.execute(_BATCH_PREPARE_SQL)
+        db.executemany(_BATCH_INSERT_SQL, staged, fast=True)
+        rows = db.fetchall(_BATCH_CREATE_SQL, (requested_by_user_id, 1 if all_or_nothing else 0,
+                                               approver_policy()))
+    else:
+        rows = _create_stepwise(db, requested_by_user_id, staged, all_or_nothing)
+
+    for row in rows or []:
+        n = int(row.ItemNo)
+        outcome = str(row.Outcome)
+        if outcome == "CONFLICT":
+            conflict = BookingConflict(int(row.ConflictBookingID), row.ConflictStartAt, row.ConflictEndAt)
+            results[n] = BookingResult(False, _CONFLICT_MSG, conflict=conflict)
+        elif outcome != "OK":
+            results[n] = BookingResult(False, _FAIL_MESSAGES.get(outcome, _FAIL_MESSAGES["NO_ID"]))
+        elif row.BookingID is None:
+            results[n] = BookingResult(False, _BATCH_REJECTED_MSG)
+        else:
+            approval = bool(row.RequiresApproval)
+            results[n] = BookingResult(True, "Бронь подтверждена." if not approval
+                                       else "Заявка отправлена на согласование.",
+                                       int(row.BookingID), approval)
+    results = [r or BookingResult(False, _FAIL_MESSAGES["NO_ID"]) for r in results]
+    if index is not None:
+        for n, r in enumerate(results):
+            if r.conflict is not None:
+                index.add(r.conflict.booking_id, items[n].resource_id, r.conflict.start_at, r.conflict.end_at)
+
+    created = sum(r.ok for r in results)
+    if created == 0 or (all_or_nothing and created != len(items)):
+        db.rollback()
+        first = next((r for r in results if not r.ok and r.message != _BATCH_REJECTED_MSG), None)
+        results = [r if not r.ok else BookingResult(False, _BATCH_REJECTED_MSG) for r in results]
+        msg = f"Пакет отклонён: {first.message}" if first else "Ни одна бронь не создана."
+        return BatchResult(False, msg, results)
+
+    db.commit()
+    for r in results:
+        if r.ok:
+            audit(requested_by_user_id, "BOOKING_CREATE", "Bookings", r.booking_id)
+            if r.requires_approval:
+                notify("PENDING", r.booking_id)
+    if index is not None:
+        for n, r in enumerate(results):
+            if r.ok:
+                index.add(r.booking_id, items[n].resource_id, items[n].start_at, items[n].end_at)
+    return BatchResult(True, f"Создано броней: {created} из {len(items)}.", results)
+
+def create_recurring_booking(
+    db: DB,
+    resource_id: int,
+    requested_by_user_id: int,
+    start_at: datetime,
+    end_at: datetime,
+    rule: str,
+    title: str,
+    notes: str,
+    participants: Optional[int],
+    all_or_nothing: bool = True,
+) -> BatchResult:
+    # rule — RRULE-подобная строка, см. services.recurrence.parse_rrule
+    try:
+        spans = expand_recurrence(start_at, end_at, **parse_rrule(rule))
+    except ValueError as e:
+        return BatchResult(False, str(e), [])
+    items = [BookingRequest(resource_id, s, e, title, notes, participants) for s, e in spans]
+    return create_bookings_batch(db, requested_by_user_id, items, all_or_nothing)
+
+_BOOKINGS_LIST_SQL = """
     SELECT b.BookingID, r.DisplayName, r.ResourceKind, b.StartAt, b.EndAt,
            bs.StatusCode, u.Login AS RequestedBy
     FROM dbo.Bookings b
     JOIN dbo.Resources r ON r.ResourceID = b.ResourceID
     JOIN dbo.BookingStatuses bs ON bs.BookingStatusID = b.BookingStatusID
     JOIN dbo.UserAccounts u ON u.UserID = b.RequestedByUserID
-    WHERE b.StartAt < ? AND b.EndAt > ?
-    ORDER BY b.StartAt
-    """, (end_at, start_at))
+    WHERE b.StartAt < ? AND b.EndAt > ?"""
+
+# Ключи сортировки для UI: в SQL попадает только выражение из этого словаря
+BOOKING_SORT_COLUMNS = {
+    "id": "b.BookingID",
+    "res": "r.DisplayName",
+    "kind": "r.ResourceKind",
+    "start": "b.StartAt",
+    "end": "b.EndAt",
+    "status": "bs.StatusCode",
+    "by": "u.Login",
+}
+
+def _like(text: str) -> str:
+    # ESCAPE '\' понимают и SQL Server, и SQLite (скобки [%] — только SQL Server)
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
 
-def cancel_booking(db: DB, booking_id: int) -> None:
+def list_bookings_for_period(db: DB, start_at: datetime, end_at: datetime) -> list:
+    return db.fetchall(_BOOKINGS_LIST_SQL + "\n    ORDER BY b.StartAt", (end_at, start_at))
+
+def list_bookings_page(
+    db: DB, start_at: datetime, end_at: datetime,
+    offset: int = 0, limit: int = 200,
+    sort: str = "start", descending: bool = False,
+    resource: Optional[str] = None, status: Optional[str] = None, requested_by: Optional[str] = None,
+) -> list:
+    # Страница списка броней: фильтры и сортировка на сервере, OFFSET/FETCH.
+    # BookingID в ORDER BY делает порядок однозначным, иначе страницы «плывут».
+    order = BOOKING_SORT_COLUMNS.get(sort)
+    if order is None:
+        raise ValueError(f"Неизвестная колонка сортировки: {sort}")
+    sql = _BOOKINGS_LIST_SQL
+    params: list = [end_at, start_at]
+    if resource:
+        sql += " AND r.DisplayName LIKE ? ESCAPE '\\'"
+        params.append(_like(resource))
+    if status:
+        sql += " AND bs.StatusCode = ?"
+        params.append(status)
+    if requested_by:
+        sql += " AND u.Login LIKE ? ESCAPE '\\'"
+        params.append(_like(requested_by))
+    direction = "DESC" if descending else "ASC"
+    sql += f"\n    ORDER BY {order} {direction}, b.BookingID {direction}\n    OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+    params += [max(0, offset), max(1, limit)]
+    return db.fetchall(sql, tuple(params))
+
+@transactional
+def cancel_booking(db: DB, booking_id: int, user_id: Optional[int] = None) -> None:
+    # user_id — кто отменяет (для журнала действий)
     cancelled = get_id_by_code(db, "BookingStatuses", "StatusCode", "BookingStatusID", "CANCELLED")
     db.execute(
         "UPDATE dbo.Bookings SET BookingStatusID=?, UpdatedAt=SYSUTCDATETIME() WHERE BookingID=?",
         (cancelled, booking_id)
     )
     db.commit()
+    audit(user_id, "BOOKING_CANCEL", "Bookings", booking_id)
+    notify("CANCELLED", booking_id, user_id)
+    index = get_index()
+    if index is not None:
+        index.remove(booking_id)
 
 def list_pending_approvals(db: DB, approver_user_id: int) -> list:
     return db.fetchall("""
@@ -142,7 +580,9 @@ def list_pending_approvals(db: DB, approver_user_id: int) -> list:
     ORDER BY b.StartAt
     """, (approver_user_id,))
 
-def decide_approval(db: DB, approval_id: int, approve: bool) -> None:
+@transactional
+def decide_approval(db: DB, approval_id: int, approve: bool, user_id: Optional[int] = None) -> None:
+    # user_id — кто принял решение (для журнала действий)
     new_appr = "APPROVED" if approve else "REJECTED"
     aps_id = get_id_by_code(db, "ApprovalStatuses", "StatusCode", "ApprovalStatusID", new_appr)
     db.execute(
@@ -159,3 +599,218 @@ def decide_approval(db: DB, approval_id: int, approve: bool) -> None:
         (bs_id, booking_id)
     )
     db.commit()
+    audit(user_id, "APPROVAL_DECIDE", "BookingApprovals", approval_id, new_appr)
+    notify(bs_code, booking_id, user_id)
+    index = get_index()
+    if index is not None and not approve:
+        index.remove(booking_id)
+
+
+# Решение по пачке согласований. На SQL Server — один пакет: отбор ещё
+# не решённых под UPDLOCK+HOLDLOCK, перепроверка пересечений и два UPDATE ... FROM
+# по табличной переменной. Одобрение не проходит (CONFLICT, согласование
+# остаётся PENDING), если бронь пересекается с уже подтверждённой или с более
+# ранней из той же пачки. Без пакетов T-SQL — те же шаги отдельными
+# запросами под dialect.begin_write.
+_DECIDE_BATCH_SQL = """
+SET NOCOUNT ON;
+DECLARE @Approve bit = ?, @ApprovalStatusID int = ?, @BookingStatusID int = ?;
+DECLARE @d TABLE (ApprovalID bigint PRIMARY KEY, BookingID bigint NOT NULL, ResourceID int NOT NULL,
+                  StartAt datetime2(0) NOT NULL, EndAt datetime2(0) NOT NULL, Outcome varchar(20) NOT NULL);
+
+INSERT INTO @d(ApprovalID, BookingID, ResourceID, StartAt, EndAt, Outcome)
+SELECT a.ApprovalID, a.BookingID, b.ResourceID, b.StartAt, b.EndAt, 'OK'
+FROM dbo.BookingApprovals a WITH (UPDLOCK, HOLDLOCK)
+JOIN dbo.ApprovalStatuses aps ON aps.ApprovalStatusID = a.ApprovalStatusID
+JOIN dbo.Bookings b WITH (UPDLOCK, HOLDLOCK) ON b.BookingID = a.BookingID
+WHERE a.ApprovalID IN ({ids}) AND aps.StatusCode = 'PENDING';
+
+IF @Approve = 1
+BEGIN
+    UPDATE d SET Outcome = 'CONFLICT'
+    FROM @d d
+    WHERE EXISTS (
+        SELECT 1 FROM dbo.Bookings o WITH (UPDLOCK, HOLDLOCK)
+        JOIN dbo.BookingStatuses os ON os.BookingStatusID = o.BookingStatusID
+        WHERE o.ResourceID = d.ResourceID AND o.BookingID <> d.BookingID AND os.StatusCode = 'APPROVED'
+          AND o.StartAt < d.EndAt AND o.EndAt > d.StartAt);
+
+    -- пересечения внутри пачки: по порядку BookingID, место занимают только одобряемые
+    DECLARE @b bigint = (SELECT MIN(BookingID) FROM @d WHERE Outcome = 'OK');
+    WHILE @b IS NOT NULL
+    BEGIN
+        UPDATE d SET Outcome = 'CONFLICT'
+        FROM @d d
+        WHERE d.BookingID = @b AND EXISTS (
+            SELECT 1 FROM @d p
+            WHERE p.Outcome = 'OK' AND p.ResourceID = d.ResourceID AND p.BookingID < d.BookingID
+              AND p.StartAt < d.EndAt AND p.EndAt > d.StartAt);
+        SET @b = (SELECT MIN(BookingID) FROM @d WHERE Outcome = 'OK' AND BookingID > @b);
+    END
+END
+
+UPDATE a SET ApprovalStatusID = @ApprovalStatusID, DecidedAt = SYSUTCDATETIME()
+FROM dbo.BookingApprovals a
+JOIN @d d ON d.ApprovalID = a.ApprovalID
+WHERE d.Outcome = 'OK';
+
+UPDATE b SET BookingStatusID = @BookingStatusID, UpdatedAt = SYSUTCDATETIME()
+FROM dbo.Bookings b
+JOIN @d d ON d.BookingID = b.BookingID
+WHERE d.Outcome = 'OK';
+
+SELECT ApprovalID, BookingID, Outcome FROM @d;
+"""
+
+_DECIDE_PENDING_SQL = """
+    SELECT a.ApprovalID, a.BookingID, b.ResourceID, b.StartAt, b.EndAt,
+           CASE WHEN EXISTS (
+               SELECT 1 FROM dbo.Bookings o
+               JOIN dbo.BookingStatuses os ON os.BookingStatusID = o.BookingStatusID
+               WHERE o.ResourceID = b.ResourceID AND o.BookingID <> b.BookingID AND os.StatusCode = 'APPROVED'
+                 AND o.StartAt < b.EndAt AND o.EndAt > b.StartAt) THEN 1 ELSE 0 END AS Overlaps
+    FROM dbo.BookingApprovals a
+    JOIN dbo.ApprovalStatuses aps ON aps.ApprovalStatusID = a.ApprovalStatusID
+    JOIN dbo.Bookings b ON b.BookingID = a.BookingID
+    WHERE a.ApprovalID IN ({ids}) AND aps.StatusCode = 'PENDING'
+"""
+
+DECIDE_CHUNK = 500   # ApprovalID на оператор: лимит SQL Server — 2100 параметров
+
+@dataclass
+class DecisionsResult:
+    decided: list[int] = field(default_factory=list)     # ApprovalID
+    conflicts: list[int] = field(default_factory=list)   # не одобрены: пересечение с подтверждённой
+    skipped: list[int] = field(default_factory=list)     # не найдены или уже решены
+
+    @property
+    def message(self) -> str:
+        parts = [f"Решено: {len(self.decided)}."]
+        if self.conflicts:
+            parts.append(f"Пересекаются с подтверждёнными, оставлены на согласовании: {len(self.conflicts)}.")
+        if self.skipped:
+            parts.append(f"Уже решены или не найдены: {len(self.skipped)}.")
+        return " ".join(parts)
+
+def _decide_stepwise(db: DB, ids: list[int], approve: bool, appr_status: int, booking_status: int) -> list:
+    db.dialect.begin_write(db)
+    rows = db.fetchall(_DECIDE_PENDING_SQL.format(ids=", ".join("?" * len(ids))), ids)
+    out, taken = [], []
+    for r in sorted(rows, key=lambda r: int(r.BookingID)):
+        outcome = "OK"
+        if approve and (r.Overlaps or any(rid == r.ResourceID and s < r.EndAt and e > r.StartAt
+                                          for rid, s, e in taken)):
+            outcome = "CONFLICT"
+        else:
+            taken.append((r.ResourceID, r.StartAt, r.EndAt))
+        out.append(SimpleNamespace(ApprovalID=r.ApprovalID, BookingID=r.BookingID, Outcome=outcome))
+    ok = [o for o in out if o.Outcome == "OK"]
+    if ok:
+        marks = ", ".join("?" * len(ok))
+        db.execute(f"UPDATE dbo.BookingApprovals SET ApprovalStatusID=?, DecidedAt=SYSUTCDATETIME() "
+                   f"WHERE ApprovalID IN ({marks})", [appr_status] + [o.ApprovalID for o in ok])
+        db.execute(f"UPDATE dbo.Bookings SET BookingStatusID=?, UpdatedAt=SYSUTCDATETIME() "
+                   f"WHERE BookingID IN ({marks})", [booking_status] + [o.BookingID for o in ok])
+    return out
+
+@transactional
+def decide_approvals(db: DB, approval_ids: list[int], approve: bool,
+                     user_id: Optional[int] = None) -> DecisionsResult:
+    # Пачка ApprovalID одним решением и одной транзакцией; user_id — кто решает (журнал, уведомления)
+    ids = list(dict.fromkeys(int(i) for i in approval_ids))
+    if not ids:
+        return DecisionsResult()
+    code = "APPROVED" if approve else "REJECTED"
+    appr_status = get_id_by_code(db, "ApprovalStatuses", "StatusCode", "ApprovalStatusID", code)
+    booking_status = get_id_by_code(db, "BookingStatuses", "StatusCode", "BookingStatusID", code)
+    rows = []
+    for n in range(0, len(ids), DECIDE_CHUNK):
+        chunk = ids[n:n + DECIDE_CHUNK]
+        if db.dialect.tsql_batches:
+            rows += db.fetchall(_DECIDE_BATCH_SQL.format(ids=", ".join("?" * len(chunk))),
+                                [1 if approve else 0, appr_status, booking_status] + chunk)
+        else:
+            rows += _decide_stepwise(db, chunk, approve, appr_status, booking_status)
+    db.commit()
+
+    res = DecisionsResult()
+    decided_bookings = []
+    for r in rows:
+        if str(r.Outcome) == "OK":
+            res.decided.append(int(r.ApprovalID))
+            decided_bookings.append(int(r.BookingID))
+            audit(user_id, "APPROVAL_DECIDE", "BookingApprovals", int(r.ApprovalID), code)
+            notify(code, int(r.BookingID), user_id)
+        else:
+            res.conflicts.append(int(r.ApprovalID))
+    seen = set(res.decided) | set(res.conflicts)
+    res.skipped = [i for i in ids if i not in seen]
+    index = get_index()
+    if index is not None and not approve:
+        for bid in decided_bookings:
+            index.remove(bid)
+    return res
+
+# Лента изменений: клиент раз в несколько секунд спрашивает, что поменялось
+# с прошлого опроса, и обновляет только это. Отметка — время сервера на начало
+# опроса; читаем с запасом DB_CHANGES_LAG_SEC (SYSUTCDATETIME пишется при
+# выполнении оператора, а видна строка после COMMIT), а уже выданное из окна
+# запаса токен помнит и повторно не отдаёт. По Bookings.CreatedAt/UpdatedAt и
+# BookingApprovals.RequestedAt/DecidedAt — индексы в sql/change_feed.sql.
+
+_CHANGED_BOOKINGS_SQL = """
+    SELECT b.BookingID, b.ResourceID, b.RequestedByUserID, b.StartAt, b.EndAt, bs.StatusCode,
+           COALESCE(b.UpdatedAt, b.CreatedAt) AS ChangedAt
+    FROM dbo.Bookings b
+    JOIN dbo.BookingStatuses bs ON bs.BookingStatusID = b.BookingStatusID
+    WHERE b.BookingID IN (
+        SELECT BookingID FROM dbo.Bookings WHERE CreatedAt > ?
+        UNION
+        SELECT BookingID FROM dbo.Bookings WHERE UpdatedAt > ?)
+"""
+
+_CHANGED_APPROVALS_SQL = """
+    SELECT a.ApprovalID, a.BookingID, a.ApproverUserID, aps.StatusCode,
+           COALESCE(a.DecidedAt, a.RequestedAt) AS ChangedAt
+    FROM dbo.BookingApprovals a
+    JOIN dbo.ApprovalStatuses aps ON aps.ApprovalStatusID = a.ApprovalStatusID
+    WHERE a.ApprovalID IN (
+        SELECT ApprovalID FROM dbo.BookingApprovals WHERE RequestedAt > ?
+        UNION
+        SELECT ApprovalID FROM dbo.BookingApprovals WHERE DecidedAt > ?)
+"""
+
+@dataclass(frozen=True)
+class ChangeToken:
+    mark: datetime                          # время сервера на начало прошлого опроса
+    seen: frozenset = frozenset()           # (вид, ID, ChangedAt, статус) из окна запаса
+
+@dataclass
+class ChangeSet:
+    token: ChangeToken                      # передать в следующий changes_since
+    bookings: list = field(default_factory=list)    # строки _CHANGED_BOOKINGS_SQL
+    approvals: list = field(default_factory=list)   # строки _CHANGED_APPROVALS_SQL
+    reset: bool = False                     # токена не было: вызывающий загружает всё сам
+
+    def __bool__(self) -> bool:
+        return bool(self.bookings or self.approvals)
+
+def changes_since(db: DB, token: Optional[ChangeToken] = None) -> ChangeSet:
+    mark = db.server_now()
+    if token is None:
+        return ChangeSet(ChangeToken(mark), reset=True)
+    lag = timedelta(seconds=getattr(config, "DB_CHANGES_LAG_SEC", 10))
+    since = token.mark - lag
+    horizon = mark - lag
+    out = ChangeSet(ChangeToken(mark))
+    seen = set()
+    for kind, sql, key, target in (("B", _CHANGED_BOOKINGS_SQL, "BookingID", out.bookings),
+                                   ("A", _CHANGED_APPROVALS_SQL, "ApprovalID", out.approvals)):
+        for r in db.fetchall(sql, (since, since)):
+            item = (kind, int(getattr(r, key)), r.ChangedAt, str(r.StatusCode))
+            if item not in token.seen:
+                target.append(r)
+            if r.ChangedAt > horizon:
+                seen.add(item)
+    out.token = ChangeToken(mark, frozenset(seen))
+    return out
@@ -1,11 +1,88 @@
+import threading
+from typing import Optional
 from db import DB
 
+# Все справочники «код ↔ ID» одним запросом
+_REFDATA_SQL = """
+    SELECT 'BookingStatuses' AS TableName, BookingStatusID AS id, StatusCode AS code FROM dbo.BookingStatuses
+    UNION ALL SELECT 'ApprovalStatuses', ApprovalStatusID, StatusCode FROM dbo.ApprovalStatuses
+    UNION ALL SELECT 'ResourceStatuses', ResourceStatusID, StatusCode FROM dbo.ResourceStatuses
+    UNION ALL SELECT 'Roles', RoleID, RoleCode FROM dbo.Roles
+    UNION ALL SELECT 'AuditActionTypes', ActionTypeID, ActionCode FROM dbo.AuditActionTypes
+"""
+
+class RefDataCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_code: dict[tuple[str, str], int] = {}
+        self._by_id: dict[tuple[str, int], str] = {}
+        self.loaded = False
+        self.lookups = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def refresh(self, db: DB) -> None:
+        by_code: dict[tuple[str, str], int] = {}
+        by_id: dict[tuple[str, int], str] = {}
+        for r in db.fetchall(_REFDATA_SQL):
+            table, ref_id, code = str(r.TableName), int(r.id), str(r.code)
+            by_code[(table, code)] = ref_id
+            by_id[(table, ref_id)] = code
+        with self._lock:
+            self._by_code, self._by_id = by_code, by_id
+            self.loaded = True
+            self.refreshes += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._by_code, self._by_id = {}, {}
+            self.loaded = False
+
+    def put(self, table: str, code: str, ref_id: int) -> None:
+        with self._lock:
+            self._by_code[(table, code)] = ref_id
+            self._by_id[(table, ref_id)] = code
+
+    def id_for(self, table: str, code: str) -> Optional[int]:
+        self.lookups += 1
+        ref_id = self._by_code.get((table, code))
+        if ref_id is None:
+            self.misses += 1
+        return ref_id
+
+    def code_for(self, table: str, ref_id: int) -> Optional[str]:
+        self.lookups += 1
+        code = self._by_id.get((table, ref_id))
+        if code is None:
+            self.misses += 1
+        return code
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._by_code), "lookups": self.lookups,
+                "misses": self.misses, "refreshes": self.refreshes}
+
+refdata = RefDataCache()
+
 def get_id_by_code(db: DB, table: str, code_col: str, id_col: str, code: str) -> int:
+    cached = refdata.id_for(table, code)
+    if cached is not None:
+        return cached
     row = db.fetchone(f"SELECT {id_col} AS id FROM dbo.{table} WHERE {code_col} = ?", (code,))
     if not row:
         raise ValueError(f"Не найдено {code} в {table}.{code_col}")
+    refdata.put(table, code, int(row.id))
     return int(row.id)
 
+def get_code_by_id(db: DB, table: str, code_col: str, id_col: str, ref_id: int) -> str:
+    cached = refdata.code_for(table, ref_id)
+    if cached is not None:
+        return cached
+    row = db.fetchone(f"SELECT {code_col} AS code FROM dbo.{table} WHERE {id_col} = ?", (ref_id,))
+    if not row:
+        raise ValueError(f"Не найдено {ref_id} в {table}.{id_col}")
+    refdata.put(table, str(row.code), ref_id)
+    return str(row.code)
+
 def get_user_roles(db: DB, user_id: int) -> set[str]:
     rows = db.fetchall("""
         SELECT r.RoleCode
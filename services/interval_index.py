@@ -0,0 +1,139 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from typing import Optional
+from db import DB
+import config
+
+_INACTIVE = ("CANCELLED", "REJECTED")   # ресурс не занимают
+
+_ACTIVE_SQL = """
+    SELECT b.BookingID, b.ResourceID, b.StartAt, b.EndAt
+    FROM dbo.Bookings b
+    JOIN dbo.BookingStatuses bs ON bs.BookingStatusID = b.BookingStatusID
+    WHERE bs.StatusCode NOT IN ('CANCELLED','REJECTED')
+      AND b.EndAt > ?
+"""
+
+class _ResourceIntervals:
+    # Начала и концы храним в двух независимо отсортированных списках:
+    # пересекающих [s, e) интервалов = #(start < e) - #(end <= s).
+    # Формула верна и при наложениях (например, после гонки двух клиентов).
+    __slots__ = ("starts", "ends")
+
+    def __init__(self):
+        self.starts: list[datetime] = []
+        self.ends: list[datetime] = []
+
+    def add(self, start_at: datetime, end_at: datetime) -> None:
+        insort(self.starts, start_at)
+        insort(self.ends, end_at)
+
+    def remove(self, start_at: datetime, end_at: datetime) -> None:
+        i = bisect_left(self.starts, start_at)
+        if i < len(self.starts) and self.starts[i] == start_at:
+            del self.starts[i]
+        j = bisect_left(self.ends, end_at)
+        if j < len(self.ends) and self.ends[j] == end_at:
+            del self.ends[j]
+
+    def overlaps(self, start_at: datetime, end_at: datetime) -> int:
+        return bisect_left(self.starts, end_at) - bisect_right(self.ends, start_at)
+
+class IntervalIndex:
+    def __init__(self, lookback: Optional[timedelta] = None, max_age: Optional[float] = None):
+        self.lookback = lookback if lookback is not None else timedelta(
+            hours=getattr(config, "INTERVAL_INDEX_LOOKBACK_HOURS", 24))
+        self.max_age = max_age if max_age is not None else getattr(config, "INTERVAL_INDEX_MAX_AGE_SEC", 60.0)
+        self.horizon: Optional[datetime] = None
+        self._lock = threading.RLock()
+        self._by_resource: dict[int, _ResourceIntervals] = {}
+        self._bookings: dict[int, tuple[int, datetime, datetime]] = {}
+        self.busy_answers = 0
+        self.free_answers = 0
+        self.unknown_answers = 0
+        self.synced_at = 0.0   # полная загрузка или лента изменений: до этого момента данные свежи
+
+    def load(self, db: DB, now: Optional[datetime] = None) -> None:
+        horizon = (now or datetime.now()) - self.lookback
+        rows = db.fetchall(_ACTIVE_SQL, (horizon,))
+        with self._lock:
+            self.horizon = horizon
+            self._by_resource.clear()
+            self._bookings.clear()
+            for r in rows:
+                self._add_locked(int(r.BookingID), int(r.ResourceID), r.StartAt, r.EndAt)
+            self.synced_at = time.monotonic()
+
+    def _add_locked(self, booking_id: int, resource_id: int, start_at: datetime, end_at: datetime) -> None:
+        ri = self._by_resource.get(resource_id)
+        if ri is None:
+            ri = self._by_resource[resource_id] = _ResourceIntervals()
+        ri.add(start_at, end_at)
+        self._bookings[booking_id] = (resource_id, start_at, end_at)
+
+    def add(self, booking_id: int, resource_id: int, start_at: datetime, end_at: datetime) -> None:
+        with self._lock:
+            if booking_id in self._bookings:
+                return
+            self._add_locked(booking_id, resource_id, start_at, end_at)
+
+    def remove(self, booking_id: int) -> None:
+        with self._lock:
+            item = self._bookings.pop(booking_id, None)
+            if item is None:
+                return
+            resource_id, start_at, end_at = item
+            ri = self._by_resource.get(resource_id)
+            if ri is not None:
+                ri.remove(start_at, end_at)
+
+    def apply_changes(self, rows) -> None:
+        # строки booking_service.changes_since(...).bookings
+        with self._lock:
+            for r in rows:
+                self.remove(int(r.BookingID))
+                if str(r.StatusCode) not in _INACTIVE and self.horizon is not None and r.EndAt > self.horizon:
+                    self._add_locked(int(r.BookingID), int(r.ResourceID), r.StartAt, r.EndAt)
+            self.synced_at = time.monotonic()
+
+    # True/False — ответ индекса, None — индекс не знает (не загружен, период до
+    # горизонта или «занято» по данным старше max_age). В этом случае решает БД.
+    def is_free(self, resource_id: int, start_at: datetime, end_at: datetime) -> Optional[bool]:
+        with self._lock:
+            if self.horizon is None or start_at < self.horizon:
+                self.unknown_answers += 1
+                return None
+            ri = self._by_resource.get(resource_id)
+            if ri is None or ri.overlaps(start_at, end_at) <= 0:
+                self.free_answers += 1
+                return True
+            if time.monotonic() - self.synced_at > self.max_age:
+                self.unknown_answers += 1
+                return None
+            self.busy_answers += 1
+            return False
+
+    def intervals(self, resource_id: int) -> list[tuple[datetime, datetime]]:
+        with self._lock:
+            return sorted(v[1:] for v in self._bookings.values() if v[0] == resource_id)
+
+    def __len__(self) -> int:
+        return len(self._bookings)
+
+_index: Optional[IntervalIndex] = None
+
+def get_index() -> Optional[IntervalIndex]:
+    return _index
+
+def enable_index(db: DB) -> IntervalIndex:
+    global _index
+    index = IntervalIndex()
+    index.load(db)
+    _index = index
+    return index
+
+def disable_index() -> None:
+    global _index
+    _index = None
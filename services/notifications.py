@@ -0,0 +1,219 @@
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import config
+from db import DB, transactional
+from services.batch_writer import BatchWriter
+
+# Уведомления dbo.Notifications. Сервис после commit ставит событие
+# (вид, бронь, кто сделал) в очередь; диспетчер в фоне одним запросом по всей
+# пачке находит получателей — автора брони и согласующих, — склеивает
+# однотипные сообщения одному пользователю в одну строку (пачка собирается
+# NOTIFY_LINGER_SEC, чтобы серия броней дала одно сообщение) и пишет их
+# executemany. Сам автор действия уведомление о нём не получает.
+# Счётчик непрочитанных — в памяти: свои записи прибавляются сразу, раз в
+# NOTIFY_UNREAD_TTL_SEC (чужие клиенты) перечитывается по индексу
+# IX_Notifications_Unread (sql/notifications.sql), таблица не сканируется.
+
+_RECIPIENTS_SQL = """
+    SELECT b.BookingID, b.RequestedByUserID, r.DisplayName, b.StartAt,
+           a.ApproverUserID, aps.StatusCode AS ApprovalStatus
+    FROM dbo.Bookings b
+    JOIN dbo.Resources r ON r.ResourceID = b.ResourceID
+    LEFT JOIN dbo.BookingApprovals a ON a.BookingID = b.BookingID
+    LEFT JOIN dbo.ApprovalStatuses aps ON aps.ApprovalStatusID = a.ApprovalStatusID
+    WHERE b.BookingID IN ({ids})
+"""
+
+_INSERT_SQL = "INSERT INTO dbo.Notifications(UserID, BookingID, Message) VALUES (?, ?, ?)"
+
+_UNREAD_SQL = "SELECT COUNT(*) AS cnt FROM dbo.Notifications WHERE UserID = ? AND IsRead = 0"
+
+# (событие, кому) -> заголовок; approver — согласующие с ещё открытым согласованием
+_TITLES = {
+    ("PENDING", "requester"): "Отправлено на согласование",
+    ("PENDING", "approver"): "Ждёт вашего согласования",
+    ("APPROVED", "requester"): "Бронь подтверждена",
+    ("REJECTED", "requester"): "Бронь отклонена",
+    ("CANCELLED", "requester"): "Бронь отменена",
+    ("CANCELLED", "approver"): "Заявка отозвана",
+}
+EVENTS = frozenset(kind for kind, _ in _TITLES)
+MESSAGE_MAX = 400   # nvarchar(400)
+
+@dataclass(frozen=True)
+class NotificationEvent:
+    kind: str                   # EVENTS
+    booking_id: int
+    actor_id: Optional[int]     # кто сделал; ему не пишем
+
+def fan_out(events: list[NotificationEvent], rows: list) -> list[tuple[int, Optional[int], str]]:
+    # строки _RECIPIENTS_SQL -> (UserID, BookingID, Message), по строке на
+    # пользователя и вид сообщения; склеенные — без BookingID
+    by_booking = defaultdict(list)
+    for r in rows:
+        by_booking[int(r.BookingID)].append(r)
+    grouped: dict[tuple[int, str, str], list[tuple[int, str]]] = defaultdict(list)
+    for e in events:
+        booking = by_booking.get(e.booking_id)
+        if not booking:
+            continue
+        head = booking[0]
+        detail = f"{head.DisplayName}, {head.StartAt:%d.%m %H:%M}"
+        targets = [(int(head.RequestedByUserID), "requester")]
+        if (e.kind, "approver") in _TITLES:
+            targets += [(int(r.ApproverUserID), "approver") for r in booking
+                        if r.ApproverUserID is not None and r.ApprovalStatus == "PENDING"]
+        for user_id, role in targets:
+            if user_id == e.actor_id or (e.kind, role) not in _TITLES:
+                continue
+            items = grouped[(user_id, e.kind, role)]
+            if all(b != e.booking_id for b, _ in items):
+                items.append((e.booking_id, detail))
+    out = []
+    for (user_id, kind, role), items in grouped.items():
+        title = _TITLES[(kind, role)]
+        if len(items) == 1:
+            out.append((user_id, items[0][0], f"{title}: {items[0][1]}"[:MESSAGE_MAX]))
+        else:
+            text = f"{title} ({len(items)}): " + "; ".join(d for _, d in items)
+            out.append((user_id, None, text if len(text) <= MESSAGE_MAX else text[:MESSAGE_MAX - 1] + "…"))
+    return out
+
+class UnreadCounts:
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl if ttl is not None else getattr(config, "NOTIFY_UNREAD_TTL_SEC", 30.0)
+        self._lock = threading.Lock()
+        self._counts: dict[int, list] = {}   # UserID -> [число, когда прочитано из БД]
+        self.hits = 0
+        self.queries = 0
+
+    def get(self, db: DB, user_id: int) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self.hits += 1
+                return entry[0]
+        n = int(db.fetchone(_UNREAD_SQL, (user_id,)).cnt)
+        with self._lock:
+            self.queries += 1
+            self._counts[user_id] = [n, now]
+        return n
+
+    def add(self, user_id: int, delta: int) -> None:
+        # известные счётчики сдвигаем, неизвестные прочитаются при первом get
+        with self._lock:
+            entry = self._counts.get(user_id)
+            if entry is not None:
+                entry[0] = max(0, entry[0] + delta)
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._counts.clear()
+            else:
+                self._counts.pop(user_id, None)
+
+unread = UnreadCounts()
+
+class NotificationDispatcher(BatchWriter):
+    name = "notify"
+
+    def __init__(
+        self,
+        connect: Callable[[], DB] = DB.connect,
+        max_queue: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        overflow: Optional[str] = None,
+        block_timeout: Optional[float] = None,
+        linger: Optional[float] = None,
+        counts: Optional[UnreadCounts] = None,
+    ):
+        self.counts = counts or unread
+        self.messages = 0   # строк в dbo.Notifications
+        super().__init__(
+            connect,
+            max_queue or getattr(config, "NOTIFY_QUEUE_SIZE", 10000),
+            batch_size or getattr(config, "NOTIFY_BATCH_SIZE", 200),
+            flush_interval if flush_interval is not None else getattr(config, "NOTIFY_FLUSH_INTERVAL_SEC", 1.0),
+            overflow or getattr(config, "NOTIFY_OVERFLOW", "drop"),
+            block_timeout if block_timeout is not None else getattr(config, "NOTIFY_BLOCK_TIMEOUT_SEC", 0.05),
+            getattr(config, "NOTIFY_CLOSE_TIMEOUT_SEC", 5.0),
+            linger if linger is not None else getattr(config, "NOTIFY_LINGER_SEC", 0.5),
+        )
+
+    def notify(self, kind: str, booking_id: int, actor_id: Optional[int] = None) -> bool:
+        if kind not in EVENTS:
+            raise ValueError(f"Неизвестный вид уведомления: {kind}")
+        return self.put(NotificationEvent(kind, booking_id, actor_id))
+
+    def _write(self, db: DB, batch: list[NotificationEvent]) -> int:
+        ids = sorted({e.booking_id for e in batch})
+        rows = db.fetchall(_RECIPIENTS_SQL.format(ids=", ".join("?" * len(ids))), ids)
+        messages = fan_out(batch, rows)
+        db.executemany(_INSERT_SQL, messages, fast=True)
+        db.commit()
+        per_user: dict[int, int] = defaultdict(int)
+        for user_id, _, _ in messages:
+            per_user[user_id] += 1
+        for user_id, n in per_user.items():
+            self.counts.add(user_id, n)
+        with self._lock:
+            self.messages += len(messages)
+        return len(batch)
+
+_dispatcher: Optional[NotificationDispatcher] = None
+
+def get_dispatcher() -> Optional[NotificationDispatcher]:
+    return _dispatcher
+
+def enable_notifications(connect: Callable[[], DB] = DB.connect, **kwargs) -> NotificationDispatcher:
+    global _dispatcher
+    close_notifications()
+    _dispatcher = NotificationDispatcher(connect, **kwargs)
+    return _dispatcher
+
+def close_notifications(timeout: Optional[float] = None) -> None:
+    global _dispatcher
+    dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        dispatcher.close(timeout)
+
+def notify(kind: str, booking_id: int, actor_id: Optional[int] = None) -> None:
+    # вызывать после commit; без диспетчера — ничего не делает
+    dispatcher = _dispatcher
+    if dispatcher is not None:
+        dispatcher.notify(kind, booking_id, actor_id)
+
+def unread_count(db: DB, user_id: int) -> int:
+    return unread.get(db, user_id)
+
+def list_notifications(db: DB, user_id: int, unread_only: bool = True, limit: int = 50) -> list:
+    sql = """
+    SELECT NotificationID, BookingID, Message, IsRead, CreatedAt
+    FROM dbo.Notifications
+    WHERE UserID = ?"""
+    if unread_only:
+        sql += " AND IsRead = 0"
+    sql += "\n    ORDER BY NotificationID DESC\n    OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY"
+    return db.fetchall(sql, (user_id, max(1, limit)))
+
+@transactional
+def mark_read(db: DB, user_id: int, notification_ids: Optional[list[int]] = None) -> int:
+    # None — все непрочитанные пользователя
+    sql = "UPDATE dbo.Notifications SET IsRead = 1 WHERE UserID = ? AND IsRead = 0"
+    params: list = [user_id]
+    if notification_ids is not None:
+        if not notification_ids:
+            return 0
+        sql += f" AND NotificationID IN ({', '.join('?' * len(notification_ids))})"
+        params += notification_ids
+    n = db.execute(sql, params)
+    db.commit()
+    unread.add(user_id, -n)
+    return n
@@ -0,0 +1,137 @@
+from datetime import datetime
+from typing import Any, Iterable, Optional, Sequence
+import numpy as np
+import pandas as pd
+import config
+from services.resource_service import ResourceItem
+
+RESOURCE_DIMS = ("ResourceID", "Resource", "Zone", "Floor", "Kind")
+TIME_DIMS = ("Date", "Hour")
+MEASURES = ["Resources", "BookedMinutes", "CapacityMinutes", "UtilizationPct"]
+
+_HOUR = np.timedelta64(1, "h")
+
+def resources_frame(items: Iterable[ResourceItem]) -> pd.DataFrame:
+    df = pd.DataFrame([{
+        "ResourceID": r.resource_id, "Resource": r.display_name, "Zone": r.zone_name,
+        "Floor": r.floor_no, "Kind": r.kind,
+    } for r in items], columns=list(RESOURCE_DIMS))
+    return _typed_resources(df)
+
+def _typed_resources(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.drop_duplicates("ResourceID").reset_index(drop=True)
+    df["ResourceID"] = df["ResourceID"].astype(np.int64)
+    df["Floor"] = pd.array(df["Floor"], dtype="Int64")
+    return df
+
+def _hours(start_at: datetime, end_at: datetime, starts: np.ndarray, ends: np.ndarray,
+           workday_only: bool) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Интервалы режем по границам часов: (индекс интервала, начало часа, секунды в часе)
+    s = np.maximum(starts, np.datetime64(start_at, "us"))
+    e = np.minimum(ends, np.datetime64(end_at, "us"))
+    h0 = s.astype("datetime64[h]")
+    h1 = (e - np.timedelta64(1, "us")).astype("datetime64[h]")
+    counts = np.where(e > s, (h1 - h0).astype(np.int64) + 1, 0)
+
+    rep = np.repeat(np.arange(len(s)), counts)
+    offset = np.arange(len(rep)) - np.repeat(np.cumsum(counts) - counts, counts)
+    hour_start = (h0[rep] + offset * _HOUR).astype("datetime64[us]")
+    seg = np.minimum(e[rep], hour_start + _HOUR) - np.maximum(s[rep], hour_start)
+    seconds = seg.astype("timedelta64[us]").astype(np.int64) / 1e6
+
+    if workday_only:
+        hour_of_day = (hour_start.astype("datetime64[h]") - hour_start.astype("datetime64[D]")).astype(np.int64)
+        keep = (hour_of_day >= config.WORKDAY_START_HOUR) & (hour_of_day < config.WORKDAY_END_HOUR)
+        rep, hour_start, seconds = rep[keep], hour_start[keep], seconds[keep]
+    return rep, hour_start, seconds
+
+def _time_columns(hour_start: np.ndarray) -> dict[str, Any]:
+    day = hour_start.astype("datetime64[D]")
+    return {
+        "Date": np.datetime_as_string(day, unit="D"),
+        "Hour": (hour_start.astype("datetime64[h]") - day).astype(np.int64),
+    }
+
+class OccupancyCube:
+    # facts — занятые минуты на зерне (ресурс × дата × час) с атрибутами ресурса,
+    # resources — все ресурсы (знаменатель), grid — часы периода и их длительность.
+    def __init__(self, facts: pd.DataFrame, resources: pd.DataFrame, grid: pd.DataFrame):
+        self.facts = facts
+        self.resources = resources
+        self.grid = grid
+
+    def slice(self, **filters: Any) -> "OccupancyCube":
+        facts, resources, grid = self.facts, self.resources, self.grid
+        for dim, value in filters.items():
+            if dim not in RESOURCE_DIMS and dim not in TIME_DIMS:
+                raise ValueError(f"Неизвестное измерение: {dim}")
+            values = list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+            facts = facts[facts[dim].isin(values)]
+            if dim in RESOURCE_DIMS:
+                resources = resources[resources[dim].isin(values)]
+            else:
+                grid = grid[grid[dim].isin(values)]
+        return OccupancyCube(facts, resources, grid)
+
+    def rollup(self, by: Sequence[str] = ()) -> pd.DataFrame:
+        by = list(by)
+        r_by = [d for d in by if d in RESOURCE_DIMS]
+        t_by = [d for d in by if d in TIME_DIMS]
+        if len(r_by) + len(t_by) != len(by):
+            raise ValueError(f"Неизвестные измерения: {set(by) - set(RESOURCE_DIMS) - set(TIME_DIMS)}")
+
+        if r_by:
+            n_res = self.resources.groupby(r_by, dropna=False).size().rename("Resources").reset_index()
+        else:
+            n_res = pd.DataFrame({"Resources": [len(self.resources)]})
+        if t_by:
+            slots = self.grid.groupby(t_by, dropna=False)["SlotMinutes"].sum().reset_index()
+        else:
+            slots = pd.DataFrame({"SlotMinutes": [float(self.grid["SlotMinutes"].sum())]})
+        cap = n_res.merge(slots, how="cross")
+        cap["CapacityMinutes"] = cap["Resources"] * cap["SlotMinutes"]
+
+        if by:
+            booked = self.facts.groupby(by, dropna=False)["BookedMinutes"].sum().reset_index()
+            out = cap.merge(booked, on=by, how="left")
+        else:
+            out = cap.assign(BookedMinutes=float(self.facts["BookedMinutes"].sum()))
+        out["BookedMinutes"] = out["BookedMinutes"].fillna(0.0).round(1)
+        pct = 100.0 * out["BookedMinutes"] / out["CapacityMinutes"].where(out["CapacityMinutes"] > 0)
+        out["UtilizationPct"] = pct.fillna(0.0).round(2)
+        return out[by + MEASURES].sort_values(by).reset_index(drop=True) if by else out[MEASURES]
+
+    def utilization(self, by: Sequence[str] = (), **filters: Any) -> pd.DataFrame:
+        return (self.slice(**filters) if filters else self).rollup(by)
+
+def build_cube(df: pd.DataFrame, start_at: datetime, end_at: datetime,
+               resources: Optional[pd.DataFrame] = None, workday_only: bool = True) -> OccupancyCube:
+    # Без полного списка ресурсов знаменатель строится только по забронированным
+    known = df[list(RESOURCE_DIMS)] if not df.empty else pd.DataFrame(columns=list(RESOURCE_DIMS))
+    if resources is None:
+        resources = _typed_resources(known.copy())
+    else:
+        extra = known[~known["ResourceID"].isin(resources["ResourceID"])]
+        resources = _typed_resources(pd.concat([resources, extra], ignore_index=True)) if len(extra) else resources
+
+    # сетка часов периода: сколько минут каждого часа попадает в [start_at, end_at)
+    _, grid_hours, grid_seconds = _hours(start_at, end_at,
+                                         np.array([np.datetime64(start_at, "us")]),
+                                         np.array([np.datetime64(end_at, "us")]), workday_only)
+    grid = pd.DataFrame({**_time_columns(grid_hours), "SlotMinutes": grid_seconds / 60.0})
+
+    if df.empty:
+        facts = pd.DataFrame(columns=list(RESOURCE_DIMS) + list(TIME_DIMS) + ["BookedMinutes"])
+        return OccupancyCube(facts, resources, grid)
+
+    rep, hour_start, seconds = _hours(start_at, end_at,
+                                      df["StartAt"].to_numpy(dtype="datetime64[us]"),
+                                      df["EndAt"].to_numpy(dtype="datetime64[us]"), workday_only)
+    facts = pd.DataFrame({
+        "ResourceID": df["ResourceID"].to_numpy(dtype=np.int64)[rep],
+        **_time_columns(hour_start),
+        "BookedMinutes": seconds / 60.0,
+    })
+    facts = facts.groupby(["ResourceID", "Date", "Hour"], as_index=False)["BookedMinutes"].sum()
+    facts = facts.merge(resources, on="ResourceID", how="left")
+    return OccupancyCube(facts[list(RESOURCE_DIMS) + list(TIME_DIMS) + ["BookedMinutes"]], resources, grid)
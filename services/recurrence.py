@@ -0,0 +1,95 @@
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+# Развёртка повторяющейся брони в список интервалов.
+# Поддерживается подмножество RRULE (RFC 5545): FREQ=DAILY|WEEKLY, INTERVAL,
+# COUNT, UNTIL, BYDAY — этого хватает для планёрок и регулярных встреч.
+
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+MAX_OCCURRENCES = 366
+
+def parse_rrule(rule: str) -> dict:
+    # "FREQ=WEEKLY;INTERVAL=1;COUNT=13;BYDAY=MO,WE" -> аргументы expand_recurrence
+    out: dict = {}
+    for part in rule.strip().removeprefix("RRULE:").split(";"):
+        if not part:
+            continue
+        key, _, value = part.partition("=")
+        key = key.strip().upper()
+        value = value.strip().upper()
+        if key == "FREQ":
+            out["freq"] = value
+        elif key == "INTERVAL":
+            out["interval"] = int(value)
+        elif key == "COUNT":
+            out["count"] = int(value)
+        elif key == "UNTIL":
+            out["until"] = datetime.strptime(value[:8], "%Y%m%d").date()
+        elif key == "BYDAY":
+            out["by_weekday"] = [WEEKDAYS.index(d) for d in value.split(",")]
+        else:
+            raise ValueError(f"Неподдерживаемое правило повтора: {key}")
+    return out
+
+def expand_recurrence(
+    start_at: datetime,
+    end_at: datetime,
+    freq: str = "WEEKLY",
+    interval: int = 1,
+    count: Optional[int] = None,
+    until: Optional[date] = None,
+    by_weekday: Optional[Iterable[int]] = None,
+    exclude: Iterable[date] = (),
+) -> list[tuple[datetime, datetime]]:
+    # Первое вхождение — start_at, если его день подходит под правило; при BYDAY
+    # без дня недели start_at — первый подходящий день после него (время то же).
+    # until включительно (дата начала). exclude — даты, которые пропускаются
+    # (праздники), но учитываются в COUNT. Для DAILY BYDAY — фильтр: дни не из
+    # списка пропускаются и в COUNT не идут. Больше MAX_OCCURRENCES — ValueError,
+    # серия не обрезается молча.
+    if end_at <= start_at:
+        raise ValueError("End должен быть позже Start.")
+    if count is None and until is None:
+        raise ValueError("Нужно указать COUNT или UNTIL.")
+    if interval < 1:
+        raise ValueError("INTERVAL должен быть положительным.")
+    if count is not None and count > MAX_OCCURRENCES:
+        raise ValueError(f"COUNT больше {MAX_OCCURRENCES}: разбейте серию на несколько.")
+    freq = freq.upper()
+    duration = end_at - start_at
+    skip = set(exclude)
+
+    allowed = None
+    if freq == "DAILY":
+        step, days = timedelta(days=interval), None
+        if by_weekday:
+            allowed = set(by_weekday)
+            reachable = {(start_at.weekday() + k * interval) % 7 for k in range(7)}
+            if not allowed & reachable:
+                raise ValueError("BYDAY не совпадает ни с одним днём серии.")
+    elif freq == "WEEKLY":
+        step = timedelta(weeks=interval)
+        days = sorted(set(by_weekday)) if by_weekday else [start_at.weekday()]
+    else:
+        raise ValueError(f"Неподдерживаемая частота: {freq}")
+
+    out: list[tuple[datetime, datetime]] = []
+    seen = 0
+    # начало периода (недели для WEEKLY), от которого откладываются вхождения
+    base = start_at if days is None else start_at - timedelta(days=start_at.weekday())
+    while count is None or seen < count:
+        candidates = [base] if days is None else [base + timedelta(days=d) for d in days]
+        for s in candidates:
+            if s < start_at or (allowed is not None and s.weekday() not in allowed):
+                continue
+            if until is not None and s.date() > until:
+                return out
+            if seen >= MAX_OCCURRENCES:
+                raise ValueError(f"До UNTIL больше {MAX_OCCURRENCES} повторов: сократите период.")
+            seen += 1
+            if s.date() not in skip:
+                out.append((s, s + duration))
+            if count is not None and seen >= count:
+                break
+        base += step
+    return out
@@ -0,0 +1,30 @@
+-- Дневные агрегаты для аналитики (services/analytics_rollups.py).
+-- Выполнить один раз в базе OfficeBankIS после schema.sql.
+USE [OfficeBankIS]
+GO
+
+CREATE TABLE [dbo].[AnalyticsDailyRollups](
+	[Day] [date] NOT NULL,
+	[ResourceID] [int] NOT NULL,
+	[BookedMinutes] [int] NOT NULL,   -- в рабочем окне дня (WORKDAY_START_HOUR..WORKDAY_END_HOUR)
+	[TotalMinutes] [int] NOT NULL,    -- в пределах суток
+ CONSTRAINT [PK_AnalyticsDailyRollups] PRIMARY KEY CLUSTERED ([Day] ASC, [ResourceID] ASC)
+)
+GO
+
+ALTER TABLE [dbo].[AnalyticsDailyRollups] WITH CHECK ADD CONSTRAINT [FK_AnalyticsDailyRollups_Resources]
+FOREIGN KEY([ResourceID]) REFERENCES [dbo].[Resources] ([ResourceID])
+GO
+
+CREATE TABLE [dbo].[AnalyticsWatermarks](
+	[Name] [nvarchar](50) NOT NULL,
+	[WatermarkAt] [datetime2](0) NOT NULL,
+ CONSTRAINT [PK_AnalyticsWatermarks] PRIMARY KEY CLUSTERED ([Name] ASC)
+)
+GO
+
+-- Поиск броней, изменённых после водяной отметки
+CREATE NONCLUSTERED INDEX [IX_Bookings_CreatedAt] ON [dbo].[Bookings] ([CreatedAt] ASC) INCLUDE ([StartAt], [EndAt])
+GO
+CREATE NONCLUSTERED INDEX [IX_Bookings_UpdatedAt] ON [dbo].[Bookings] ([UpdatedAt] ASC) INCLUDE ([StartAt], [EndAt])
+GO
@@ -0,0 +1,8 @@
+-- Выбор согласующего (services/approvers.py, APPROVER_POLICY = "least_pending"):
+-- число открытых согласований каждого FAC считается по индексу, без скана
+-- dbo.BookingApprovals. Выполнить один раз в базе OfficeBankIS после schema.sql.
+USE [OfficeBankIS]
+GO
+
+CREATE NONCLUSTERED INDEX [IX_BookingApprovals_ApproverStatus] ON [dbo].[BookingApprovals] ([ApproverUserID] ASC, [ApprovalStatusID] ASC)
+GO
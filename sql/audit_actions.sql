@@ -0,0 +1,16 @@
+-- Журнал действий (services/audit.py): коды dbo.AuditActionTypes, которые пишут
+-- сервисы. Событие с кодом, которого нет в справочнике, не записывается.
+-- Выполнить в базе OfficeBankIS после schema.sql; повторный запуск ничего не меняет.
+USE [OfficeBankIS]
+GO
+
+INSERT INTO [dbo].[AuditActionTypes] ([ActionCode], [ActionName])
+SELECT v.ActionCode, v.ActionName
+FROM (VALUES
+    (N'LOGIN', N'Вход'),
+    (N'BOOKING_CREATE', N'Создание брони'),
+    (N'BOOKING_CANCEL', N'Отмена брони'),
+    (N'APPROVAL_DECIDE', N'Решение по согласованию')
+) AS v(ActionCode, ActionName)
+WHERE NOT EXISTS (SELECT 1 FROM [dbo].[AuditActionTypes] t WHERE t.ActionCode = v.ActionCode)
+GO
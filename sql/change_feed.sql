@@ -0,0 +1,18 @@
+-- Лента изменений (booking_service.changes_since): индексы по отметкам времени,
+-- чтобы опрос «что изменилось с прошлого раза» читал только новые строки.
+-- Выполнить один раз в базе OfficeBankIS после schema.sql; индексы Bookings
+-- совпадают с sql/analytics_rollups.sql и создаются, только если их ещё нет.
+USE [OfficeBankIS]
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = N'IX_Bookings_CreatedAt' AND object_id = OBJECT_ID(N'dbo.Bookings'))
+    CREATE NONCLUSTERED INDEX [IX_Bookings_CreatedAt] ON [dbo].[Bookings] ([CreatedAt] ASC) INCLUDE ([StartAt], [EndAt])
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = N'IX_Bookings_UpdatedAt' AND object_id = OBJECT_ID(N'dbo.Bookings'))
+    CREATE NONCLUSTERED INDEX [IX_Bookings_UpdatedAt] ON [dbo].[Bookings] ([UpdatedAt] ASC) INCLUDE ([StartAt], [EndAt])
+GO
+CREATE NONCLUSTERED INDEX [IX_BookingApprovals_RequestedAt] ON [dbo].[BookingApprovals] ([RequestedAt] ASC)
+GO
+CREATE NONCLUSTERED INDEX [IX_BookingApprovals_DecidedAt] ON [dbo].[BookingApprovals] ([DecidedAt] ASC)
+WHERE [DecidedAt] IS NOT NULL
+GO
@@ -0,0 +1,9 @@
+-- Уведомления (services/notifications.py): счётчик непрочитанных и список
+-- непрочитанных пользователя читаются по фильтрованному индексу, не сканируя
+-- всю dbo.Notifications. Выполнить один раз в базе OfficeBankIS после schema.sql.
+USE [OfficeBankIS]
+GO
+
+CREATE NONCLUSTERED INDEX [IX_Notifications_Unread] ON [dbo].[Notifications] ([UserID] ASC, [NotificationID] DESC)
+WHERE [IsRead] = 0
+GO
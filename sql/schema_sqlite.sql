@@ -0,0 +1,206 @@
+-- Схема OfficeBankIS для SQLite (DB_BACKEND = "sqlite"), переложение sql/schema.sql
+-- и sql/analytics_rollups.sql, sql/notifications.sql, sql/change_feed.sql, sql/approvers.sql.
+-- Файл базы подключается как схема dbo (db.DB.connect_sqlite), поэтому имена
+-- таблиц те же. Отличия от SQL Server:
+--   IDENTITY        -> INTEGER PRIMARY KEY AUTOINCREMENT (номера не переиспользуются);
+--   bit             -> INTEGER 0/1;
+--   datetime2(0)    -> TEXT 'YYYY-MM-DD HH:MM:SS' (UTC для значений по умолчанию);
+--   ссылки FOREIGN KEY — без схемы: в SQLite родитель ищется в той же базе.
+-- Выполняется db.init_sqlite_schema; повторный запуск ничего не меняет.
+
+CREATE TABLE IF NOT EXISTS dbo.Offices (
+    OfficeID     INTEGER PRIMARY KEY AUTOINCREMENT,
+    OfficeName   TEXT NOT NULL,
+    City         TEXT NOT NULL,
+    Address      TEXT NULL,
+    CreatedAt    TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS dbo.Departments (
+    DepartmentID   INTEGER PRIMARY KEY AUTOINCREMENT,
+    OfficeID       INTEGER NOT NULL REFERENCES Offices(OfficeID),
+    DepartmentName TEXT NOT NULL,
+    CONSTRAINT UQ_Departments UNIQUE (OfficeID, DepartmentName)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.Employees (
+    EmployeeID   INTEGER PRIMARY KEY AUTOINCREMENT,
+    DepartmentID INTEGER NOT NULL REFERENCES Departments(DepartmentID),
+    FullName     TEXT NOT NULL,
+    Email        TEXT NULL,
+    Phone        TEXT NULL,
+    IsActive     INTEGER NOT NULL DEFAULT 1,
+    CreatedAt    TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+);
+CREATE UNIQUE INDEX IF NOT EXISTS dbo.UX_Employees_Email ON Employees(Email) WHERE Email IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS dbo.UserAccounts (
+    UserID       INTEGER PRIMARY KEY AUTOINCREMENT,
+    EmployeeID   INTEGER NOT NULL REFERENCES Employees(EmployeeID),
+    Login        TEXT NOT NULL,
+    PasswordHash TEXT NOT NULL,
+    IsLocked     INTEGER NOT NULL DEFAULT 0,
+    CreatedAt    TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now')),
+    CONSTRAINT UQ_UserAccounts_Employee UNIQUE (EmployeeID),
+    CONSTRAINT UQ_UserAccounts_Login UNIQUE (Login)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.Roles (
+    RoleID   INTEGER PRIMARY KEY AUTOINCREMENT,
+    RoleCode TEXT NOT NULL,
+    RoleName TEXT NOT NULL,
+    CONSTRAINT UQ_Roles UNIQUE (RoleCode)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.UserRoles (
+    UserID     INTEGER NOT NULL REFERENCES UserAccounts(UserID),
+    RoleID     INTEGER NOT NULL REFERENCES Roles(RoleID),
+    AssignedAt TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now')),
+    CONSTRAINT PK_UserRoles PRIMARY KEY (UserID, RoleID)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.Zones (
+    ZoneID       INTEGER PRIMARY KEY AUTOINCREMENT,
+    OfficeID     INTEGER NOT NULL REFERENCES Offices(OfficeID),
+    ZoneName     TEXT NOT NULL,
+    FloorNo      INTEGER NULL,
+    IsRestricted INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT UQ_Zones UNIQUE (OfficeID, ZoneName)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.ZoneAccess (
+    ZoneID INTEGER NOT NULL REFERENCES Zones(ZoneID),
+    RoleID INTEGER NOT NULL REFERENCES Roles(RoleID),
+    CONSTRAINT PK_ZoneAccess PRIMARY KEY (ZoneID, RoleID)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.ResourceStatuses (
+    ResourceStatusID INTEGER PRIMARY KEY AUTOINCREMENT,
+    StatusCode       TEXT NOT NULL,
+    StatusName       TEXT NOT NULL,
+    CONSTRAINT UQ_ResourceStatuses UNIQUE (StatusCode)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.Resources (
+    ResourceID       INTEGER PRIMARY KEY AUTOINCREMENT,
+    ZoneID           INTEGER NOT NULL REFERENCES Zones(ZoneID),
+    ResourceKind     TEXT NOT NULL CONSTRAINT CK_Resources_Kind CHECK (ResourceKind IN ('D', 'R')),
+    DisplayName      TEXT NOT NULL,
+    ResourceStatusID INTEGER NOT NULL REFERENCES ResourceStatuses(ResourceStatusID),
+    CreatedAt        TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS dbo.Rooms (
+    ResourceID   INTEGER PRIMARY KEY REFERENCES Resources(ResourceID),
+    Capacity     INTEGER NOT NULL CONSTRAINT CK_Rooms_Capacity CHECK (Capacity > 0),
+    HasVideoConf INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS dbo.Desks (
+    ResourceID INTEGER PRIMARY KEY REFERENCES Resources(ResourceID),
+    DeskCode   TEXT NOT NULL,
+    IsHotDesk  INTEGER NOT NULL DEFAULT 1,
+    CONSTRAINT UQ_Desks_Code UNIQUE (DeskCode)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.Equipments (
+    EquipmentID   INTEGER PRIMARY KEY AUTOINCREMENT,
+    EquipmentName TEXT NOT NULL,
+    CONSTRAINT UQ_Equipments UNIQUE (EquipmentName)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.ResourceEquipments (
+    ResourceID  INTEGER NOT NULL REFERENCES Resources(ResourceID),
+    EquipmentID INTEGER NOT NULL REFERENCES Equipments(EquipmentID),
+    CONSTRAINT PK_ResourceEquipments PRIMARY KEY (ResourceID, EquipmentID)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.BookingStatuses (
+    BookingStatusID INTEGER PRIMARY KEY AUTOINCREMENT,
+    StatusCode      TEXT NOT NULL,
+    StatusName      TEXT NOT NULL,
+    CONSTRAINT UQ_BookingStatuses UNIQUE (StatusCode)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.Bookings (
+    BookingID         INTEGER PRIMARY KEY AUTOINCREMENT,
+    ResourceID        INTEGER NOT NULL REFERENCES Resources(ResourceID),
+    RequestedByUserID INTEGER NOT NULL REFERENCES UserAccounts(UserID),
+    StartAt           TEXT NOT NULL,
+    EndAt             TEXT NOT NULL,
+    Title             TEXT NULL,
+    Notes             TEXT NULL,
+    ParticipantsCount INTEGER NULL,
+    BookingStatusID   INTEGER NOT NULL REFERENCES BookingStatuses(BookingStatusID),
+    CreatedAt         TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now')),
+    UpdatedAt         TEXT NULL,
+    CONSTRAINT CK_Bookings_Time CHECK (EndAt > StartAt)
+);
+CREATE INDEX IF NOT EXISTS dbo.IX_Bookings_ResourceTime ON Bookings(ResourceID, StartAt, EndAt);
+CREATE INDEX IF NOT EXISTS dbo.IX_Bookings_CreatedAt ON Bookings(CreatedAt);
+CREATE INDEX IF NOT EXISTS dbo.IX_Bookings_UpdatedAt ON Bookings(UpdatedAt);
+
+CREATE TABLE IF NOT EXISTS dbo.ApprovalStatuses (
+    ApprovalStatusID INTEGER PRIMARY KEY AUTOINCREMENT,
+    StatusCode       TEXT NOT NULL,
+    StatusName       TEXT NOT NULL,
+    CONSTRAINT UQ_ApprovalStatuses UNIQUE (StatusCode)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.BookingApprovals (
+    ApprovalID       INTEGER PRIMARY KEY AUTOINCREMENT,
+    BookingID        INTEGER NOT NULL REFERENCES Bookings(BookingID),
+    ApproverUserID   INTEGER NOT NULL REFERENCES UserAccounts(UserID),
+    ApprovalStatusID INTEGER NOT NULL REFERENCES ApprovalStatuses(ApprovalStatusID),
+    RequestedAt      TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now')),
+    DecidedAt        TEXT NULL,
+    Comment          TEXT NULL,
+    CONSTRAINT UQ_BookingApprovals UNIQUE (BookingID, ApproverUserID)
+);
+-- sql/change_feed.sql
+CREATE INDEX IF NOT EXISTS dbo.IX_BookingApprovals_RequestedAt ON BookingApprovals(RequestedAt);
+CREATE INDEX IF NOT EXISTS dbo.IX_BookingApprovals_DecidedAt ON BookingApprovals(DecidedAt) WHERE DecidedAt IS NOT NULL;
+-- sql/approvers.sql
+CREATE INDEX IF NOT EXISTS dbo.IX_BookingApprovals_ApproverStatus ON BookingApprovals(ApproverUserID, ApprovalStatusID);
+
+CREATE TABLE IF NOT EXISTS dbo.Notifications (
+    NotificationID INTEGER PRIMARY KEY AUTOINCREMENT,
+    UserID         INTEGER NOT NULL REFERENCES UserAccounts(UserID),
+    BookingID      INTEGER NULL REFERENCES Bookings(BookingID),
+    Message        TEXT NOT NULL,
+    IsRead         INTEGER NOT NULL DEFAULT 0,
+    CreatedAt      TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+);
+-- sql/notifications.sql
+CREATE INDEX IF NOT EXISTS dbo.IX_Notifications_Unread ON Notifications(UserID, NotificationID DESC) WHERE IsRead = 0;
+
+CREATE TABLE IF NOT EXISTS dbo.AuditActionTypes (
+    ActionTypeID INTEGER PRIMARY KEY AUTOINCREMENT,
+    ActionCode   TEXT NOT NULL,
+    ActionName   TEXT NOT NULL,
+    CONSTRAINT UQ_AuditActionTypes UNIQUE (ActionCode)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.AuditLogs (
+    AuditLogID   INTEGER PRIMARY KEY AUTOINCREMENT,
+    UserID       INTEGER NOT NULL REFERENCES UserAccounts(UserID),
+    ActionTypeID INTEGER NOT NULL REFERENCES AuditActionTypes(ActionTypeID),
+    EntityName   TEXT NOT NULL,
+    EntityID     INTEGER NULL,
+    OccurredAt   TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now')),
+    Details      TEXT NULL
+);
+
+-- sql/analytics_rollups.sql
+CREATE TABLE IF NOT EXISTS dbo.AnalyticsDailyRollups (
+    [Day]         TEXT NOT NULL,
+    ResourceID    INTEGER NOT NULL REFERENCES Resources(ResourceID),
+    BookedMinutes INTEGER NOT NULL,
+    TotalMinutes  INTEGER NOT NULL,
+    CONSTRAINT PK_AnalyticsDailyRollups PRIMARY KEY ([Day], ResourceID)
+);
+
+CREATE TABLE IF NOT EXISTS dbo.AnalyticsWatermarks (
+    Name        TEXT NOT NULL PRIMARY KEY,
+    WatermarkAt TEXT NOT NULL
+);
@@ -0,0 +1,87 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+import config
+from services.analytics_service import utilization_by_day
+
+def utilization_by_day_loop(df: pd.DataFrame, start_at: datetime, end_at: datetime) -> pd.DataFrame:
+    # Прежняя реализация (день за днём + iterrows) — эталон для сравнения
+    wd_start = config.WORKDAY_START_HOUR
+    wd_end = config.WORKDAY_END_HOUR
+    work_minutes = (wd_end - wd_start) * 60
+
+    if df.empty:
+        return pd.DataFrame(columns=["Date","BookedMinutes","UtilizationPct"])
+
+    records = []
+    cur = start_at.date()
+    last = end_at.date()
+    while cur <= last:
+        day_start = datetime(cur.year, cur.month, cur.day, wd_start, 0, 0)
+        day_end = datetime(cur.year, cur.month, cur.day, wd_end, 0, 0)
+        mask = (df["StartAt"] < day_end) & (df["EndAt"] > day_start)
+        day_df = df[mask]
+        booked = 0
+        for _, r in day_df.iterrows():
+            s = max(r["StartAt"].to_pydatetime(), day_start)
+            e = min(r["EndAt"].to_pydatetime(), day_end)
+            if e > s:
+                booked += int((e - s).total_seconds() // 60)
+        records.append({
+            "Date": cur.isoformat(),
+            "BookedMinutes": booked,
+            "UtilizationPct": round(100.0 * booked / max(1, work_minutes), 2),
+        })
+        cur = cur + timedelta(days=1)
+
+    return pd.DataFrame(records)
+
+def synthetic_bookings(n: int, start_at: datetime, days: int, n_resources: int = 50, seed: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    starts = np.datetime64(start_at, "s") + rng.integers(-86400, days * 86400, n).astype("timedelta64[s]")
+    # в основном встречи по 15..240 минут, изредка многодневные
+    dur = rng.integers(15 * 60, 240 * 60, n)
+    long = rng.random(n) < 0.02
+    dur[long] = rng.integers(86400, 5 * 86400, long.sum())
+    ends = starts + dur.astype("timedelta64[s]")
+    return pd.DataFrame({
+        "BookingID": np.arange(1, n + 1),
+        "Resource": [f"R{i}" for i in rng.integers(0, n_resources, n)],
+        "Kind": "R",
+        "Zone": "Z",
+        "StartAt": pd.to_datetime(starts),
+        "EndAt": pd.to_datetime(ends),
+        "Status": "APPROVED",
+    })
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def run_bench(n: int = 20000, days: int = 92, repeat: int = 3):
+    start_at = datetime(2025, 1, 1)
+    end_at = start_at + timedelta(days=days)
+    df = synthetic_bookings(n, start_at, days)
+
+    new = utilization_by_day(df, start_at, end_at)
+    old = utilization_by_day_loop(df, start_at, end_at)
+    pd.testing.assert_frame_equal(new, old)
+
+    t_old = _best_of(lambda: utilization_by_day_loop(df, start_at, end_at), 1)
+    t_new = _best_of(lambda: utilization_by_day(df, start_at, end_at), repeat)
+    print(f"Bookings: {n}, Days: {days + 1}")
+    print(f"loop:       {t_old * 1000:9.1f} ms")
+    print(f"vectorized: {t_new * 1000:9.1f} ms  (x{t_old / max(t_new, 1e-9):.0f})")
+
+if __name__ == "__main__":
+    run_bench()
@@ -0,0 +1,72 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import argparse
+import random
+from collections import deque
+
+from services.approvers import assign
+
+# Время до решения по заявке в закрытую зону при разных APPROVER_POLICY.
+# Моделирование без БД: заявки приходят пуассоновским потоком (rate в час),
+# каждый FAC разбирает свою очередь по порядку, время решения — экспонента
+# со средним service минут, у последнего согласующего скорость slow.
+# Нагрузка для least_pending — открытые заявки согласующего на момент прихода,
+# как считает services/approvers.py. round_robin — для сравнения, в сервисе его нет.
+#   python -m tests.bench_approvers [--approvers 3] [--rate 20] [--service 6] [--hours 40]
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+def simulate(policy, approvers=3, rate=20.0, service=6.0, hours=40.0, slow=0.5, seed=1):
+    # -> (минуты до решения по каждой заявке, заявок на согласующего)
+    rng = random.Random(seed)
+    speed = {uid: 1.0 for uid in range(1, approvers + 1)}
+    speed[approvers] = slow
+    open_until = {uid: deque() for uid in speed}    # моменты решения ещё открытых заявок
+    share = {uid: 0 for uid in speed}
+    waits, t, n = [], 0.0, 0
+    while True:
+        t += rng.expovariate(rate / 60.0)
+        if t > hours * 60:
+            break
+        for q in open_until.values():
+            while q and q[0] <= t:
+                q.popleft()
+        if policy == "round_robin":
+            uid = n % approvers + 1
+        else:
+            uid = assign({u: len(q) for u, q in open_until.items()}, 1, policy)[0]
+        q = open_until[uid]
+        done = max(t, q[-1] if q else t) + rng.expovariate(1.0 / service) / speed[uid]
+        q.append(done)
+        waits.append(done - t)
+        share[uid] += 1
+        n += 1
+    return waits, share
+
+def run_bench(approvers=3, rate=20.0, service=6.0, hours=40.0, slow=0.5, seed=1):
+    print(f"approvers: {approvers} (last x{slow}), arrivals: {rate}/h, decision: {service} min avg, "
+          f"{hours} h simulated")
+    print(f"{'policy':>14} {'p50 min':>8} {'p90 min':>8} {'p99 min':>8} {'max min':>8}  share")
+    for policy in ("first", "round_robin", "least_pending"):
+        waits, share = simulate(policy, approvers, rate, service, hours, slow, seed)
+        print(f"{policy:>14} {_percentile(waits, 50):8.1f} {_percentile(waits, 90):8.1f} "
+              f"{_percentile(waits, 99):8.1f} {max(waits):8.1f}  "
+              + " ".join(f"{uid}:{k}" for uid, k in share.items()))
+
+def main():
+    ap = argparse.ArgumentParser(description="Выбор согласующего: время до решения по политикам")
+    ap.add_argument("--approvers", type=int, default=3)
+    ap.add_argument("--rate", type=float, default=20.0, help="заявок в час")
+    ap.add_argument("--service", type=float, default=6.0, help="среднее время решения, минут")
+    ap.add_argument("--hours", type=float, default=40.0)
+    ap.add_argument("--slow", type=float, default=0.5, help="скорость последнего согласующего")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    run_bench(args.approvers, args.rate, args.service, args.hours, args.slow, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import time
+from datetime import datetime, timedelta
+
+from db import DB
+from services.availability_service import find_available_resources, next_free_slots
+from services.booking_service import create_booking
+from services.common import refdata
+
+# Сравнение «перебора» (create_booking по ресурсам/времени до первого успеха)
+# с find_available_resources/next_free_slots. Перед замером все переговорные,
+# кроме последней, занимаются бронями с префиксом LOAD_PREFIX; после — чистим.
+
+LOAD_PREFIX = "[BENCHAVAIL]"
+
+def _cleanup(db: DB) -> None:
+    db.execute("""
+      DELETE a FROM dbo.BookingApprovals a
+      JOIN dbo.Bookings b ON b.BookingID = a.BookingID
+      WHERE b.Title LIKE ?
+    """, (f"{LOAD_PREFIX}%",))
+    db.execute("DELETE FROM dbo.Bookings WHERE Title LIKE ?", (f"{LOAD_PREFIX}%",))
+    db.commit()
+
+def _book(db: DB, rid: int, user_id: int, s: datetime, e: datetime, title: str):
+    return create_booking(db, rid, user_id, s, e, title=f"{LOAD_PREFIX} {title}", notes="", participants=1)
+
+def trial_and_error_resource(db: DB, room_ids, user_id, s, e) -> tuple[int, int]:
+    attempts = 0
+    for rid in room_ids:
+        attempts += 1
+        if _book(db, rid, user_id, s, e, "trial").ok:
+            return rid, attempts
+    return 0, attempts
+
+def trial_and_error_slot(db: DB, rid, user_id, start, duration, step=timedelta(minutes=30)) -> tuple[datetime, int]:
+    attempts = 0
+    s = start
+    while s < start + timedelta(days=7):
+        attempts += 1
+        if _book(db, rid, user_id, s, s + duration, "trial-slot").ok:
+            return s, attempts
+        s += step
+    return None, attempts
+
+def run_bench(user_id: int = 1):
+    db = DB.connect()
+    try:
+        refdata.refresh(db)
+        _cleanup(db)
+        room_ids = [int(r.ResourceID) for r in db.fetchall(
+            "SELECT ResourceID FROM dbo.Resources WHERE ResourceKind='R' ORDER BY ResourceID")]
+        if len(room_ids) < 2:
+            print("Нужно хотя бы две переговорные.")
+            return
+        day = (datetime.now() + timedelta(days=3)).replace(hour=9, minute=0, second=0, microsecond=0)
+        s, e = day.replace(hour=10), day.replace(hour=11)
+        # все, кроме последней, заняты на [s, e); первая — весь рабочий день
+        for rid in room_ids[:-1]:
+            _book(db, rid, user_id, s, e, "fill")
+        _book(db, room_ids[0], user_id, day, day.replace(hour=16), "fill")
+
+        t0 = time.perf_counter()
+        rid, attempts = trial_and_error_resource(db, room_ids, user_id, s, e)
+        t_trial = time.perf_counter() - t0
+        db.execute("DELETE FROM dbo.Bookings WHERE Title = ?", (f"{LOAD_PREFIX} trial",)); db.commit()
+
+        t0 = time.perf_counter()
+        free = find_available_resources(db, s, e, kind="R")
+        ok = bool(free) and _book(db, free[0].resource_id, user_id, s, e, "search").ok
+        t_search = time.perf_counter() - t0
+        print(f"Rooms: {len(room_ids)}")
+        print(f"resource trial-and-error: {t_trial * 1000:8.1f} ms, attempts={attempts} -> {rid}")
+        print(f"find_available_resources: {t_search * 1000:8.1f} ms, 2 round trips -> "
+              f"{free[0].resource_id if free else None} ok={ok}")
+
+        t0 = time.perf_counter()
+        slot, attempts = trial_and_error_slot(db, room_ids[0], user_id, day, timedelta(minutes=60))
+        t_trial = time.perf_counter() - t0
+        db.execute("DELETE FROM dbo.Bookings WHERE Title = ?", (f"{LOAD_PREFIX} trial-slot",)); db.commit()
+
+        t0 = time.perf_counter()
+        slots = next_free_slots(db, room_ids[0], timedelta(minutes=60), start_at=day, limit=1)
+        t_search = time.perf_counter() - t0
+        print(f"slot trial-and-error:     {t_trial * 1000:8.1f} ms, attempts={attempts} -> {slot}")
+        print(f"next_free_slots:          {t_search * 1000:8.1f} ms, 1 round trip -> {slots[0][0] if slots else None}")
+    finally:
+        _cleanup(db)
+        db.close()
+
+if __name__ == "__main__":
+    run_bench()
@@ -0,0 +1,109 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from db import DB
+from services.booking_service import _CONFLICT_SQL
+
+# Накладные расходы одного вызова DB на горячем запросе (проверка конфликта):
+#   new cursor — DB_CURSOR_CACHE = 0, курсор и подготовка на каждый вызов;
+#   lru        — курсор из LRU соединения по тексту SQL;
+#   prepare    — db.prepare(sql), закреплённый курсор.
+# И executemany с fast_executemany и без (разница видна только на SQL Server).
+# По умолчанию — синтетическая SQLite во временном каталоге, --live — SQL Server из config.
+#
+#   python -m tests.bench_db_calls [-n 5000] [--live]
+
+def _per_call_us(fn, n: int, repeats: int = 7) -> float:
+    best = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for i in range(n):
+            fn(i)
+        best.append((time.perf_counter() - t0) / n * 1e6)
+    return statistics.median(best)
+
+def bench_calls(db: DB, n: int, room_ids: list[int], base: datetime) -> dict[str, dict[str, float]]:
+    # trivial — чистые накладные расходы вызова, conflict — реальный горячий запрос
+    def conflict_args(i):
+        s = base + timedelta(minutes=30 * (i % 48))
+        return room_ids[i % len(room_ids)], s + timedelta(hours=1), s
+
+    statements = {"trivial": ("SELECT ? AS x", lambda i: (i,)), "conflict": (_CONFLICT_SQL, conflict_args)}
+    out: dict[str, dict[str, float]] = {}
+    size = db.cursor_cache_size
+    try:
+        for name, (sql, args) in statements.items():
+            db.cursor_cache_size = 0
+            new = _per_call_us(lambda i: db.fetchone(sql, args(i)), n)
+            db.cursor_cache_size = max(size, 1)
+            lru = _per_call_us(lambda i: db.fetchone(sql, args(i)), n)
+            stmt = db.prepare(sql)
+            out[name] = {"new cursor": new, "lru": lru, "prepare": _per_call_us(lambda i: stmt.fetchone(args(i)), n)}
+    finally:
+        db.cursor_cache_size = size
+    return out
+
+def bench_executemany(db: DB, rows: int) -> dict[str, float]:
+    if db.dialect.tsql_batches:
+        db.execute("CREATE TABLE #BenchRows (ID int NOT NULL, StartAt datetime2(0) NOT NULL, Title nvarchar(200) NULL)")
+        table = "#BenchRows"
+    else:
+        db.execute("CREATE TEMP TABLE BenchRows (ID INTEGER NOT NULL, StartAt TEXT NOT NULL, Title TEXT NULL)")
+        table = "temp.BenchRows"
+    data = [(i, datetime(2025, 1, 1) + timedelta(minutes=i), f"row {i}") for i in range(rows)]
+    out = {}
+    try:
+        for fast in (False, True):
+            db.execute(f"DELETE FROM {table}")
+            t0 = time.perf_counter()
+            db.executemany(f"INSERT INTO {table}(ID, StartAt, Title) VALUES (?, ?, ?)", data, fast=fast)
+            out[f"fast={fast}"] = (time.perf_counter() - t0) * 1000.0
+    finally:
+        db.rollback()
+        db.execute(f"DROP TABLE {table}")
+        db.commit()
+    return out
+
+def _rooms(db: DB) -> list[int]:
+    return [int(r.ResourceID) for r in db.fetchall("SELECT ResourceID FROM dbo.Resources WHERE ResourceKind = 'R'")]
+
+def run_bench(n: int = 5000, rows: int = 10000, live: bool = False) -> dict:
+    tmp = None
+    if live:
+        db = DB.connect()
+    else:
+        from scripts.gen_synthetic import create_database
+        tmp = Path(tempfile.mkdtemp(prefix="officebank-bench-"))
+        create_database(tmp / "bench.sqlite3", bookings=20000, rounds=4)
+        db = DB.connect_sqlite(str(tmp / "bench.sqlite3"))
+    try:
+        print(f"backend: {db.dialect.name}, calls per run: {n}")
+        calls = bench_calls(db, n, _rooms(db), datetime.now().replace(minute=0, second=0, microsecond=0))
+        for stmt, variants in calls.items():
+            base = variants["new cursor"]
+            for name, us in variants.items():
+                print(f"  fetchone {stmt:8s} {name:11s} {us:8.1f} us/call  ({(us - base) / base * 100:+6.1f}%)")
+        bulk = bench_executemany(db, rows)
+        for name, ms in bulk.items():
+            print(f"  executemany {rows} rows {name:10s} {ms:8.1f} ms")
+        return {"calls_us": calls, "executemany_ms": bulk}
+    finally:
+        db.close()
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=5000)
+    ap.add_argument("--rows", type=int, default=10000)
+    ap.add_argument("--live", action="store_true")
+    args = ap.parse_args()
+    run_bench(n=args.n, rows=args.rows, live=args.live)
@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import config
+from db import ConnectionPool, get_pool, close_pool
+from security import hash_password
+from services.auth_service import login_pooled
+
+# Задержка входа (p50/p99) при N одновременных логинах.
+# По умолчанию БД подменяется словарём в памяти — меряется bcrypt и пул;
+# с --live ходим в настоящую БД пользователями из scripts/set_passwords.py.
+
+class _MemoryDB:
+    def __init__(self, accounts):
+        self.accounts = accounts
+
+    def fetchall(self, sql, params=()):
+        acc = self.accounts.get(params[0])
+        if acc is None:
+            return []
+        return [SimpleNamespace(UserID=acc["id"], EmployeeID=acc["id"], Login=params[0],
+                                PasswordHash=acc["hash"], FullName=params[0], RoleCode=role)
+                for role in acc["roles"]]
+
+    def execute(self, sql, params=()):
+        new_hash, user_id, old_hash = params
+        for acc in self.accounts.values():
+            if acc["id"] == user_id and acc["hash"] == old_hash:
+                acc["hash"] = new_hash
+                return 1
+        return 0
+
+    def commit(self): pass
+    def rollback(self): pass
+    def ping(self): return True
+    def close(self): pass
+
+def _memory_pool(users, rounds):
+    accounts = {lg: {"id": i + 1, "hash": hash_password(pw, rounds), "roles": ["EMP"]}
+                for i, (lg, pw) in enumerate(users)}
+    return ConnectionPool(min_size=0, max_size=16, connect=lambda: _MemoryDB(accounts))
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+def run_bench(n=64, concurrency=(1, 2, 4, 8), live=False, rounds=None):
+    from scripts.set_passwords import USERS
+    rounds = rounds or config.BCRYPT_ROUNDS
+    if not live:
+        config.BCRYPT_ROUNDS = rounds   # иначе первый вход каждого пользователя пересчитает хэш
+    pool = get_pool() if live else _memory_pool(USERS, rounds)
+    print(f"bcrypt cost: {rounds}, logins per run: {n}, backend: {'live' if live else 'memory'}")
+    try:
+        for threads in concurrency:
+            def one(i):
+                lg, pw = USERS[i % len(USERS)]
+                t0 = time.perf_counter()
+                user = login_pooled(pool, lg, pw)
+                assert user is not None, lg
+                return time.perf_counter() - t0
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(threads) as ex:
+                lat = list(ex.map(one, range(n)))
+            wall = time.perf_counter() - t0
+            print(f"threads={threads:2d}  p50={_percentile(lat, 50) * 1000:7.1f} ms  "
+                  f"p99={_percentile(lat, 99) * 1000:7.1f} ms  mean={statistics.mean(lat) * 1000:7.1f} ms  "
+                  f"throughput={n / wall:6.1f} logins/s")
+    finally:
+        if live:
+            close_pool()
+        else:
+            pool.close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=64)
+    ap.add_argument("--live", action="store_true")
+    ap.add_argument("--rounds", type=int, default=None)
+    args = ap.parse_args()
+    run_bench(n=args.n, live=args.live, rounds=args.rounds)
@@ -2,84 +2,384 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+import argparse
+import itertools
+import json
+import platform
+import shutil
+import tempfile
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
 
-from db import DB
-from services.booking_service import create_booking
+from db import ConnectionPool, DB, close_pool, get_pool, query_stats
+from services.analytics_service import bookings_df, top_resources, utilization_by_day
+from services.booking_service import (
+    create_booking, decide_approval, list_bookings_for_period, list_pending_approvals
+)
+from services.common import refdata
+from services.interval_index import disable_index, enable_index
+
+# Стенд нагрузки: сценарии × уровни параллелизма, прогрев, перцентили,
+# гистограмма задержек, счётчики ok/конфликт/отказ/ошибка, JSON для сравнения
+# прогонов (--json, --compare). Backend: live (SQL Server из config), memory
+# (tests/memory_backend.py — без сервера) или sqlite (настоящие сервисы и SQL
+# на синтетической базе scripts/gen_synthetic.py во временном каталоге).
+#
+#   python -m tests.load_test_booking --backend memory --concurrency 1,4,16
+#   python -m tests.load_test_booking --backend sqlite --history 50000
+#   python -m tests.load_test_booking --backend live --json run.json --compare base.json
 
 LOAD_PREFIX = "[LOADTEST]"
+HISTOGRAM_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
 
-def _pick_room_ids(db, limit=5):
-    rows = db.fetchall("""
-        SELECT TOP (?) ResourceID
-        FROM dbo.Resources r
-        WHERE r.ResourceKind='R'
-        ORDER BY r.ResourceID
-    """, (limit,))
-    return [r.ResourceID for r in rows]
-
-def _worker(resource_id: int, user_id: int, start_at, end_at):
-    db = DB.connect()
-    try:
-        res = create_booking(db, resource_id, user_id, start_at, end_at,
-                             title=f"{LOAD_PREFIX} booking", notes="", participants=2)
-        return res.ok, res.message
-    finally:
-        db.close()
+@dataclass
+class BenchContext:
+    pool: ConnectionPool
+    room_ids: list[int]
+    restricted_room_ids: list[int]
+    requester_id: int          # без ролей FAC/ADM: брони в закрытых зонах уходят на согласование
+    approver_ids: list[int]    # FAC; create_booking раздаёт заявки по APPROVER_POLICY
+    base: datetime
+    pending: deque = field(default_factory=deque)
+    _counter: itertools.count = field(default_factory=itertools.count)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def next_i(self) -> int:
+        with self._lock:
+            return next(self._counter)
+
+@dataclass
+class Scenario:
+    name: str
+    op: Callable[[DB, BenchContext, int], str]           # -> ok | conflict | fail
+    setup: Optional[Callable[[BenchContext, int], None]] = None
+
+def _outcome(res) -> str:
+    if res.ok:
+        return "ok"
+    return "conflict" if res.message.startswith("Конфликт") else "fail"
+
+def _create_uncontended(db, ctx, i):
+    # у каждого запроса свой слот: ресурс по кругу, время сдвигается на 30 минут
+    rid = ctx.room_ids[i % len(ctx.room_ids)]
+    s = ctx.base + timedelta(minutes=30 * (i // len(ctx.room_ids)))
+    return _outcome(create_booking(db, rid, ctx.requester_id, s, s + timedelta(minutes=30),
+                                   f"{LOAD_PREFIX} free", "", 2))
+
+def _create_contended(db, ctx, i):
+    # каждый слот одной переговорной запрашивают дважды: примерно половина — конфликты
+    s = ctx.base + timedelta(days=60, minutes=30 * (i // 2))
+    return _outcome(create_booking(db, ctx.room_ids[0], ctx.requester_id, s, s + timedelta(hours=1),
+                                   f"{LOAD_PREFIX} hot", "", 2))
+
+def _list_bookings(db, ctx, i):
+    now = datetime.now()
+    list_bookings_for_period(db, now, now + timedelta(days=7))
+    return "ok"
 
-def cleanup_loadtest_rows():
-    db = DB.connect()
+def _setup_approvals(ctx, n):
+    rooms = ctx.restricted_room_ids
+    if not rooms:
+        raise RuntimeError("Нет ресурсов в закрытых зонах для сценария approvals.")
+    created = set()
+    with ctx.pool.lease() as db:
+        for _ in range(n):
+            k = ctx.next_i()
+            s = ctx.base + timedelta(days=30, minutes=30 * (k // len(rooms)))
+            res = create_booking(db, rooms[k % len(rooms)], ctx.requester_id, s, s + timedelta(minutes=30),
+                                 f"{LOAD_PREFIX} approval", "", 1)
+            if res.ok and res.requires_approval:
+                created.add(res.booking_id)
+        for uid in ctx.approver_ids:
+            ctx.pending.extend(int(r.ApprovalID) for r in list_pending_approvals(db, uid)
+                               if int(r.BookingID) in created)
+
+def _decide(db, ctx, i):
     try:
-        db.execute("""
-          DELETE a
-          FROM dbo.BookingApprovals a
-          JOIN dbo.Bookings b ON b.BookingID=a.BookingID
-          WHERE b.Title LIKE ?
-        """, (f"{LOAD_PREFIX}%",))
-        db.execute("DELETE FROM dbo.Bookings WHERE Title LIKE ?", (f"{LOAD_PREFIX}%",))
-        db.commit()
-    finally:
-        db.close()
+        aid = ctx.pending.popleft()
+    except IndexError:
+        return "fail"
+    list_pending_approvals(db, ctx.approver_ids[i % len(ctx.approver_ids)])   # как в UI: обновить список и решить
+    decide_approval(db, aid, approve=i % 2 == 0)
+    return "ok"
 
-def run_load(n=200, threads=10, user_id=1):
-    cleanup_loadtest_rows()
+def _analytics(db, ctx, i):
+    now = datetime.now()
+    df = bookings_df(db, now - timedelta(days=30), now)
+    utilization_by_day(df, now - timedelta(days=30), now)
+    top_resources(df, 10)
+    return "ok"
 
-    db = DB.connect()
-    room_ids = _pick_room_ids(db, limit=threads)
-    db.close()
+SCENARIOS = {s.name: s for s in (
+    Scenario("create_uncontended", _create_uncontended),
+    Scenario("create_contended", _create_contended),
+    Scenario("list_bookings", _list_bookings),
+    Scenario("approvals", _decide, _setup_approvals),
+    Scenario("analytics", _analytics),
+)}
 
-    t0 = time.perf_counter()
-    ok = 0
-    fail = 0
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
 
-    base = datetime.now() + timedelta(minutes=30)
+def histogram(values_ms: list[float]) -> dict[str, int]:
+    counts = {f"<={b}": 0 for b in HISTOGRAM_MS}
+    counts[f">{HISTOGRAM_MS[-1]}"] = 0
+    for v in values_ms:
+        for b in HISTOGRAM_MS:
+            if v <= b:
+                counts[f"<={b}"] += 1
+                break
+        else:
+            counts[f">{HISTOGRAM_MS[-1]}"] += 1
+    return counts
 
-    futures = []
-    with ThreadPoolExecutor(max_workers=threads) as ex:
-        for i in range(n):
-            rid = room_ids[i % len(room_ids)]
-            s = base + timedelta(minutes=2*i)
-            e = s + timedelta(minutes=30)
-            futures.append(ex.submit(_worker, rid, user_id, s, e))
+def run_scenario(ctx: BenchContext, sc: Scenario, concurrency: int, requests: int, warmup: int) -> dict:
+    if sc.setup is not None:
+        sc.setup(ctx, requests + warmup)
+    counts = {"ok": 0, "conflict": 0, "fail": 0, "error": 0}
+    latencies: list[float] = []
+    errors: list[str] = []
+    lock = threading.Lock()
 
-        for f in as_completed(futures):
-            success, _ = f.result()
-            if success:
-                ok += 1
-            else:
-                fail += 1
+    def one(measure: bool):
+        i = ctx.next_i()
+        t0 = time.perf_counter()
+        try:
+            with query_stats.operation(sc.name), ctx.pool.lease() as db:
+                outcome = sc.op(db, ctx, i)
+        except Exception as e:
+            outcome = "error"
+            with lock:
+                if len(errors) < 5:
+                    errors.append(f"{type(e).__name__}: {e}")
+        dt = (time.perf_counter() - t0) * 1000.0
+        if measure:
+            with lock:
+                counts[outcome] += 1
+                latencies.append(dt)
+
+    with ThreadPoolExecutor(concurrency) as ex:
+        list(ex.map(lambda _: one(False), range(warmup)))
+        t0 = time.perf_counter()
+        list(ex.map(lambda _: one(True), range(requests)))
+        wall = time.perf_counter() - t0
+
+    lat = sorted(latencies)
+    return {
+        "scenario": sc.name,
+        "concurrency": concurrency,
+        "requests": requests,
+        **counts,
+        "wall_s": round(wall, 4),
+        "throughput": round(requests / wall, 2) if wall > 0 else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(lat, 50), 3),
+            "p95": round(percentile(lat, 95), 3),
+            "p99": round(percentile(lat, 99), 3),
+            "max": round(lat[-1], 3) if lat else 0.0,
+            "mean": round(sum(lat) / len(lat), 3) if lat else 0.0,
+        },
+        "histogram_ms": histogram(lat),
+        "errors_sample": errors,
+    }
+
+# --- backends ---
+
+def _discover(pool: ConnectionPool, base: datetime) -> BenchContext:
+    # переговорные и пользователи из настоящей схемы (live, sqlite)
+    with pool.lease() as db:
+        rooms = db.fetchall("""
+            SELECT r.ResourceID, z.IsRestricted
+            FROM dbo.Resources r JOIN dbo.Zones z ON z.ZoneID = r.ZoneID
+            WHERE r.ResourceKind = 'R' ORDER BY r.ResourceID
+        """)
+        roles = db.fetchall("""
+            SELECT ur.UserID, r.RoleCode FROM dbo.UserRoles ur JOIN dbo.Roles r ON r.RoleID = ur.RoleID
+        """)
+        users = [int(r.UserID) for r in db.fetchall("SELECT UserID FROM dbo.UserAccounts ORDER BY UserID")]
+    privileged = {int(r.UserID) for r in roles if str(r.RoleCode) in ("FAC", "ADM")}
+    fac = sorted(int(r.UserID) for r in roles if str(r.RoleCode) == "FAC")
+    requester = next((u for u in users if u not in privileged), users[0])
+    return BenchContext(pool, [int(r.ResourceID) for r in rooms if not r.IsRestricted],
+                        [int(r.ResourceID) for r in rooms if r.IsRestricted],
+                        requester, fac or [0], base)
+
+class LiveBackend:
+    name = "live"
 
-    t1 = time.perf_counter()
-    total = t1 - t0
-    rps = n / total if total > 0 else 0
+    def open(self) -> BenchContext:
+        self.cleanup()
+        return _discover(get_pool(), datetime.now().replace(second=0, microsecond=0) + timedelta(days=400))
+
+    def cleanup(self) -> None:
+        db = DB.connect()
+        try:
+            db.execute("""
+              DELETE a FROM dbo.BookingApprovals a
+              JOIN dbo.Bookings b ON b.BookingID = a.BookingID
+              WHERE b.Title LIKE ?
+            """, (f"{LOAD_PREFIX}%",))
+            db.execute("DELETE FROM dbo.Bookings WHERE Title LIKE ?", (f"{LOAD_PREFIX}%",))
+            db.commit()
+        finally:
+            db.close()
+
+    def close(self) -> None:
+        close_pool()
+        self.cleanup()
+
+class MemoryBackend:
+    name = "memory"
+
+    def __init__(self, rtt_ms: float = 0.0, history: int = 20000):
+        self.rtt_ms = rtt_ms
+        self.history = history
+
+    def open(self) -> BenchContext:
+        from tests.memory_backend import MemoryDB, MemoryStore
+        store = MemoryStore(history=self.history, rtt_ms=self.rtt_ms)
+        self.pool = ConnectionPool(min_size=0, max_size=64, connect=lambda: MemoryDB(store))
+        return BenchContext(self.pool, store.open_room_ids, store.restricted_room_ids, 1, [2, 4],
+                            datetime.now().replace(second=0, microsecond=0) + timedelta(days=1))
+
+    def close(self) -> None:
+        self.pool.close()
+
+class SQLiteBackend:
+    name = "sqlite"
+
+    def __init__(self, history: int = 20000):
+        self.history = history
+
+    def open(self) -> BenchContext:
+        from scripts.gen_synthetic import create_database
+        self.tmp = Path(tempfile.mkdtemp(prefix="officebank-bench-"))
+        path = self.tmp / "bench.sqlite3"
+        create_database(path, bookings=self.history, rounds=4)
+        self.pool = ConnectionPool(min_size=0, max_size=64, connect=lambda: DB.connect_sqlite(str(path)))
+        return _discover(self.pool, datetime.now().replace(second=0, microsecond=0) + timedelta(days=30))
+
+    def close(self) -> None:
+        self.pool.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+BACKENDS = {"live": LiveBackend, "memory": MemoryBackend, "sqlite": SQLiteBackend}
+
+def compare(current: dict, baseline: dict) -> None:
+    base = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    print("\nСравнение с базовым прогоном (изменение, %):")
+    for r in current["results"]:
+        b = base.get((r["scenario"], r["concurrency"]))
+        if b is None:
+            continue
+        def delta(a, c):
+            return (c - a) / a * 100 if a else 0.0
+        print(f"{r['scenario']:20s} c={r['concurrency']:<3d} "
+              f"p50 {delta(b['latency_ms']['p50'], r['latency_ms']['p50']):+6.1f}  "
+              f"p95 {delta(b['latency_ms']['p95'], r['latency_ms']['p95']):+6.1f}  "
+              f"p99 {delta(b['latency_ms']['p99'], r['latency_ms']['p99']):+6.1f}  "
+              f"rps {delta(b['throughput'], r['throughput']):+6.1f}")
+
+def _print_sql_stats(snap: dict, top: int = 8) -> None:
+    print("\nRound trip'ы на операцию:")
+    for op in snap["operations"]:
+        print(f"  {op['name']:20s} mean={op['round_trips_mean']:5.2f} max={op['round_trips_max']:3d} "
+              f"({op['count']} операций)")
+    print(f"Самые затратные операторы (всего {len(snap['statements'])}):")
+    for st in snap["statements"][:top]:
+        print(f"  {st['total_ms']:9.1f} ms  n={st['count']:<6d} p95<={st['p95_ms']:<6g} "
+              f"rows={st['rows']:<8d} {st['sql'][:90]}")
+    for r in snap["retries"]:
+        print(f"  повторы транзакций {r['name']}: {r['retries']} (исчерпано {r['exhausted']})")
+
+def run_load(backend: str = "memory", scenarios=tuple(SCENARIOS), concurrency=(1, 4, 16),
+             requests: int = 200, warmup: int = 20, use_index: bool = True,
+             rtt_ms: float = 0.0, history: int = 20000,
+             json_path: Optional[Path] = None, compare_path: Optional[Path] = None,
+             sql_stats: bool = False) -> dict:
+    # sql_stats — db.query_stats по операторам и round trip'ы на сценарий
+    # (memory обходит db.DB, поэтому там пусто)
+    if backend == "memory":
+        be = MemoryBackend(rtt_ms, history)
+    elif backend == "sqlite":
+        be = SQLiteBackend(history)
+    else:
+        be = BACKENDS[backend]()
+    ctx = be.open()
+    results = []
+    if sql_stats:
+        query_stats.reset()
+        query_stats.enable()
+    try:
+        with ctx.pool.lease() as db:
+            refdata.refresh(db)
+            if use_index:
+                enable_index(db)
+            else:
+                disable_index()
+        print(f"{'scenario':20s} {'conc':>4s} {'ok':>5s} {'confl':>5s} {'fail':>5s} {'err':>4s} "
+              f"{'rps':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s} ms")
+        for name in scenarios:
+            for c in concurrency:
+                r = run_scenario(ctx, SCENARIOS[name], c, requests, warmup)
+                results.append(r)
+                lat = r["latency_ms"]
+                print(f"{name:20s} {c:4d} {r['ok']:5d} {r['conflict']:5d} {r['fail']:5d} {r['error']:4d} "
+                      f"{r['throughput']:8.1f} {lat['p50']:8.2f} {lat['p95']:8.2f} {lat['p99']:8.2f}")
+                for e in r["errors_sample"]:
+                    print(f"    ! {e}")
+        st = ctx.pool.stats
+        print(f"Pool: hits={st.hits}, misses={st.misses}, waits={st.waits}, max wait={st.wait_time_max:.3f}s")
+        if sql_stats:
+            _print_sql_stats(query_stats.snapshot())
+    finally:
+        query_stats.disable()
+        disable_index()
+        be.close()
 
-    print(f"Requests: {n}, Threads: {threads}")
-    print(f"OK: {ok}, FAIL: {fail}")
-    print(f"Total time: {total:.2f}s, Throughput: {rps:.2f} req/s")
+    report = {
+        "meta": {
+            "backend": backend, "started": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "host": platform.node(),
+            "requests": requests, "warmup": warmup, "index": use_index, "rtt_ms": rtt_ms,
+            "history": history if backend in ("memory", "sqlite") else None,
+        },
+        "results": results,
+    }
+    if sql_stats:
+        report["sql"] = query_stats.snapshot()
+    if json_path:
+        json_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    if compare_path:
+        compare(report, json.loads(compare_path.read_text(encoding="utf-8")))
+    return report
 
-    cleanup_loadtest_rows()
+def main():
+    ap = argparse.ArgumentParser(description="Нагрузочный стенд OfficeBankIS")
+    ap.add_argument("--backend", choices=sorted(BACKENDS), default="memory")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("--concurrency", default="1,4,16")
+    ap.add_argument("-n", "--requests", type=int, default=200)
+    ap.add_argument("--warmup", type=int, default=20)
+    ap.add_argument("--no-index", action="store_true")
+    ap.add_argument("--rtt-ms", type=float, default=0.0, help="задержка round trip для memory")
+    ap.add_argument("--history", type=int, default=20000, help="исторических броней в memory/sqlite")
+    ap.add_argument("--json", type=Path)
+    ap.add_argument("--compare", type=Path)
+    ap.add_argument("--sql-stats", action="store_true", help="статистика по операторам SQL (sqlite/live)")
+    a = ap.parse_args()
+    run_load(a.backend, [s for s in a.scenarios.split(",") if s], [int(c) for c in a.concurrency.split(",")],
+             a.requests, a.warmup, not a.no_index, a.rtt_ms, a.history, a.json, a.compare, a.sql_stats)
 
 if __name__ == "__main__":
-    run_load(n=200, threads=10, user_id=1)
+    main()
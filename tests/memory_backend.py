@@ -0,0 +1,310 @@
+import random
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Callable, Iterable
+
+from db import MSSQL
+from services import analytics_service, approvers, booking_service, common, interval_index
+
+# Подставной backend для стенда нагрузки: хранит таблицы в словарях и отвечает
+# только на запросы, которые выполняют сценарии tests/load_test_booking.py.
+# Запросы узнаются по константам из сервисов или по характерному фрагменту;
+# всё остальное — NotImplementedError, чтобы подмена не молчала.
+# Пишущие транзакции сериализуются одной блокировкой (грубее key-range lock
+# в SQL Server, но даёт ту же картину конфликтов). rtt_ms — задержка на каждый
+# round trip, чтобы цифры были ближе к сетевому серверу.
+
+BOOKING_STATUSES = {1: "PENDING", 2: "APPROVED", 3: "REJECTED", 4: "CANCELLED"}
+APPROVAL_STATUSES = {1: "PENDING", 2: "APPROVED", 3: "REJECTED"}
+ROLES = {1: "EMP", 2: "FAC", 3: "ADM"}
+_INACTIVE = {3, 4}
+
+@lru_cache(maxsize=None)
+def _row_type(fields: tuple[str, ...]):
+    return namedtuple("Row", fields)
+
+def _rows(fields: str, values: Iterable[tuple]) -> list:
+    cls = _row_type(tuple(fields.split()))
+    return [cls(*v) for v in values]
+
+def _one(fields: str, *values: Any):
+    return _rows(fields, [values])[0]
+
+class MemoryStore:
+    def __init__(self, rooms: int = 40, restricted_rooms: int = 5, history: int = 20000,
+                 history_days: int = 60, seed: int = 1, rtt_ms: float = 0.0):
+        self.rtt = rtt_ms / 1000.0
+        self.txn_lock = threading.Lock()      # одна пишущая транзакция за раз
+        self.data_lock = threading.Lock()     # короткие чтения/изменения словарей
+        self.zones = {1: ("Open space", 2, False), 2: ("Переговорные", 3, False), 3: ("Дирекция", 5, True)}
+        self.users = {1: ("emp", {"EMP"}), 2: ("fac", {"FAC"}), 3: ("adm", {"ADM"}), 4: ("fac2", {"FAC"})}
+        self.resources: dict[int, tuple[int, str, str]] = {}
+        for i in range(1, rooms + 1):
+            zone = 3 if i > rooms - restricted_rooms else (2 if i % 2 else 1)
+            self.resources[i] = (zone, "R", f"Room {i:03d}")
+        self.bookings: dict[int, dict] = {}
+        self.by_resource: dict[int, list[int]] = {r: [] for r in self.resources}
+        self.approvals: dict[int, dict] = {}
+        self._next_booking = 1
+        self._next_approval = 1
+
+        rng = random.Random(seed)
+        now = datetime.now().replace(second=0, microsecond=0)
+        rids = [r for r in self.resources if self.resources[r][0] != 3]
+        for _ in range(history):
+            s = now - timedelta(days=history_days) + timedelta(minutes=15 * rng.randrange(history_days * 96))
+            self._insert(rng.choice(rids), 1, s, s + timedelta(minutes=rng.choice((30, 60, 90, 120))),
+                         "seed", 2, s - timedelta(days=1))
+
+    @property
+    def restricted_room_ids(self) -> list[int]:
+        return [r for r, (z, _, _) in self.resources.items() if self.zones[z][2]]
+
+    @property
+    def open_room_ids(self) -> list[int]:
+        return [r for r, (z, _, _) in self.resources.items() if not self.zones[z][2]]
+
+    def _insert(self, rid, uid, s, e, title, status_id, created_at=None) -> int:
+        bid = self._next_booking
+        self._next_booking += 1
+        self.bookings[bid] = {"ResourceID": rid, "UserID": uid, "StartAt": s, "EndAt": e, "Title": title,
+                              "StatusID": status_id, "CreatedAt": created_at or datetime.utcnow(),
+                              "UpdatedAt": None}
+        self.by_resource.setdefault(rid, []).append(bid)
+        return bid
+
+    def _delete(self, bid: int) -> None:
+        b = self.bookings.pop(bid, None)
+        if b is not None:
+            self.by_resource[b["ResourceID"]].remove(bid)
+
+class MemoryDB:
+    def __init__(self, store: MemoryStore):
+        self.store = store
+        self.dialect = MSSQL   # отвечает так же, как SQL Server
+        self._undo: list[Callable[[], None]] = []
+        self._in_txn = False
+        self._routes = {
+            booking_service._CREATE_BOOKING_SQL: self._create_booking,
+            common._REFDATA_SQL: self._refdata,
+            analytics_service._BOOKINGS_SQL: self._analytics_rows,
+            interval_index._ACTIVE_SQL: self._active,
+        }
+
+    # --- интерфейс db.DB ---
+    def ping(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self.rollback()
+
+    def server_now(self) -> datetime:
+        return datetime.utcnow()
+
+    def fetchone(self, sql: str, params: Iterable[Any] = ()):
+        rows = self._run(sql, tuple(params))
+        return rows[0] if rows else None
+
+    def fetchall(self, sql: str, params: Iterable[Any] = ()) -> list:
+        return self._run(sql, tuple(params))
+
+    def iter_chunks(self, sql: str, params: Iterable[Any] = (), size: int = 1000):
+        rows = self._run(sql, tuple(params))
+        for i in range(0, len(rows), size):
+            yield rows[i:i + size]
+
+    def execute(self, sql: str, params: Iterable[Any] = ()) -> int:
+        return self._run(sql, tuple(params))
+
+    def executemany(self, sql: str, seq_of_params, fast: bool = False) -> None:
+        for p in seq_of_params:
+            self._run(sql, tuple(p))
+
+    def commit(self) -> None:
+        self._wait()
+        self._undo.clear()
+        self._end()
+
+    def rollback(self) -> None:
+        if self._undo:
+            with self.store.data_lock:
+                for fn in reversed(self._undo):
+                    fn()
+            self._undo.clear()
+        self._end()
+
+    # --- служебное ---
+    def _wait(self) -> None:
+        if self.store.rtt:
+            time.sleep(self.store.rtt)
+
+    def _begin(self) -> None:
+        if not self._in_txn:
+            self.store.txn_lock.acquire()
+            self._in_txn = True
+
+    def _end(self) -> None:
+        if self._in_txn:
+            self._in_txn = False
+            self.store.txn_lock.release()
+
+    def _run(self, sql: str, params: tuple):
+        self._wait()
+        handler = self._routes.get(sql)
+        if handler is not None:
+            return handler(params)
+        if sql.startswith(interval_index._ACTIVE_SQL):
+            return self._active(params)
+        if sql.startswith(booking_service._BOOKINGS_LIST_SQL):
+            return self._list_bookings(params)
+        text = " ".join(sql.split())
+        if text == "SELECT 1":
+            return [(1,)]
+        if "FROM sys.tables" in text:
+            return [_one("cnt", 4)]
+        if "SYSUTCDATETIME() AS now" in text:
+            return [_one("now", datetime.utcnow())]
+        if "FROM dbo.BookingApprovals a" in text and "aps.StatusCode='PENDING'" in text:
+            return self._pending_approvals(params)
+        if text.startswith("UPDATE dbo.BookingApprovals SET ApprovalStatusID=?"):
+            return self._set_approval(params)
+        if text.startswith("SELECT BookingID FROM dbo.BookingApprovals WHERE ApprovalID=?"):
+            a = self.store.approvals.get(params[0])
+            return [_one("BookingID", a["BookingID"])] if a else []
+        if text.startswith("UPDATE dbo.Bookings SET BookingStatusID=?"):
+            return self._set_booking_status(params)
+        if "FROM dbo.Resources r" in text and "rs.StatusCode" in text:
+            return self._resources()
+        raise NotImplementedError(f"MemoryDB: запрос не поддерживается: {text[:80]}")
+
+    def _refdata(self, params):
+        out = [("BookingStatuses", i, c) for i, c in BOOKING_STATUSES.items()]
+        out += [("ApprovalStatuses", i, c) for i, c in APPROVAL_STATUSES.items()]
+        out += [("ResourceStatuses", 1, "ACTIVE"), ("AuditActionTypes", 1, "LOGIN")]
+        out += [("Roles", i, c) for i, c in ROLES.items()]
+        return _rows("TableName id code", out)
+
+    def _snapshot(self) -> list[tuple[int, dict]]:
+        with self.store.data_lock:
+            return list(self.store.bookings.items())
+
+    def _create_booking(self, p):
+        rid, uid, s, e, title, notes, participants, policy = p
+        st = self.store
+        self._begin()
+        res = st.resources.get(rid)
+        restricted = None if res is None else st.zones[res[0]][2]
+        conflict = None
+        with st.data_lock:
+            candidates = [(bid, st.bookings[bid]) for bid in st.by_resource.get(rid, ())]
+        for bid, b in candidates:
+            if (b["StatusID"] not in _INACTIVE
+                    and b["StartAt"] < e and b["EndAt"] > s
+                    and (conflict is None or b["StartAt"] < conflict[1]["StartAt"])):
+                conflict = (bid, b)
+        roles = st.users.get(uid, ("", set()))[1]
+        requires = bool(restricted) and not (roles & {"FAC", "ADM"})
+        approver = None
+        if requires:
+            with st.data_lock:
+                load = {u: 0 for u, (_, r) in st.users.items() if "FAC" in r}
+                for a in st.approvals.values():
+                    if a["StatusID"] == 1 and a["ApproverUserID"] in load:
+                        load[a["ApproverUserID"]] += 1
+            approver = next(iter(approvers.assign(load, 1, policy)), None)
+
+        booking_id = None
+        if restricted is None:
+            outcome = "NO_RESOURCE"
+        elif conflict is not None:
+            outcome = "CONFLICT"
+        elif requires and approver is None:
+            outcome = "NO_APPROVER"
+        else:
+            with st.data_lock:
+                booking_id = st._insert(rid, uid, s, e, title, 1 if requires else 2)
+                self._undo.append(lambda: st._delete(booking_id))
+                if requires:
+                    aid = st._next_approval
+                    st._next_approval += 1
+                    st.approvals[aid] = {"BookingID": booking_id, "ApproverUserID": approver, "StatusID": 1}
+                    self._undo.append(lambda: st.approvals.pop(aid, None))
+            outcome = "OK"
+        c_id, c = conflict if conflict else (None, None)
+        return [_one("Outcome BookingID RequiresApproval ConflictBookingID ConflictStartAt ConflictEndAt",
+                     outcome, booking_id, requires, c_id,
+                     c["StartAt"] if c else None, c["EndAt"] if c else None)]
+
+    def _list_bookings(self, params):
+        end_at, start_at = params[0], params[1]
+        st = self.store
+        out = []
+        for bid, b in self._snapshot():
+            if b["StartAt"] < end_at and b["EndAt"] > start_at:
+                out.append((bid, st.resources[b["ResourceID"]][2], "R", b["StartAt"], b["EndAt"],
+                            BOOKING_STATUSES[b["StatusID"]], st.users[b["UserID"]][0]))
+        out.sort(key=lambda r: r[3])
+        return _rows("BookingID DisplayName ResourceKind StartAt EndAt StatusCode RequestedBy", out)
+
+    def _analytics_rows(self, params):
+        end_at, start_at = params
+        st = self.store
+        out = []
+        for bid, b in self._snapshot():
+            if b["StartAt"] < end_at and b["EndAt"] > start_at and b["StatusID"] in (1, 2):
+                zone, kind, name = st.resources[b["ResourceID"]]
+                out.append((bid, b["ResourceID"], name, kind, st.zones[zone][0], st.zones[zone][1],
+                            b["StartAt"], b["EndAt"], BOOKING_STATUSES[b["StatusID"]]))
+        return _rows("BookingID ResourceID DisplayName ResourceKind ZoneName FloorNo StartAt EndAt StatusCode", out)
+
+    def _active(self, params):
+        horizon = params[0]
+        only = params[1] if len(params) > 1 else None
+        out = [(bid, b["ResourceID"], b["StartAt"], b["EndAt"]) for bid, b in self._snapshot()
+               if b["StatusID"] not in _INACTIVE and b["EndAt"] > horizon
+               and (only is None or b["ResourceID"] == only)]
+        return _rows("BookingID ResourceID StartAt EndAt", out)
+
+    def _pending_approvals(self, params):
+        st = self.store
+        with st.data_lock:
+            items = list(st.approvals.items())
+        out = []
+        for aid, a in items:
+            b = st.bookings.get(a["BookingID"])
+            if a["ApproverUserID"] == params[0] and a["StatusID"] == 1 and b is not None:
+                out.append((aid, a["BookingID"], st.resources[b["ResourceID"]][2], b["StartAt"], b["EndAt"],
+                            st.users[b["UserID"]][0], "PENDING"))
+        out.sort(key=lambda r: r[3])
+        return _rows("ApprovalID BookingID DisplayName StartAt EndAt RequestedBy ApprovalStatus", out)
+
+    def _set_approval(self, params):
+        status_id, aid = params
+        self._begin()
+        a = self.store.approvals.get(aid)
+        if a is None:
+            return 0
+        old = a["StatusID"]
+        a["StatusID"] = status_id
+        self._undo.append(lambda: a.__setitem__("StatusID", old))
+        return 1
+
+    def _set_booking_status(self, params):
+        status_id, bid = params
+        self._begin()
+        b = self.store.bookings.get(bid)
+        if b is None:
+            return 0
+        old = b["StatusID"], b["UpdatedAt"]
+        b["StatusID"], b["UpdatedAt"] = status_id, datetime.utcnow()
+        self._undo.append(lambda: b.update(StatusID=old[0], UpdatedAt=old[1]))
+        return 1
+
+    def _resources(self):
+        st = self.store
+        out = [(rid, kind, name, st.zones[z][0], st.zones[z][1], "ACTIVE", 8, None)
+               for rid, (z, kind, name) in st.resources.items()]
+        return _rows("ResourceID ResourceKind DisplayName ZoneName FloorNo StatusCode Capacity IsHotDesk", out)
@@ -1,9 +1,47 @@
+import sqlite3
+import tempfile
+from collections import namedtuple
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from unittest.mock import MagicMock
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+import pandas as pd
 
-from security import hash_password, verify_password
-from services.booking_service import has_conflict, create_booking
+import config
+from db import (
+    DB, MSSQL, SQLITE, ConnectionPool, PoolTimeout, init_db_check, normalize_sql, query_stats, retry_delay,
+    serve_metrics, transactional,
+)
+from scripts.set_passwords import bulk_set_passwords, iter_csv
+from security import hash_password, hash_rounds, needs_rehash, verify_password
+from services.approvers import approver_load, assign
+from services.audit import AuditWriter, close_audit, enable_audit
+from services.auth_service import login, login_pooled
+from services.notifications import (
+    NotificationEvent, close_notifications, enable_notifications, fan_out, list_notifications, mark_read,
+    unread, unread_count,
+)
+from services.availability_service import find_available_resources, free_gaps
+from services.booking_service import (
+    BookingRequest, cancel_booking, changes_since, create_booking, create_bookings_batch, decide_approval, decide_approvals,
+    list_bookings_page, list_pending_approvals,
+)
+from services.analytics_service import bookings_df, iter_bookings_df, utilization_by_day
+from services.analytics_cache import AnalyticsCache, months_between
+from services.analytics_rollups import (
+    _day_runs, daily_resource_minutes, get_watermark, refresh_rollups, utilization_from_rollups
+)
+from services.common import RefDataCache, get_id_by_code, refdata
+from services.interval_index import IntervalIndex
+from services.recurrence import expand_recurrence, parse_rrule
+from services.occupancy_cube import build_cube, resources_frame
+from services.resource_service import ResourceItem
+from ui.paged_tree import PagedTree, plan_diff
+from ui.task_runner import TaskRunner
 
 class TestSecurity(unittest.TestCase):
     def test_password_hash(self):
@@ -12,44 +50,83 @@ class TestSecurity(unittest.TestCase):
         self.assertTrue(verify_password(pwd, h))
         self.assertFalse(verify_password("Wrong!", h))
 
-class TestBookingLogic(unittest.TestCase):
-    def test_conflict_detection(self):
+class TestLogin(unittest.TestCase):
+    def _db(self, hashed, roles=("EMP", "FAC")):
         db = MagicMock()
+        db.fetchall.return_value = [MagicMock(UserID=5, EmployeeID=6, Login="ivanov", PasswordHash=hashed,
+                                              FullName="Иванов", RoleCode=r) for r in roles]
+        return db
 
-        db.fetchall.return_value = [MagicMock(BookingID=123)]
-        self.assertTrue(
-            has_conflict(
-                db,
-                resource_id=1,
-                start_at=datetime(2025, 1, 1, 10, 0),
-                end_at=datetime(2025, 1, 1, 11, 0),
-            )
-        )
+    def test_user_and_roles_in_one_query(self):
+        db = self._db(hash_password("pw", rounds=config.BCRYPT_ROUNDS))
+        user = login(db, "ivanov", "pw")
+        self.assertEqual(user.roles, {"EMP", "FAC"})
+        self.assertEqual(db.fetchall.call_count, 1)
+        db.execute.assert_not_called()
+        self.assertIsNone(login(db, "ivanov", "wrong"))
 
-        db.fetchall.return_value = []
-        self.assertFalse(
-            has_conflict(
-                db,
-                resource_id=1,
-                start_at=datetime(2025, 1, 1, 10, 0),
-                end_at=datetime(2025, 1, 1, 11, 0),
-            )
-        )
+    def test_rehash_when_cost_changes(self):
+        old = hash_password("pw", rounds=4)
+        self.assertEqual(hash_rounds(old), 4)
+        self.assertTrue(needs_rehash(old))
+        for pooled in (True, False):   # оба пути: перехэширование и журнал одинаковы
+            db = self._db(old)
+            pool = ConnectionPool(min_size=0, max_size=1, connect=lambda: db)
+            with patch("services.auth_service.audit") as audit_call:
+                user = login_pooled(pool, "ivanov", "pw") if pooled else login(db, "ivanov", "pw")
+            self.assertIsNotNone(user)
+            audit_call.assert_called_once_with(5, "LOGIN", "UserAccounts", 5)
+            new_hash, user_id, prev = db.execute.call_args[0][1]
+            self.assertEqual((user_id, prev), (5, old))
+            self.assertFalse(needs_rehash(new_hash))
+            self.assertTrue(verify_password("pw", new_hash))
+            db.commit.assert_called()
 
-        db.fetchall.assert_called()
+class TestBulkPasswords(unittest.TestCase):
+    def test_batches_and_resume(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "users.csv"
+            path.write_text("login,password\n" + "".join(f"u{i},p{i}\n" for i in range(5)) + ",\n",
+                            encoding="utf-8")
+            progress = Path(tmp) / "users.csv.progress"
+            db = MagicMock()
+            db.execute.return_value = 2
+            with ThreadPoolExecutor(2) as ex:
+                done, _ = bulk_set_passwords(db, iter_csv(path), ex, batch=2, rounds=4, progress=progress)
+            self.assertEqual(done, 5)
+            self.assertEqual(progress.read_text(), "5")
+            batches = db.executemany.call_args_list
+            self.assertEqual([len(c[0][1]) for c in batches], [2, 2, 1])
+            login, hashed = batches[0][0][1][0]
+            self.assertTrue(verify_password("p0", hashed))
+            self.assertEqual(list(iter_csv(path, skip=3)), [("u3", "p3"), ("u4", "p4")])
 
-    def test_conflict_none_rows(self):
+class TestBookingLogic(unittest.TestCase):
+    def test_conflict_detection(self):
+        # проверка конфликта — внутри пакета create_booking, ответ — Outcome
+        t0 = datetime(2025, 1, 1, 10, 0)
         db = MagicMock()
-        db.fetchall.return_value = None
-        self.assertFalse(
-            has_conflict(
-                db,
-                resource_id=1,
-                start_at=datetime(2025, 1, 1, 10, 0),
-                end_at=datetime(2025, 1, 1, 11, 0),
-            )
-        )
+        db.fetchone.return_value = MagicMock(Outcome="CONFLICT", ConflictBookingID=123,
+                                             ConflictStartAt=t0, ConflictEndAt=t0 + timedelta(hours=1))
+        res = create_booking(db, 1, 1, t0, t0 + timedelta(hours=1), "t", "", None)
+        self.assertFalse(res.ok)
+        self.assertEqual(res.conflict.booking_id, 123)
 
+        db.fetchone.return_value = MagicMock(Outcome="OK", BookingID=124, RequiresApproval=False)
+        res = create_booking(db, 1, 1, t0, t0 + timedelta(hours=1), "t", "", None)
+        self.assertTrue(res.ok)
+        self.assertIsNone(res.conflict)
+
+    def test_conflict_none_rows(self):
+        # пустой ответ драйвера — не успех и не конфликт
+        db = MagicMock()
+        db.fetchone.return_value = None
+        t0 = datetime(2025, 1, 1, 10, 0)
+        res = create_booking(db, 1, 1, t0, t0 + timedelta(hours=1), "t", "", None)
+        self.assertFalse(res.ok)
+        self.assertIsNone(res.conflict)
+        db.rollback.assert_called_once()
+        db.commit.assert_not_called()
 
     def test_create_booking_invalid_interval(self):
         db = MagicMock()
@@ -60,5 +137,982 @@ class TestBookingLogic(unittest.TestCase):
                              title="t", notes="", participants=2)
         self.assertFalse(res.ok)
 
+    def test_create_booking_single_round_trip(self):
+        db = MagicMock()
+        db.fetchone.return_value = MagicMock(Outcome="OK", BookingID=42, RequiresApproval=True)
+        t0 = datetime(2025, 1, 1, 10, 0)
+        res = create_booking(db, 1, 1, t0, t0 + timedelta(hours=1), "t", "", None)
+        self.assertTrue(res.ok)
+        self.assertEqual((res.booking_id, res.requires_approval), (42, True))
+        self.assertEqual(db.fetchone.call_count, 1)
+        db.fetchall.assert_not_called()
+        db.execute.assert_not_called()
+        db.commit.assert_called_once()
+
+    def test_create_booking_conflict_details(self):
+        db = MagicMock()
+        t0 = datetime(2025, 1, 1, 10, 0)
+        db.fetchone.return_value = MagicMock(
+            Outcome="CONFLICT", BookingID=None, ConflictBookingID=7,
+            ConflictStartAt=t0, ConflictEndAt=t0 + timedelta(minutes=30))
+        res = create_booking(db, 1, 1, t0, t0 + timedelta(hours=1), "t", "", None)
+        self.assertFalse(res.ok)
+        self.assertEqual(res.conflict.booking_id, 7)
+        db.rollback.assert_called_once()
+        db.commit.assert_not_called()
+
+class TestBatchBooking(unittest.TestCase):
+    def _items(self, n=3):
+        t0 = datetime(2025, 1, 6, 10)
+        return [BookingRequest(1, t0 + timedelta(weeks=i), t0 + timedelta(weeks=i, hours=1), "s") for i in range(n)]
+
+    def test_weekly_series(self):
+        t0 = datetime(2025, 1, 6, 10)   # понедельник
+        spans = expand_recurrence(t0, t0 + timedelta(minutes=15), **parse_rrule("FREQ=WEEKLY;COUNT=13"))
+        self.assertEqual(len(spans), 13)
+        self.assertEqual(spans[-1][0], t0 + timedelta(weeks=12))
+        spans = expand_recurrence(t0, t0 + timedelta(minutes=15), by_weekday=[0, 2],
+                                  until=datetime(2025, 1, 15).date(), exclude=[datetime(2025, 1, 8).date()])
+        self.assertEqual([s.day for s, _ in spans], [6, 13, 15])
+        with self.assertRaises(ValueError):
+            parse_rrule("FREQ=WEEKLY;BYMONTH=1")
+        # понедельник не входит в BYDAY: первое вхождение — ближайшая среда
+        spans = expand_recurrence(t0, t0 + timedelta(minutes=15), **parse_rrule("FREQ=WEEKLY;COUNT=2;BYDAY=WE,FR"))
+        self.assertEqual([s for s, _ in spans], [datetime(2025, 1, 8, 10), datetime(2025, 1, 10, 10)])
+        self.assertEqual(len(expand_recurrence(t0, t0 + timedelta(hours=1), "DAILY", count=366)), 366)
+        for rule in ("FREQ=DAILY;COUNT=367", "FREQ=DAILY;UNTIL=20260201"):   # не обрезается молча
+            with self.assertRaises(ValueError):
+                expand_recurrence(t0, t0 + timedelta(hours=1), **parse_rrule(rule))
+
+    def test_daily_byday_filters_days(self):
+        t0 = datetime(2026, 1, 1, 9)   # четверг
+        spans = expand_recurrence(t0, t0 + timedelta(hours=1), **parse_rrule("FREQ=DAILY;BYDAY=MO;COUNT=3"))
+        self.assertEqual([s for s, _ in spans],
+                         [datetime(2026, 1, 5, 9), datetime(2026, 1, 12, 9), datetime(2026, 1, 19, 9)])
+        spans = expand_recurrence(t0, t0 + timedelta(hours=1), **parse_rrule("FREQ=DAILY;BYDAY=MO,FR;UNTIL=20260112"))
+        self.assertEqual([s.day for s, _ in spans], [2, 5, 9, 12])
+        with self.assertRaises(ValueError):   # каждые 7 дней от четверга понедельник не наступит
+            expand_recurrence(t0, t0 + timedelta(hours=1), **parse_rrule("FREQ=DAILY;INTERVAL=7;BYDAY=MO;COUNT=2"))
+
+    def test_self_overlap_rejects_without_db(self):
+        db = MagicMock()
+        items = self._items(2) + [self._items(1)[0]]
+        res = create_bookings_batch(db, 1, items)
+        self.assertFalse(res.ok)
+        self.assertIn("Пересекается", res.results[2].message)
+        db.fetchall.assert_not_called()
+
+    def test_all_or_nothing_rolls_back(self):
+        db = MagicMock()
+        t0 = datetime(2025, 1, 6, 10)
+        db.fetchall.return_value = [
+            MagicMock(ItemNo=0, Outcome="OK", BookingID=None, RequiresApproval=False),
+            MagicMock(ItemNo=1, Outcome="CONFLICT", BookingID=None, ConflictBookingID=9,
+                      ConflictStartAt=t0, ConflictEndAt=t0),
+            MagicMock(ItemNo=2, Outcome="OK", BookingID=None, RequiresApproval=False),
+        ]
+        res = create_bookings_batch(db, 1, self._items())
+        self.assertFalse(res.ok)
+        self.assertEqual(res.results[1].conflict.booking_id, 9)
+        self.assertEqual(db.fetchall.call_count, 1)
+        db.executemany.assert_called_once()
+        db.rollback.assert_called_once()
+        db.commit.assert_not_called()
+
+    def test_best_effort_commits_rest(self):
+        db = MagicMock()
+        db.fetchall.return_value = [
+            MagicMock(ItemNo=0, Outcome="OK", BookingID=10, RequiresApproval=False),
+            MagicMock(ItemNo=1, Outcome="NO_APPROVER", BookingID=None, RequiresApproval=True),
+            MagicMock(ItemNo=2, Outcome="OK", BookingID=11, RequiresApproval=True),
+        ]
+        res = create_bookings_batch(db, 1, self._items(), all_or_nothing=False)
+        self.assertTrue(res.ok)
+        self.assertEqual(res.booking_ids, [10, 11])
+        self.assertTrue(res.results[2].requires_approval)
+        db.commit.assert_called_once()
+
+class TestIntervalIndex(unittest.TestCase):
+    def _index(self):
+        db = MagicMock()
+        t = datetime(2025, 1, 1)
+        db.fetchall.return_value = [
+            MagicMock(BookingID=1, ResourceID=7, StartAt=t.replace(hour=10), EndAt=t.replace(hour=11)),
+            MagicMock(BookingID=2, ResourceID=7, StartAt=t.replace(hour=13), EndAt=t.replace(hour=14)),
+        ]
+        index = IntervalIndex(lookback=timedelta(hours=1), max_age=60)
+        index.load(db, now=t.replace(hour=8))
+        return index, t
+
+    def test_free_and_busy(self):
+        index, t = self._index()
+        self.assertFalse(index.is_free(7, t.replace(hour=10, minute=30), t.replace(hour=12)))
+        self.assertTrue(index.is_free(7, t.replace(hour=11), t.replace(hour=13)))   # касание — не конфликт
+        self.assertTrue(index.is_free(8, t.replace(hour=10), t.replace(hour=11)))
+        self.assertIsNone(index.is_free(7, t.replace(hour=5), t.replace(hour=6)))   # до горизонта
+
+    def test_add_remove(self):
+        index, t = self._index()
+        index.add(3, 7, t.replace(hour=11), t.replace(hour=13))
+        self.assertFalse(index.is_free(7, t.replace(hour=12), t.replace(hour=12, minute=30)))
+        index.remove(3)
+        index.remove(1)
+        self.assertTrue(index.is_free(7, t.replace(hour=10), t.replace(hour=13)))
+        self.assertEqual(len(index), 1)
+
+    def test_stale_busy_is_unknown(self):
+        index, t = self._index()
+        self.assertFalse(index.is_free(7, t.replace(hour=10), t.replace(hour=11)))   # только что загружен
+        index.synced_at -= 61
+        self.assertIsNone(index.is_free(7, t.replace(hour=10), t.replace(hour=11)))
+        index.apply_changes([])          # лента изменений снова делает ответ свежим
+        self.assertFalse(index.is_free(7, t.replace(hour=10), t.replace(hour=11)))
+
+    def test_apply_changes(self):
+        index, t = self._index()
+        index.synced_at = 0.0
+        index.apply_changes([
+            SimpleNamespace(BookingID=1, ResourceID=7, StartAt=t.replace(hour=10), EndAt=t.replace(hour=11),
+                            StatusCode="CANCELLED"),
+            SimpleNamespace(BookingID=5, ResourceID=8, StartAt=t.replace(hour=9), EndAt=t.replace(hour=10),
+                            StatusCode="PENDING"),
+        ])
+        self.assertTrue(index.is_free(7, t.replace(hour=10), t.replace(hour=11)))
+        self.assertFalse(index.is_free(8, t.replace(hour=9), t.replace(hour=9, minute=30)))
+        self.assertGreater(index.synced_at, 0)
+
+class TestRefData(unittest.TestCase):
+    def tearDown(self):
+        refdata.invalidate()
+
+    def test_preload_and_lookups(self):
+        db = MagicMock()
+        db.fetchall.return_value = [
+            MagicMock(TableName="BookingStatuses", id=1, code="APPROVED"),
+            MagicMock(TableName="BookingStatuses", id=3, code="CANCELLED"),
+            MagicMock(TableName="Roles", id=1, code="FAC"),
+        ]
+        cache = RefDataCache()
+        cache.refresh(db)
+        self.assertEqual(cache.id_for("BookingStatuses", "CANCELLED"), 3)
+        self.assertEqual(cache.code_for("Roles", 1), "FAC")
+        self.assertIsNone(cache.id_for("Roles", "ADM"))
+        self.assertEqual(cache.stats()["misses"], 1)
+        cache.invalidate()
+        self.assertIsNone(cache.id_for("BookingStatuses", "APPROVED"))
+
+    def test_get_id_by_code_hits_server_once(self):
+        db = MagicMock()
+        db.fetchone.return_value = MagicMock(id=5)
+        for _ in range(3):
+            self.assertEqual(get_id_by_code(db, "BookingStatuses", "StatusCode", "BookingStatusID", "PENDING"), 5)
+        self.assertEqual(db.fetchone.call_count, 1)
+
+class TestUtilizationByDay(unittest.TestCase):
+    def test_matches_loop_implementation(self):
+        from tests.bench_analytics import synthetic_bookings, utilization_by_day_loop
+        start = datetime(2025, 3, 1, 12, 30)
+        end = start + timedelta(days=20, hours=3)
+        df = synthetic_bookings(500, start, 20, seed=7)
+        df.loc[0, ["StartAt", "EndAt"]] = [pd.Timestamp("2025-03-02 17:59:31"), pd.Timestamp("2025-03-03 00:00")]
+        pd.testing.assert_frame_equal(utilization_by_day(df, start, end),
+                                      utilization_by_day_loop(df, start, end))
+
+    def test_values(self):
+        df = pd.DataFrame({
+            "StartAt": pd.to_datetime(["2025-01-01 08:00", "2025-01-01 17:00"]),
+            "EndAt": pd.to_datetime(["2025-01-01 10:00", "2025-01-02 09:30"]),
+        })
+        util = utilization_by_day(df, datetime(2025, 1, 1), datetime(2025, 1, 2, 23, 0))
+        self.assertEqual(util["Date"].tolist(), ["2025-01-01", "2025-01-02"])
+        self.assertEqual(util["BookedMinutes"].tolist(), [120, 30])
+        self.assertEqual(util["UtilizationPct"].tolist(), [22.22, 5.56])
+
+class TestBookingsLoader(unittest.TestCase):
+    def _db(self):
+        t = datetime(2025, 1, 1, 9)
+        rows = [(i, i % 3 + 1, f"R{i % 3}", "R", "Z1", None if i % 3 == 2 else 1,
+                 t + timedelta(hours=i), t + timedelta(hours=i, minutes=30), "APPROVED")
+                for i in range(7)]
+        db = MagicMock()
+        db.iter_chunks.side_effect = lambda sql, params, size: iter(
+            [rows[i:i + size] for i in range(0, len(rows), size)])
+        return db
+
+    def test_typed_columns(self):
+        df = bookings_df(self._db(), datetime(2025, 1, 1), datetime(2025, 1, 2), chunk_size=2)
+        self.assertEqual(len(df), 7)
+        self.assertEqual(str(df["Resource"].dtype), "category")
+        self.assertEqual(str(df["Floor"].dtype), "Int64")
+        self.assertTrue(df["Floor"].isna().iloc[2])
+        self.assertEqual(df["StartAt"].iloc[3], pd.Timestamp("2025-01-01 12:00"))
+        self.assertEqual(df["Resource"].tolist()[:4], ["R0", "R1", "R2", "R0"])
+
+    def test_generator_mode(self):
+        chunks = list(iter_bookings_df(self._db(), datetime(2025, 1, 1), datetime(2025, 1, 2), chunk_size=3))
+        self.assertEqual([len(c) for c in chunks], [3, 3, 1])
+        self.assertEqual(chunks[0]["BookingID"].tolist(), [0, 1, 2])
+        self.assertEqual(chunks[2]["Resource"].tolist(), ["R0"])
+
+class TestAnalyticsCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_roundtrip_and_eviction(self):
+        db = TestBookingsLoader()._db()
+        df = bookings_df(db, datetime(2025, 1, 1), datetime(2025, 1, 2))
+        cache = AnalyticsCache(self.tmp.name, max_bytes=10 ** 9)
+        cache.write("2025-01", df, datetime(2025, 2, 1))
+        back = cache.read("2025-01")
+        pd.testing.assert_frame_equal(back, df, check_categorical=False)
+        self.assertEqual(cache.snapshot_at("2025-01"), datetime(2025, 2, 1))
+
+        cache.max_bytes = cache.size_bytes() + 1
+        time.sleep(0.01)
+        cache.write("2025-02", df, datetime(2025, 3, 1))
+        self.assertFalse(cache.has("2025-01"))
+        self.assertTrue(cache.has("2025-02"))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_closed_months_served_from_cache(self):
+        db = TestBookingsLoader()._db()
+        db.fetchall.return_value = []
+        db.server_now.return_value = datetime(2025, 3, 1)
+        cache = AnalyticsCache(self.tmp.name)
+        first = bookings_df(db, datetime(2025, 1, 1), datetime(2025, 1, 20), cache=cache)
+        calls = db.iter_chunks.call_count
+        second = bookings_df(db, datetime(2025, 1, 1), datetime(2025, 1, 20), cache=cache)
+        self.assertEqual(db.iter_chunks.call_count, calls)      # повторно на сервер не ходили
+        self.assertEqual(sorted(second["BookingID"]), sorted(first["BookingID"]))
+        self.assertEqual(months_between(datetime(2025, 1, 15), datetime(2025, 3, 1)), ["2025-01", "2025-02"])
+
+class TestDailyRollups(unittest.TestCase):
+    def test_rollups_reproduce_utilization(self):
+        from tests.bench_analytics import synthetic_bookings
+        start = datetime(2025, 3, 1)
+        end = datetime(2025, 3, 21, 23, 59)
+        df = synthetic_bookings(400, start, 20, seed=3)
+        df["ResourceID"] = df["Resource"].str[1:].astype(int)
+        roll = daily_resource_minutes(df, start.date(), 21)
+        self.assertTrue((roll["BookedMinutes"] <= roll["TotalMinutes"]).all())
+        pd.testing.assert_frame_equal(utilization_from_rollups(roll, start, end),
+                                      utilization_by_day(df, start, end))
+
+    def test_day_runs(self):
+        d = datetime(2025, 1, 1).date()
+        days = {d, d + timedelta(days=1), d + timedelta(days=2), d + timedelta(days=5)}
+        self.assertEqual(_day_runs(days), [(d, 3), (d + timedelta(days=5), 1)])
+        self.assertEqual(len(_day_runs(days, max_run=2)), 3)
+
+class TestOccupancyCube(unittest.TestCase):
+    def _cube(self):
+        res = resources_frame([
+            ResourceItem(1, "R", "A", "Z1", 1, "ACTIVE", 4, None),
+            ResourceItem(2, "D", "B", "Z1", 1, "ACTIVE", None, True),
+            ResourceItem(3, "D", "C", "Z2", 2, "ACTIVE", None, True),
+        ])
+        df = pd.DataFrame({
+            "BookingID": [1, 2], "ResourceID": [1, 3], "Resource": ["A", "C"],
+            "Kind": ["R", "D"], "Zone": ["Z1", "Z2"], "Floor": [1, 2],
+            "StartAt": pd.to_datetime(["2025-01-01 08:30", "2025-01-01 17:30"]),
+            "EndAt": pd.to_datetime(["2025-01-01 10:15", "2025-01-02 10:00"]),
+            "Status": "APPROVED",
+        })
+        return build_cube(df, datetime(2025, 1, 1), datetime(2025, 1, 3), res)
+
+    def test_rollup_normalizes_by_resources(self):
+        by_zone = self._cube().rollup(["Zone"]).set_index("Zone")
+        self.assertEqual(by_zone.loc["Z1", "Resources"], 2)
+        self.assertEqual(by_zone.loc["Z1", "BookedMinutes"], 75.0)       # 09:00–10:15, до 9 — нерабочее
+        self.assertEqual(by_zone.loc["Z1", "CapacityMinutes"], 2 * 2 * 9 * 60)
+        self.assertEqual(by_zone.loc["Z2", "BookedMinutes"], 90.0)
+
+    def test_slice_by_hour(self):
+        cube = self._cube()
+        h9 = cube.utilization(["Date"], Hour=9)
+        self.assertEqual(h9["BookedMinutes"].tolist(), [60.0, 60.0])
+        self.assertEqual(h9["UtilizationPct"].tolist(), [33.33, 33.33])
+        with self.assertRaises(ValueError):
+            cube.slice(Building="A")
+
+class TestConnectionPool(unittest.TestCase):
+    def _pool(self, **kw):
+        self.opened = []
+        def connect():
+            db = MagicMock()
+            db.ping.return_value = True
+            self.opened.append(db)
+            return db
+        return ConnectionPool(connect=connect, **kw)
+
+    def test_reuse_and_counters(self):
+        pool = self._pool(min_size=0, max_size=2, validate_after=60)
+        with pool.lease() as a:
+            with pool.lease() as nested:
+                self.assertIs(a, nested)
+        with pool.lease() as b:
+            self.assertIs(a, b)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual((pool.stats.hits, pool.stats.misses), (1, 1))
+        a.rollback.assert_called()
+
+    def test_timeout_when_exhausted(self):
+        pool = self._pool(min_size=0, max_size=1, timeout=0.05)
+        errors = []
+        def other():
+            try:
+                with pool.lease():
+                    pass
+            except PoolTimeout as e:
+                errors.append(e)
+        with pool.lease():
+            t = threading.Thread(target=other)
+            t.start(); t.join()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual((pool.stats.waits, pool.stats.timeouts), (1, 1))
+        self.assertGreaterEqual(pool.stats.wait_time_max, 0.04)   # худшее ожидание учтено
+
+    def test_broken_connection_replaced(self):
+        pool = self._pool(min_size=0, max_size=1, validate_after=0)
+        with pool.lease() as a:
+            pass
+        a.ping.return_value = False
+        with pool.lease() as b:
+            self.assertIsNot(a, b)
+        self.assertEqual(pool.stats.reconnects, 1)
+        a.close.assert_called()
+
+    def test_idle_eviction(self):
+        pool = self._pool(min_size=0, max_size=2, idle_timeout=0.01)
+        with pool.lease():
+            pass
+        locked = []   # закрывается вне блокировки пула
+        self.opened[0].close.side_effect = lambda: locked.append(pool._cond._is_owned())
+        time.sleep(0.03)
+        with pool.lease():
+            pass
+        self.assertEqual(pool.stats.idle_evicted, 1)
+        self.assertEqual(pool.size, 1)
+        self.assertEqual(locked, [False])
+
+class TestAvailability(unittest.TestCase):
+    def test_free_gaps_workday(self):
+        d = datetime(2025, 3, 3)
+        busy = [(d.replace(hour=10), d.replace(hour=11)),
+                (d.replace(hour=10, minute=30), d.replace(hour=12)),   # пересекается с предыдущей
+                (d.replace(hour=17, minute=30), d.replace(hour=20))]
+        gaps = free_gaps(busy, d, d + timedelta(days=2), timedelta(minutes=60))
+        self.assertEqual(gaps[:2], [(d.replace(hour=9), d.replace(hour=10)),
+                                    (d.replace(hour=12), d.replace(hour=17, minute=30))])
+        self.assertEqual(gaps[2], (datetime(2025, 3, 4, 9), datetime(2025, 3, 4, 18)))
+        self.assertEqual(len(free_gaps(busy, d, d + timedelta(days=2), timedelta(minutes=60), limit=1)), 1)
+
+    def test_available_query_filters(self):
+        db = MagicMock()
+        db.fetchall.return_value = [MagicMock(ResourceID=5, ResourceKind="R", DisplayName="A", ZoneName="Z",
+                                              FloorNo=2, IsRestricted=True, Capacity=8, IsHotDesk=None)]
+        s = datetime(2025, 1, 1, 10)
+        res = find_available_resources(db, s, s + timedelta(hours=1), kind="R", min_capacity=6,
+                                       equipment=["TV", "Маркерная доска"], user_id=3)
+        self.assertEqual(db.fetchall.call_count, 1)
+        sql, params = db.fetchall.call_args[0]
+        self.assertIn("NOT EXISTS", sql)
+        self.assertIn("dbo.ZoneAccess", sql)
+        self.assertEqual(params, (s + timedelta(hours=1), s, "R", 6, "TV", "Маркерная доска", 2, 3))
+        self.assertTrue(res[0].requires_approval)
+        self.assertEqual(res[0].capacity, 8)
+
+class TestLoadHarness(unittest.TestCase):
+    def tearDown(self):
+        refdata.invalidate()
+
+    def test_percentiles_and_histogram(self):
+        from tests.load_test_booking import histogram, percentile
+        self.assertEqual(percentile([1.0, 2.0, 3.0, 4.0, 5.0], 50), 3.0)
+        self.assertAlmostEqual(percentile([0.0, 10.0], 95), 9.5)
+        h = histogram([0.1, 3.0, 9999.0])
+        self.assertEqual((h["<=0.5"], h["<=5"], h[">5000"]), (1, 1, 1))
+
+    def test_memory_backend_runs_all_scenarios(self):
+        from tests import load_test_booking as lt
+        with patch("builtins.print"):
+            report = lt.run_load("memory", concurrency=(2,), requests=12, warmup=2, history=300)
+        by_name = {r["scenario"]: r for r in report["results"]}
+        self.assertEqual(set(by_name), set(lt.SCENARIOS))
+        self.assertTrue(all(r["error"] == 0 for r in report["results"]), report["results"])
+        self.assertEqual(by_name["create_uncontended"]["ok"], 12)
+        self.assertGreater(by_name["create_contended"]["conflict"], 0)
+        self.assertEqual(by_name["approvals"]["ok"], 12)
+
+class TestSQLiteBackend(unittest.TestCase):
+    def setUp(self):
+        from scripts.gen_synthetic import create_database
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "t.sqlite3"
+        create_database(self.path, rooms=6, restricted_rooms=2, desks=4, users=5, bookings=200, rounds=4)
+        self.db = DB.connect_sqlite(str(self.path))
+        self.start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=30)
+
+    def tearDown(self):
+        self.db.close()
+        refdata.invalidate()
+        self.tmp.cleanup()
+
+    def test_dialect_translation(self):
+        self.assertEqual(SQLITE.sql("SELECT 1 FROM dbo.Bookings b WITH (UPDLOCK, HOLDLOCK) "
+                                    "ORDER BY 1 OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"),
+                         "SELECT 1 FROM dbo.Bookings b ORDER BY 1 LIMIT ?, ?")
+        init_db_check(self.db)
+        self.assertIsInstance(self.db.server_now(), datetime)
+
+    def test_dates_converted_by_column(self):
+        ok = create_booking(self.db, 1, 1, self.start, self.start + timedelta(hours=1), "2025-01-01",
+                            "2025-01-01 10:00:00", None)
+        row = self.db.fetchone("SELECT Title, Notes, StartAt, CreatedAt FROM dbo.Bookings WHERE BookingID = ?",
+                               (ok.booking_id,))
+        self.assertEqual((row.Title, row.Notes), ("2025-01-01", "2025-01-01 10:00:00"))
+        self.assertEqual(row.StartAt, self.start)
+        self.assertIsInstance(row.CreatedAt, datetime)
+
+    def test_inactive_resources_not_offered(self):
+        end = self.start + timedelta(hours=1)
+        free = {r.resource_id for r in find_available_resources(self.db, self.start, end, kind="R")}
+        self.assertIn(1, free)
+        self.db.execute("UPDATE dbo.Resources SET ResourceStatusID = (SELECT ResourceStatusID FROM "
+                        "dbo.ResourceStatuses WHERE StatusCode = 'INACTIVE') WHERE ResourceID = 1")
+        self.db.commit()
+        free = {r.resource_id for r in find_available_resources(self.db, self.start, end, kind="R")}
+        self.assertNotIn(1, free)
+        self.assertTrue(free)
+
+    def test_booking_flow(self):
+        end = self.start + timedelta(hours=1)
+        ok = create_booking(self.db, 1, 1, self.start, end, "t", "", 2)
+        self.assertTrue(ok.ok)
+        clash = create_booking(self.db, 1, 1, self.start + timedelta(minutes=30), end, "t", "", 2)
+        self.assertEqual(clash.conflict.booking_id, ok.booking_id)
+        self.assertEqual(clash.conflict.start_at, self.start)
+        pending = create_booking(self.db, 6, 1, self.start, end, "t", "", 2)   # закрытая зона
+        self.assertTrue(pending.requires_approval)
+        self.assertIn(pending.booking_id, [int(a.BookingID) for a in list_pending_approvals(self.db, 2)])
+
+    def test_batch_all_or_nothing(self):
+        items = [BookingRequest(2, self.start + timedelta(days=d), self.start + timedelta(days=d, hours=1))
+                 for d in range(3)]
+        create_booking(self.db, 2, 1, items[1].start_at, items[1].end_at, "", "", None)
+        res = create_bookings_batch(self.db, 1, items)
+        self.assertFalse(res.ok)
+        self.assertEqual(sum(r.conflict is not None for r in res.results), 1)
+        n = self.db.fetchone("SELECT COUNT(*) AS cnt FROM dbo.Bookings WHERE StartAt >= ?", (self.start,)).cnt
+        self.assertEqual(n, 1)
+        self.assertEqual(len(create_bookings_batch(self.db, 1, items, all_or_nothing=False).booking_ids), 2)
+
+    def test_page_filter_and_login(self):
+        create_booking(self.db, 3, 1, self.start, self.start + timedelta(hours=1), "", "", None)
+        rows = list_bookings_page(self.db, self.start, self.start + timedelta(days=1), resource="003")
+        self.assertEqual([r.DisplayName for r in rows], ["Переговорная 003"])
+        self.assertEqual(list_bookings_page(self.db, self.start, self.start + timedelta(days=1), resource="0_3"), [])
+        self.assertEqual(login(self.db, "ivanov", "Iv@nov123").roles, {"EMP"})
+
+    def test_change_feed(self):
+        first = changes_since(self.db)
+        self.assertTrue(first.reset)
+        ok = create_booking(self.db, 1, 1, self.start, self.start + timedelta(hours=1), "", "", None)
+        feed = changes_since(self.db, first.token)
+        self.assertIn(ok.booking_id, [r.BookingID for r in feed.bookings])
+        feed = changes_since(self.db, feed.token)             # окно запаса не повторяется
+        self.assertNotIn(ok.booking_id, [r.BookingID for r in feed.bookings])
+        cancel_booking(self.db, ok.booking_id)
+        pending = create_booking(self.db, 6, 1, self.start, self.start + timedelta(hours=1), "", "", None)
+        feed = changes_since(self.db, feed.token)
+        self.assertEqual({r.BookingID: r.StatusCode for r in feed.bookings},
+                         {ok.booking_id: "CANCELLED", pending.booking_id: "PENDING"})
+        self.assertEqual([(r.BookingID, r.ApproverUserID) for r in feed.approvals], [(pending.booking_id, 2)])
+
+    def test_bulk_decide(self):
+        end = self.start + timedelta(hours=1)
+        a = create_booking(self.db, 6, 1, self.start, end, "", "", None).booking_id
+        b = create_booking(self.db, 5, 1, self.start, end, "", "", None).booking_id
+        c = create_booking(self.db, 6, 1, end, end + timedelta(hours=1), "", "", None).booking_id
+        self.db.execute("UPDATE dbo.Bookings SET StartAt = ?, EndAt = ? WHERE BookingID = ?", (self.start, end, c))
+        self.db.commit()   # c пересекается с a, как после гонки двух проверок
+        aid = {int(r.BookingID): int(r.ApprovalID) for r in list_pending_approvals(self.db, 2)}
+        res = decide_approvals(self.db, [aid[c], aid[a], aid[b], 10**9], True, 2)
+        self.assertEqual(sorted(res.decided), sorted([aid[a], aid[b]]))
+        self.assertEqual((res.conflicts, res.skipped), ([aid[c]], [10**9]))
+        res = decide_approvals(self.db, [aid[a], aid[c]], True)    # a уже решена, c пересекается с подтверждённой
+        self.assertEqual((res.decided, res.conflicts, res.skipped), ([], [aid[c]], [aid[a]]))
+        self.assertEqual(decide_approvals(self.db, [aid[c]], False).decided, [aid[c]])
+        status = {int(r.BookingID): r.StatusCode for r in self.db.fetchall(
+            "SELECT b.BookingID, s.StatusCode FROM dbo.Bookings b JOIN dbo.BookingStatuses s "
+            "ON s.BookingStatusID = b.BookingStatusID WHERE b.BookingID IN (?, ?, ?)", (a, b, c))}
+        self.assertEqual(status, {a: "APPROVED", b: "APPROVED", c: "REJECTED"})
+
+    def test_bulk_decide_lost_item_frees_slot(self):
+        # x подтверждена; a пересекается с x, b — только с a: a не проходит, b одобряется
+        h = timedelta(hours=1)
+        x, a, b = (create_booking(self.db, 6, 1, self.start + k * 3 * h, self.start + k * 3 * h + h,
+                                  "", "", None).booking_id for k in range(3))
+        for bid, s in ((a, self.start + h / 2), (b, self.start + h)):
+            self.db.execute("UPDATE dbo.Bookings SET StartAt = ?, EndAt = ? WHERE BookingID = ?", (s, s + h, bid))
+        self.db.commit()
+        aid = {int(r.BookingID): int(r.ApprovalID) for r in list_pending_approvals(self.db, 2)}
+        self.assertEqual(decide_approvals(self.db, [aid[x]], True).decided, [aid[x]])
+        res = decide_approvals(self.db, [aid[a], aid[b]], True)
+        self.assertEqual((res.decided, res.conflicts), ([aid[b]], [aid[a]]))
+
+    def test_approver_least_pending(self):
+        self.assertEqual(assign({2: 3, 4: 0}, 4, "least_pending"), [4, 4, 4, 2])
+        self.assertEqual(assign({2: 3, 4: 0}, 2, "first"), [2, 2])
+        # второй FAC без заявок, у первого остаются две открытые
+        self.db.execute("INSERT INTO dbo.UserRoles(UserID, RoleID) "
+                        "SELECT 4, RoleID FROM dbo.Roles WHERE RoleCode = 'FAC'")
+        self.db.execute("UPDATE dbo.BookingApprovals SET ApprovalStatusID = 3 WHERE ApprovalID NOT IN "
+                        "(SELECT ApprovalID FROM dbo.BookingApprovals ORDER BY ApprovalID LIMIT 2)")
+        self.db.commit()
+        self.assertEqual(approver_load(self.db), {2: 2, 4: 0})
+        with patch.object(config, "APPROVER_POLICY", "least_pending"):
+            create_booking(self.db, 6, 1, self.start, self.start + timedelta(hours=1), "", "", None)
+            create_bookings_batch(self.db, 1, [BookingRequest(5, self.start + timedelta(hours=h),
+                                                              self.start + timedelta(hours=h, minutes=30))
+                                               for h in range(4)])
+        self.assertEqual(approver_load(self.db), {2: 4, 4: 3})
+
+    def test_concurrent_rollup_refresh(self):
+        # два клиента пересчитывают одни и те же дни: по очереди, без нарушения PK
+        dbs = [DB.connect_sqlite(str(self.path)) for _ in range(2)]
+        try:
+            with ThreadPoolExecutor(2) as ex:
+                done = list(ex.map(refresh_rollups, dbs))
+            self.assertLess(min(done), max(done))   # второй ждал и пересчитал только изменения
+            self.assertIsNotNone(get_watermark(self.db))
+            cnt = self.db.fetchone("SELECT COUNT(*) AS cnt FROM dbo.AnalyticsDailyRollups").cnt
+            self.assertGreater(cnt, 0)
+        finally:
+            for db in dbs:
+                db.close()
+
+    def test_locked_write_retried(self):
+        # второе соединение держит запись, наше без ожидания получает «database is locked»
+        other = DB.connect_sqlite(str(self.path))
+        other.conn.execute("BEGIN IMMEDIATE")
+        busy = DB.connect_sqlite(str(self.path), timeout=0)
+        threading.Timer(0.2, other.rollback).start()
+        query_stats.reset()
+        try:
+            with patch.object(config, "DB_RETRY_ATTEMPTS", 50), patch.object(config, "DB_RETRY_MAX_MS", 50.0):
+                cancel_booking(busy, 1)
+            self.assertGreater(query_stats.snapshot()["retries"][0]["retries"], 0)
+            self.assertEqual(busy.fetchone("SELECT s.StatusCode FROM dbo.Bookings b JOIN dbo.BookingStatuses s "
+                                           "ON s.BookingStatusID = b.BookingStatusID WHERE b.BookingID = 1")
+                             .StatusCode, "CANCELLED")
+        finally:
+            busy.close()
+            other.close()
+            query_stats.reset()
+
+class _PyodbcError(Exception):
+    pass
+_PyodbcError.__module__ = "pyodbc"
+
+class TestTransactionRetry(unittest.TestCase):
+    def setUp(self):
+        self.db = MagicMock(dialect=SQLITE)
+        query_stats.reset()
+        patcher = patch.object(config, "DB_RETRY_BASE_MS", 1.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(query_stats.reset)
+
+    def test_classification(self):
+        self.assertTrue(SQLITE.retryable(sqlite3.OperationalError("database is locked")))
+        self.assertFalse(SQLITE.retryable(sqlite3.OperationalError("no such table: T")))
+        self.assertTrue(MSSQL.retryable(_PyodbcError("40001", "[40001] Transaction was deadlocked (1205)")))
+        self.assertTrue(MSSQL.retryable(_PyodbcError("HYT00", "[HYT00] Query timeout expired")))
+        self.assertTrue(MSSQL.retryable(_PyodbcError("HY000", "Lock request time out period exceeded. (1222)")))
+        self.assertFalse(MSSQL.retryable(_PyodbcError("23000", "Violation of UNIQUE KEY constraint (2627)")))
+        self.assertFalse(MSSQL.retryable(ValueError("40001")))
+        self.assertTrue(all(0 <= retry_delay(n, 50, 1000) <= min(1.0, 0.05 * 2 ** (n - 1)) for n in range(1, 8)))
+
+    def test_retries_then_succeeds(self):
+        calls = []
+
+        @transactional
+        def work(db, x):
+            calls.append(x)
+            if len(calls) < 3:
+                raise sqlite3.OperationalError("database is locked")
+            return x * 2
+
+        self.assertEqual(work(self.db, 21), 42)
+        self.assertEqual((len(calls), self.db.rollback.call_count), (3, 2))
+        self.assertEqual(query_stats.snapshot()["retries"], [{"name": "work", "retries": 2, "exhausted": 0}])
+        self.assertIn('officebank_tx_retries_total{operation="work"} 2', query_stats.prometheus_text())
+
+    def test_other_errors_rolled_back_not_retried(self):
+        @transactional
+        def work(db):
+            raise ValueError("bad")
+
+        with self.assertRaises(ValueError):
+            work(self.db)
+        self.assertEqual(self.db.rollback.call_count, 1)
+        self.assertEqual(query_stats.snapshot()["retries"], [])
+
+    def test_budget_exhausted_and_nested_not_retried(self):
+        calls = []
+
+        @transactional(attempts=3)
+        def inner(db):
+            calls.append(1)
+            raise sqlite3.OperationalError("database is locked")
+
+        @transactional(attempts=3)
+        def outer(db):
+            return inner(db)
+
+        with self.assertRaises(sqlite3.OperationalError):
+            outer(self.db)
+        self.assertEqual(len(calls), 3)     # повторяет только внешняя
+        self.assertEqual(query_stats.snapshot()["retries"], [{"name": "outer", "retries": 2, "exhausted": 1}])
+
+class TestAuditWriter(unittest.TestCase):
+    def setUp(self):
+        from scripts.gen_synthetic import create_database
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "t.sqlite3"
+        create_database(self.path, rooms=3, restricted_rooms=1, desks=0, users=3, bookings=10, rounds=4)
+        self.db = DB.connect_sqlite(str(self.path))
+
+    def tearDown(self):
+        close_audit()
+        self.db.close()
+        refdata.invalidate()
+        self.tmp.cleanup()
+
+    def test_services_write_in_background(self):
+        writer = enable_audit(lambda: DB.connect_sqlite(str(self.path)), flush_interval=0.01)
+        start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=30)
+        res = create_booking(self.db, 1, 1, start, start + timedelta(hours=1), "", "", None)
+        cancel_booking(self.db, res.booking_id, user_id=2)
+        cancel_booking(self.db, 1)                  # без пользователя — не пишется
+        close_audit()
+        rows = self.db.fetchall("SELECT a.UserID, t.ActionCode, a.EntityID FROM dbo.AuditLogs a "
+                                "JOIN dbo.AuditActionTypes t ON t.ActionTypeID = a.ActionTypeID ORDER BY a.AuditLogID")
+        self.assertEqual([tuple(r) for r in rows],
+                         [(1, "BOOKING_CREATE", res.booking_id), (2, "BOOKING_CANCEL", res.booking_id)])
+        self.assertEqual(writer.stats()["written"], 2)
+
+    def test_unknown_action_dropped(self):
+        # коды, которые пишут сервисы, есть в скрипте справочника для SQL Server
+        seed = (Path(__file__).resolve().parents[1] / "sql" / "audit_actions.sql").read_text(encoding="utf-8")
+        for code in ("LOGIN", "BOOKING_CREATE", "BOOKING_CANCEL", "APPROVAL_DECIDE"):
+            self.assertIn(f"N'{code}'", seed)
+        writer = enable_audit(lambda: DB.connect_sqlite(str(self.path)), flush_interval=0.01)
+        writer.log(1, "BOGUS", "UserAccounts", 1)
+        writer.log(1, "LOGIN", "UserAccounts", 1)
+        close_audit()
+        rows = self.db.fetchall("SELECT t.ActionCode FROM dbo.AuditLogs a "
+                                "JOIN dbo.AuditActionTypes t ON t.ActionTypeID = a.ActionTypeID")
+        self.assertEqual([r.ActionCode for r in rows], ["LOGIN"])
+        self.assertEqual({k: writer.stats()[k] for k in ("written", "failed")}, {"written": 1, "failed": 1})
+
+    def test_overflow_policies(self):
+        gate = threading.Event()
+
+        def slow_connect():
+            gate.wait(5)
+            return DB.connect_sqlite(str(self.path))
+
+        for overflow in ("drop", "block"):
+            gate.clear()
+            writer = AuditWriter(slow_connect, max_queue=2, flush_interval=0.01, overflow=overflow,
+                                 block_timeout=0.02)
+            self.assertEqual([writer.log(1, "LOGIN", "UserAccounts", 1) for _ in range(3)], [True, True, False])
+            gate.set()
+            self.assertTrue(writer.flush())
+            self.assertTrue(writer.log(1, "BOGUS", "UserAccounts", 1))   # неизвестный код — в failed
+            writer.close()
+            self.assertFalse(writer.log(1, "LOGIN", "UserAccounts", 1))
+            self.assertEqual({k: writer.stats()[k] for k in ("written", "dropped", "failed")},
+                             {"written": 2, "dropped": 2, "failed": 1})
+
+class TestNotifications(unittest.TestCase):
+    def setUp(self):
+        from scripts.gen_synthetic import create_database
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "t.sqlite3"
+        create_database(self.path, rooms=6, restricted_rooms=2, desks=0, users=4, bookings=0, rounds=4)
+        self.db = DB.connect_sqlite(str(self.path))
+        self.start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=30)
+        unread.invalidate()
+
+    def tearDown(self):
+        close_notifications()
+        unread.invalidate()
+        self.db.close()
+        refdata.invalidate()
+        self.tmp.cleanup()
+
+    def test_fan_out_coalesces_per_user(self):
+        Row = namedtuple("Row", "BookingID RequestedByUserID DisplayName StartAt ApproverUserID ApprovalStatus")
+        rows = [Row(1, 10, "R1", self.start, 20, "PENDING"), Row(2, 10, "R2", self.start, 20, "PENDING"),
+                Row(3, 11, "R3", self.start, 20, "APPROVED")]
+        events = [NotificationEvent("PENDING", 1, None), NotificationEvent("PENDING", 2, None),
+                  NotificationEvent("PENDING", 2, None), NotificationEvent("CANCELLED", 3, 11)]
+        out = {(u, b): m for u, b, m in fan_out(events, rows)}
+        self.assertEqual(set(out), {(10, None), (20, None)})   # сам отменивший и решённое согласование — без сообщений
+        self.assertTrue(out[(20, None)].startswith("Ждёт вашего согласования (2): R1, "))
+
+    def test_pipeline_and_unread_count(self):
+        dispatcher = enable_notifications(lambda: DB.connect_sqlite(str(self.path)), flush_interval=0.01,
+                                          linger=0.5)
+        for rid in (5, 6):                                   # закрытая зона — на согласование
+            self.assertTrue(create_booking(self.db, rid, 1, self.start, self.start + timedelta(hours=1),
+                                           "", "", None).requires_approval)
+        self.assertTrue(dispatcher.flush())
+        self.assertEqual((unread_count(self.db, 1), unread_count(self.db, 2)), (1, 1))
+        queries = unread.queries
+        approval = list_pending_approvals(self.db, 2)[0]
+        decide_approval(self.db, int(approval.ApprovalID), True, user_id=2)
+        self.assertTrue(dispatcher.flush())
+        self.assertEqual((unread_count(self.db, 1), unread_count(self.db, 2)), (2, 1))
+        self.assertEqual(unread.queries, queries)             # счётчик из памяти
+        rows = list_notifications(self.db, 1)
+        self.assertTrue(rows[0].Message.startswith("Бронь подтверждена: Переговорная"))
+        self.assertEqual(rows[0].BookingID, approval.BookingID)
+        self.assertEqual(mark_read(self.db, 1, [int(rows[0].NotificationID)]), 1)
+        self.assertEqual(unread_count(self.db, 1), 1)
+        unread.invalidate()
+        self.assertEqual(unread_count(self.db, 1), 1)
+
+class TestQueryStats(unittest.TestCase):
+    def setUp(self):
+        self.db = DB.connect_sqlite(":memory:")
+        self.db.execute("CREATE TABLE dbo.T (x INTEGER)")
+        self.db.executemany("INSERT INTO dbo.T VALUES (?)", [(i,) for i in range(10)])
+        query_stats.reset()
+
+    def tearDown(self):
+        query_stats.disable()
+        query_stats.reset()
+        self.db.close()
+
+    def test_disabled_records_nothing(self):
+        self.db.fetchall("SELECT x FROM dbo.T")
+        self.assertEqual(query_stats.snapshot()["statements"], [])
+
+    def test_statements_and_round_trips(self):
+        query_stats.enable(slow_ms=1e9)
+        with query_stats.operation("op"):
+            self.db.fetchall("SELECT x FROM dbo.T WHERE x IN (?, ?, ?)", (1, 2, 3))
+            self.db.fetchall("SELECT x\n  FROM dbo.T WHERE x IN (?,?)", (4, 5))
+            self.db.fetchone("SELECT x FROM dbo.T WHERE x = ?", (99,))
+            self.assertEqual(self.db.execute("UPDATE dbo.T SET x = x WHERE x < ?", (4,)), 4)
+        snap = query_stats.snapshot()
+        by_sql = {st["sql"]: st for st in snap["statements"]}
+        st = by_sql[normalize_sql("SELECT x FROM dbo.T WHERE x IN (?, ?, ?, ?)")]
+        self.assertEqual((st["count"], st["rows"]), (2, 5))
+        self.assertEqual(by_sql["SELECT x FROM dbo.T WHERE x = ?"]["rows"], 0)
+        self.assertEqual(snap["operations"], [{"name": "op", "count": 1, "round_trips": 4, "round_trips_mean": 4.0,
+                                               "round_trips_max": 4, "mean_ms": snap["operations"][0]["mean_ms"]}])
+        text = query_stats.prometheus_text()
+        self.assertIn('officebank_sql_duration_seconds_count{query="SELECT x FROM dbo.T WHERE x IN (?, ...)"} 2', text)
+        self.assertIn('officebank_operation_round_trips_sum{operation="op"} 4', text)
+
+    def test_slow_log_and_http_export(self):
+        from urllib.request import urlopen
+        query_stats.enable(slow_ms=0)
+        with self.assertLogs("officebank.sql", "WARNING"):
+            self.db.fetchall("SELECT x FROM dbo.T")
+        self.assertEqual(query_stats.slow[-1]["rows"], 10)
+        server = serve_metrics(0)
+        try:
+            with urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5) as r:
+                self.assertIn("officebank_sql_rows_total", r.read().decode("utf-8"))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+class TestCursorCache(unittest.TestCase):
+    def setUp(self):
+        self.db = DB.connect_sqlite(":memory:")
+        self.db.execute("CREATE TABLE dbo.T (x INTEGER)")
+        self.db.executemany("INSERT INTO dbo.T VALUES (?)", [(i,) for i in range(10)])
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_lru_reuse_and_eviction(self):
+        self.db.cursor_cache_size = 2
+        hits = self.db.cursor_hits
+        for i in range(3):
+            self.assertEqual(self.db.fetchone("SELECT x FROM dbo.T WHERE x >= ? ORDER BY x", (i,)).x, i)
+        self.assertEqual(self.db.cursor_hits, hits + 2)
+        self.db.fetchone("SELECT 1 AS a")
+        self.db.fetchone("SELECT 2 AS a")
+        self.assertEqual(len(self.db._cursors), 2)
+        # fetchone дочитал выборку — на файле база не держит снимок чтения
+        self.db.execute("UPDATE dbo.T SET x = x + 1")
+        self.db.commit()
+
+    def test_prepare_handle(self):
+        stmt = self.db.prepare("SELECT COUNT(*) AS cnt FROM dbo.T WHERE x < ?")
+        self.assertIs(self.db.prepare("SELECT COUNT(*) AS cnt FROM dbo.T WHERE x < ?"), stmt)
+        self.assertEqual([stmt.fetchone((n,)).cnt for n in (3, 5)], [3, 5])
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.prepare("SELECT nope FROM dbo.T").fetchall()
+        self.assertEqual(stmt.fetchall((1,))[0].cnt, 1)
+
+class _FakeWidget:
+    def after(self, ms, fn):
+        pass
+
+class TestTaskRunner(unittest.TestCase):
+    def _runner(self):
+        pool = ConnectionPool(min_size=0, max_size=2, connect=MagicMock)
+        return TaskRunner(_FakeWidget(), pool, max_workers=2)
+
+    def _wait(self, fut):
+        fut.result(timeout=2)
+        time.sleep(0.01)   # done-callback кладёт результат в очередь
+
+    def test_result_delivered_on_drain(self):
+        runner = self._runner()
+        got = []
+        self._wait(runner.submit("k", lambda db: 42, got.append))
+        self.assertEqual(got, [])          # до опроса из главного потока — ничего
+        runner._drain()
+        self.assertEqual(got, [42])
+        self.assertFalse(runner.busy)
+        runner.close()
+
+    def test_superseded_result_dropped(self):
+        runner = self._runner()
+        got = []
+        gate = threading.Event()
+        first = runner.submit("k", lambda db: gate.wait(2) and "old", got.append)
+        second = runner.submit("k", lambda db: "new", got.append)
+        gate.set()
+        self._wait(first); self._wait(second)
+        runner._drain()
+        self.assertEqual(got, ["new"])
+        runner.close()
+
+    def test_writes_not_superseded(self):
+        runner = self._runner()
+        got = []
+        gate = threading.Event()
+        first = runner.submit("w", lambda db: gate.wait(2) and 1, got.append, supersede=False)
+        second = runner.submit("w", lambda db: 2, got.append, supersede=False)
+        runner.cancel("w")                 # записи не отменяются и по ключу
+        gate.set()
+        self._wait(first); self._wait(second)
+        runner._drain()
+        self.assertEqual(sorted(got), [1, 2])
+        self.assertFalse(runner.busy)
+        runner.close()
+
+    def test_error_goes_to_handler(self):
+        runner = self._runner()
+        errors = []
+        def boom(db):
+            raise ValueError("x")
+        fut = runner.submit("k", boom, on_error=errors.append)
+        with self.assertRaises(ValueError):
+            fut.result(timeout=2)
+        time.sleep(0.01)
+        runner._drain()
+        self.assertIsInstance(errors[0], ValueError)
+        runner.close()
+
+class _FakeTree:
+    def __init__(self):
+        self.order, self.values, self.calls = [], {}, 0
+    def configure(self, **kw): pass
+    def get_children(self): return tuple(self.order)
+    def insert(self, parent, index, iid, values):
+        self.calls += 1; self.order.append(iid); self.values[iid] = values
+    def delete(self, *iids):
+        self.calls += 1
+        for i in iids:
+            self.order.remove(i); del self.values[i]
+    def item(self, iid, values):
+        self.calls += 1; self.values[iid] = values
+    def move(self, iid, parent, index):
+        self.calls += 1; self.order.remove(iid); self.order.insert(index, iid)
+
+class TestPagedTree(unittest.TestCase):
+    def test_plan_diff(self):
+        ins, upd, dele = plan_diff({"1": ("a",), "2": ("b",)}, [("2", ("B",)), ("3", ("c",))])
+        self.assertEqual((ins, upd, dele), (["3"], ["2"], ["1"]))
+
+    def test_apply_touches_only_changes(self):
+        tree = _FakeTree()
+        view = PagedTree(tree, lambda r: r[0], lambda r: r)
+        view.apply([(1, "a"), (2, "b"), (3, "c")])
+        tree.calls = 0
+        self.assertEqual(view.apply([(1, "a"), (2, "B"), (3, "c")]), (0, 1, 0))
+        self.assertEqual(tree.calls, 1)
+        view.apply([(3, "c"), (1, "a"), (4, "d")])
+        self.assertEqual(tree.order, ["3", "1", "4"])
+        self.assertEqual(tree.values["4"], ("4", "d"))
+
+    def test_pages_appended_on_scroll(self):
+        tree = _FakeTree()
+        data = [(i, f"r{i}") for i in range(5)]
+        view = PagedTree(tree, lambda r: r[0], lambda r: r, page_size=2,
+                         fetch=lambda off, lim, cb, err: cb(data[off:off + lim]))
+        view.reload()
+        self.assertEqual(len(view), 2)
+        view._on_scroll("0.0", "1.0")
+        view._on_scroll("0.0", "1.0")
+        view._on_scroll("0.0", "1.0")
+        self.assertEqual(tree.order, [str(i) for i in range(5)])
+        view.reload()   # перечитывает весь загруженный объём
+        self.assertEqual(len(view), 5)
+
+    def test_failed_fetch_does_not_freeze(self):
+        tree = _FakeTree()
+        data = [(i, f"r{i}") for i in range(5)]
+        fail = [True]
+
+        def fetch(off, lim, cb, err):
+            if fail[0]:
+                err(ConnectionError("нет связи"))
+            else:
+                cb(data[off:off + lim])
+        view = PagedTree(tree, lambda r: r[0], lambda r: r, page_size=2, fetch=fetch)
+        view.reload()
+        self.assertEqual(len(view), 0)
+        fail[0] = False
+        view.reload()
+        self.assertEqual(len(view), 2)
+
+        def broken(off, lim, cb, err):
+            raise RuntimeError("x")
+        view.fetch = broken
+        with self.assertRaises(RuntimeError):
+            view.load_more()
+        view.fetch = fetch
+        view.load_more()
+        self.assertEqual(len(view), 4)
+
+    def test_bookings_page_sql(self):
+        db = MagicMock()
+        db.fetchall.return_value = []
+        s = datetime(2025, 1, 1)
+        list_bookings_page(db, s, s + timedelta(days=1), offset=200, limit=100, sort="res",
+                           descending=True, status="APPROVED", requested_by="iv_")
+        sql, params = db.fetchall.call_args[0]
+        self.assertIn("ORDER BY r.DisplayName DESC, b.BookingID DESC", sql)
+        self.assertIn("OFFSET ? ROWS FETCH NEXT ? ROWS ONLY", sql)
+        self.assertIn("u.Login LIKE ? ESCAPE '\\'", sql)
+        self.assertEqual(params[2:], ("APPROVED", "%iv\\_%", 200, 100))
+        with self.assertRaises(ValueError):
+            list_bookings_page(db, s, s, sort="1; DROP TABLE x")
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,11 +1,11 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from services.auth_service import login
+from services.auth_service import login_pooled
 
 class LoginWindow(ttk.Frame):
-    def __init__(self, master, db, on_login):
+    def __init__(self, master, runner, on_login):
         super().__init__(master, padding=12)
-        self.db = db
+        self.runner = runner
         self.on_login = on_login
 
         ttk.Label(self, text="OfficeBankIS", font=("Segoe UI", 16, "bold")).pack(pady=(0, 10))
@@ -19,7 +19,8 @@ class LoginWindow(ttk.Frame):
         ttk.Label(self, text="Пароль").pack(anchor="w")
         ttk.Entry(self, textvariable=self.var_pass, width=30, show="*").pack(fill="x", pady=(0,10))
 
-        ttk.Button(self, text="Войти", command=self._do_login).pack()
+        self.btn = ttk.Button(self, text="Войти", command=self._do_login)
+        self.btn.pack()
 
     def _do_login(self):
         lg = self.var_login.get().strip()
@@ -27,8 +28,19 @@ class LoginWindow(ttk.Frame):
         if not lg or not pw:
             messagebox.showwarning("Вход", "Введите логин и пароль.")
             return
-        user = login(self.db, lg, pw)
+        # bcrypt и запрос — в рабочем потоке, окно остаётся отзывчивым
+        self.btn.state(["disabled"])
+        pool = self.runner.pool
+        self.runner.submit("login", lambda: login_pooled(pool, lg, pw), self._logged_in,
+                           on_error=self._login_failed, use_db=False)
+
+    def _logged_in(self, user):
+        self.btn.state(["!disabled"])
         if not user:
             messagebox.showerror("Вход", "Неверный логин или пароль.")
             return
         self.on_login(user)
+
+    def _login_failed(self, ex):
+        self.btn.state(["!disabled"])
+        messagebox.showerror("Вход", str(ex))
@@ -6,31 +6,53 @@ import pandas as pd
 
 from services.resource_service import list_resources
 from services.booking_service import (
-    create_booking, list_bookings_for_period, cancel_booking,
-    list_pending_approvals, decide_approval
+    create_booking, create_recurring_booking, list_bookings_page, cancel_booking,
+    list_pending_approvals, decide_approvals, changes_since
 )
+from services.interval_index import get_index
+from services.notifications import list_notifications, mark_read, unread_count
 from services.common import is_facility_or_admin
 from services.analytics_service import bookings_df, utilization_by_day, top_resources
+from services.analytics_cache import AnalyticsCache
+from services.analytics_rollups import (
+    refresh_rollups, load_rollups, utilization_from_rollups, top_resources_from_rollups
+)
+from services.occupancy_cube import build_cube, resources_frame
+from ui.paged_tree import PagedTree
 from reports.report_service import save_csv, save_util_chart, save_docx_summary
+import config
 
 class MainWindow(ttk.Frame):
-    def __init__(self, master, db, user):
+    def __init__(self, master, runner, user):
         super().__init__(master, padding=8)
-        self.db = db
+        self.runner = runner
         self.user = user
-        ttk.Label(self, text=f"{user.full_name} ({user.login}) роли: {', '.join(sorted(user.roles))}",
-                  font=("Segoe UI", 10, "bold")).pack(anchor="w", pady=(0,6))
+        top=ttk.Frame(self); top.pack(fill="x", pady=(0,6))
+        ttk.Label(top, text=f"{user.full_name} ({user.login}) роли: {', '.join(sorted(user.roles))}",
+                  font=("Segoe UI", 10, "bold")).pack(side="left")
+        self.busy_bar = ttk.Progressbar(top, mode="indeterminate", length=120)
+        self.busy_lbl = ttk.Label(top, text="")
+        self.busy_bar.pack(side="right")
+        self.busy_lbl.pack(side="right", padx=6)
+        self.btn_notify = ttk.Button(top, text="Уведомления", command=self._show_notifications)
+        self.btn_notify.pack(side="right", padx=6)
+        self.runner.add_busy_listener(self._on_busy)
 
         self.nb = ttk.Notebook(self)
         self.nb.pack(fill="both", expand=True)
 
         self.util_df = pd.DataFrame()
         self.top_df = pd.DataFrame()
+        self.cube = None
+        self.analytics_cache = AnalyticsCache() if getattr(config, "ANALYTICS_CACHE_ENABLED", False) else None
 
         self._tab_resources()
         self._tab_booking()
         self._tab_approvals()
         self._tab_analytics()
+        self._poll_unread()
+        self.changes_token = None
+        self._poll_changes()
 
     def _tab_resources(self):
         tab = ttk.Frame(self.nb, padding=8)
@@ -42,16 +64,86 @@ class MainWindow(ttk.Frame):
         for c,t,w in heads:
             self.tree.heading(c,text=t); self.tree.column(c,width=w,anchor="w")
         self.tree.pack(fill="both", expand=True)
+        self.res_view = PagedTree(self.tree, lambda r: r.resource_id, self._resource_values)
         ttk.Button(tab, text="Обновить", command=self._refresh_resources).pack(anchor="w", pady=6)
         self._refresh_resources()
 
+    def _on_busy(self, busy: bool):
+        if busy:
+            self.busy_lbl.config(text="Загрузка…"); self.busy_bar.start(12)
+        else:
+            self.busy_lbl.config(text=""); self.busy_bar.stop()
+
+    def _poll_unread(self):
+        # счётчик берётся из памяти (services.notifications.unread), в БД — раз в NOTIFY_UNREAD_TTL_SEC
+        if not self.winfo_exists():
+            return
+        self._refresh_unread()
+        self.after(int(getattr(config, "UI_NOTIFY_POLL_SEC", 5) * 1000), self._poll_unread)
+
+    def _refresh_unread(self):
+        uid=self.user.user_id
+        self.runner.submit("unread", lambda db: unread_count(db, uid), self._show_unread,
+                           on_error=lambda ex: None, quiet=True)
+
+    def _poll_changes(self):
+        # лента изменений: перечитываем видимые страницы, только если задето показанное
+        if not self.winfo_exists():
+            return
+        token=self.changes_token
+
+        def poll(db):
+            changes = changes_since(db, token)
+            index = get_index()
+            if index is not None and not changes.reset:
+                index.apply_changes(changes.bookings)
+            return changes
+        self.runner.submit("changes", poll, self._apply_changes, on_error=lambda ex: None, quiet=True)
+        self.after(int(getattr(config, "UI_CHANGES_POLL_SEC", 10) * 1000), self._poll_changes)
+
+    def _apply_changes(self, changes):
+        self.changes_token = changes.token
+        if changes.bookings:
+            try:
+                days=int(self.v_days.get())
+            except ValueError:
+                days=0
+            start=datetime.now()
+            end=start+timedelta(days=days)
+            if any(r.StartAt < end and r.EndAt > start for r in changes.bookings):
+                self._refresh_bookings()
+        uid=self.user.user_id
+        if is_facility_or_admin(self.user.roles) and any(int(r.ApproverUserID) == uid for r in changes.approvals):
+            self._refresh_approvals()
+
+    def _show_unread(self, n: int):
+        self.btn_notify.config(text=f"Уведомления ({n})" if n else "Уведомления")
+
+    def _show_notifications(self):
+        uid=self.user.user_id
+
+        def load(db):
+            rows = list_notifications(db, uid)
+            mark_read(db, uid, [int(r.NotificationID) for r in rows])
+            return rows
+        self.runner.submit("notifications", load, self._notifications_loaded, supersede=False)
+
+    def _notifications_loaded(self, rows):
+        self._refresh_unread()
+        if not rows:
+            messagebox.showinfo("Уведомления", "Новых уведомлений нет.")
+            return
+        messagebox.showinfo("Уведомления", "\n".join(f"{str(r.CreatedAt)[:16]}  {r.Message}" for r in rows))
+
     def _refresh_resources(self):
-        for i in self.tree.get_children(): self.tree.delete(i)
-        for r in list_resources(self.db):
-            kind = "Переговорная" if r.kind=="R" else "Раб. место"
-            self.tree.insert("", "end", values=(r.resource_id, kind, r.display_name, r.zone_name,
-                                                r.floor_no or "", r.status_code, r.capacity or "",
-                                                ("да" if r.is_hotdesk else "нет") if r.is_hotdesk is not None else ""))
+        self.runner.submit("resources", list_resources, self.res_view.apply)
+
+    @staticmethod
+    def _resource_values(r):
+        kind = "Переговорная" if r.kind=="R" else "Раб. место"
+        return (r.resource_id, kind, r.display_name, r.zone_name,
+                r.floor_no or "", r.status_code, r.capacity or "",
+                ("да" if r.is_hotdesk else "нет") if r.is_hotdesk is not None else "")
 
     def _tab_booking(self):
         tab = ttk.Frame(self.nb, padding=8)
@@ -66,6 +158,7 @@ class MainWindow(ttk.Frame):
         self.v_title=tk.StringVar()
         self.v_notes=tk.StringVar()
         self.v_part=tk.StringVar()
+        self.v_rule=tk.StringVar()
 
         row1=ttk.Frame(form); row1.pack(fill="x", pady=3)
         ttk.Label(row1,text="ResourceID").pack(side="left")
@@ -80,6 +173,8 @@ class MainWindow(ttk.Frame):
         ttk.Entry(row2,textvariable=self.v_title,width=40).pack(side="left", padx=6)
         ttk.Label(row2,text="Участников").pack(side="left")
         ttk.Entry(row2,textvariable=self.v_part,width=6).pack(side="left", padx=6)
+        ttk.Label(row2,text="Повтор (FREQ=WEEKLY;COUNT=13)").pack(side="left")
+        ttk.Entry(row2,textvariable=self.v_rule,width=26).pack(side="left", padx=6)
 
         row3=ttk.Frame(form); row3.pack(fill="x", pady=3)
         ttk.Label(row3,text="Комментарий").pack(side="left")
@@ -93,15 +188,33 @@ class MainWindow(ttk.Frame):
         self.v_days=tk.StringVar(value="7")
         ttk.Label(top,text="Дней").pack(side="left")
         ttk.Entry(top,textvariable=self.v_days,width=6).pack(side="left", padx=6)
-        ttk.Button(top,text="Показать", command=self._refresh_bookings).pack(side="left", padx=6)
+        ttk.Button(top,text="Показать", command=self._show_period).pack(side="left", padx=6)
         ttk.Button(top,text="Отменить выбранную", command=self._cancel_booking).pack(side="left", padx=6)
 
+        flt=ttk.Frame(lf); flt.pack(fill="x", pady=(4,0))
+        self.vf_res=tk.StringVar(); self.vf_status=tk.StringVar(); self.vf_by=tk.StringVar()
+        ttk.Label(flt,text="Ресурс").pack(side="left")
+        ttk.Entry(flt,textvariable=self.vf_res,width=18).pack(side="left", padx=6)
+        ttk.Label(flt,text="Статус").pack(side="left")
+        ttk.Combobox(flt,textvariable=self.vf_status,width=12, state="readonly",
+                     values=("","PENDING","APPROVED","REJECTED","CANCELLED")).pack(side="left", padx=6)
+        ttk.Label(flt,text="Кто").pack(side="left")
+        ttk.Entry(flt,textvariable=self.vf_by,width=14).pack(side="left", padx=6)
+        ttk.Button(flt,text="Фильтр", command=self._show_period).pack(side="left", padx=6)
+
+        body=ttk.Frame(lf); body.pack(fill="both", expand=True)
         cols=("id","res","kind","start","end","status","by")
-        self.tree_b = ttk.Treeview(lf, columns=cols, show="headings", height=10)
+        self.tree_b = ttk.Treeview(body, columns=cols, show="headings", height=10)
         for c,t,w in [("id","BookingID",80),("res","Ресурс",220),("kind","Тип",90),
                       ("start","Начало",140),("end","Оконч.",140),("status","Статус",90),("by","Кто",90)]:
-            self.tree_b.heading(c,text=t); self.tree_b.column(c,width=w,anchor="w")
-        self.tree_b.pack(fill="both", expand=True)
+            self.tree_b.heading(c,text=t, command=lambda c=c: self._sort_bookings(c))
+            self.tree_b.column(c,width=w,anchor="w")
+        sb=ttk.Scrollbar(body, orient="vertical")
+        sb.pack(side="right", fill="y")
+        self.tree_b.pack(side="left", fill="both", expand=True)
+        self.b_sort, self.b_desc = "start", False
+        self.b_view = PagedTree(self.tree_b, lambda r: int(r.BookingID), self._booking_values,
+                                fetch=self._fetch_bookings, scrollbar=sb)
 
         now=datetime.now().replace(second=0, microsecond=0)
         self.v_s.set(now.strftime("%Y-%m-%d %H:%M"))
@@ -119,21 +232,63 @@ class MainWindow(ttk.Frame):
             notes=self.v_notes.get().strip()
             part=self.v_part.get().strip()
             participants=int(part) if part else None
-            res=create_booking(self.db, rid, self.user.user_id, s, e, title, notes, participants)
-            (messagebox.showinfo if res.ok else messagebox.showwarning)("Бронирование", res.message)
-            if res.ok: self._refresh_bookings()
         except Exception as ex:
             messagebox.showerror("Ошибка", str(ex))
+            return
+        uid=self.user.user_id
+        rule=self.v_rule.get().strip()
+        if rule:
+            self.runner.submit("create_booking",
+                               lambda db: create_recurring_booking(db, rid, uid, s, e, rule, title, notes, participants),
+                               self._booking_created, supersede=False)
+            return
+        self.runner.submit("create_booking",
+                           lambda db: create_booking(db, rid, uid, s, e, title, notes, participants),
+                           self._booking_created, supersede=False)
+
+    def _booking_created(self, res):
+        msg=res.message
+        if getattr(res, "results", None):
+            failed=[f"{n+1}: {r.message}" for n, r in enumerate(res.results) if not r.ok][:5]
+            if failed: msg+="\n"+"\n".join(failed)
+        (messagebox.showinfo if res.ok else messagebox.showwarning)("Бронирование", msg)
+        if res.ok: self._refresh_bookings()
 
     def _refresh_bookings(self):
-        for i in self.tree_b.get_children(): self.tree_b.delete(i)
-        days=int(self.v_days.get())
+        # обновить уже показанные страницы, не сбрасывая прокрутку
+        self.b_view.reload()
+
+    def _show_period(self):
+        self.b_view.reset()
+
+    def _sort_bookings(self, col):
+        self.b_desc = (not self.b_desc) if col == self.b_sort else False
+        self.b_sort = col
+        self.b_view.reset()
+
+    def _fetch_bookings(self, offset, limit, on_rows, on_error):
+        try:
+            days=int(self.v_days.get())
+        except ValueError:
+            on_error(None)
+            messagebox.showwarning("Брони","Укажите число дней.")
+            return
         start=datetime.now()
         end=start+timedelta(days=days)
-        for r in list_bookings_for_period(self.db, start, end):
-            kind="Переговорная" if str(r.ResourceKind)=="R" else "Раб. место"
-            self.tree_b.insert("", "end", values=(int(r.BookingID), str(r.DisplayName), kind,
-                                                 str(r.StartAt)[:16], str(r.EndAt)[:16], str(r.StatusCode), str(r.RequestedBy)))
+        kw=dict(offset=offset, limit=limit, sort=self.b_sort, descending=self.b_desc,
+                resource=self.vf_res.get().strip() or None, status=self.vf_status.get() or None,
+                requested_by=self.vf_by.get().strip() or None)
+
+        def failed(ex):
+            on_error(ex)
+            messagebox.showerror("Ошибка", str(ex))
+        self.runner.submit("bookings", lambda db: list_bookings_page(db, start, end, **kw), on_rows, failed)
+
+    @staticmethod
+    def _booking_values(r):
+        kind="Переговорная" if str(r.ResourceKind)=="R" else "Раб. место"
+        return (int(r.BookingID), str(r.DisplayName), kind,
+                str(r.StartAt)[:16], str(r.EndAt)[:16], str(r.StatusCode), str(r.RequestedBy))
 
     def _cancel_booking(self):
         sel=self.tree_b.selection()
@@ -142,8 +297,9 @@ class MainWindow(ttk.Frame):
             return
         bid=int(self.tree_b.item(sel[0],"values")[0])
         if messagebox.askyesno("Отмена", f"Отменить бронь #{bid}?"):
-            cancel_booking(self.db, bid)
-            self._refresh_bookings()
+            uid=self.user.user_id
+            self.runner.submit("cancel_booking", lambda db: cancel_booking(db, bid, uid),
+                               lambda _: self._refresh_bookings(), supersede=False)
 
     def _tab_approvals(self):
         tab = ttk.Frame(self.nb, padding=8)
@@ -151,11 +307,12 @@ class MainWindow(ttk.Frame):
         ttk.Label(tab, text="Только FAC/ADM").pack(anchor="w")
 
         cols=("aid","bid","res","start","end","by","status")
-        self.tree_a = ttk.Treeview(tab, columns=cols, show="headings", height=12)
+        self.tree_a = ttk.Treeview(tab, columns=cols, show="headings", height=12, selectmode="extended")
         for c,t,w in [("aid","ApprovalID",90),("bid","BookingID",90),("res","Ресурс",240),
                       ("start","Начало",140),("end","Оконч.",140),("by","Кто",90),("status","Статус",90)]:
             self.tree_a.heading(c,text=t); self.tree_a.column(c,width=w,anchor="w")
         self.tree_a.pack(fill="both", expand=True, pady=6)
+        self.appr_view = PagedTree(self.tree_a, lambda r: int(r.ApprovalID), self._approval_values)
 
         btn=ttk.Frame(tab); btn.pack(fill="x")
         ttk.Button(btn,text="Обновить", command=self._refresh_approvals).pack(side="left")
@@ -165,12 +322,16 @@ class MainWindow(ttk.Frame):
         self._refresh_approvals()
 
     def _refresh_approvals(self):
-        for i in self.tree_a.get_children(): self.tree_a.delete(i)
         if not is_facility_or_admin(self.user.roles):
+            self.appr_view.apply([])
             return
-        for r in list_pending_approvals(self.db, self.user.user_id):
-            self.tree_a.insert("", "end", values=(int(r.ApprovalID), int(r.BookingID), str(r.DisplayName),
-                                                 str(r.StartAt)[:16], str(r.EndAt)[:16], str(r.RequestedBy), str(r.ApprovalStatus)))
+        uid=self.user.user_id
+        self.runner.submit("approvals", lambda db: list_pending_approvals(db, uid), self.appr_view.apply)
+
+    @staticmethod
+    def _approval_values(r):
+        return (int(r.ApprovalID), int(r.BookingID), str(r.DisplayName),
+                str(r.StartAt)[:16], str(r.EndAt)[:16], str(r.RequestedBy), str(r.ApprovalStatus))
 
     def _decide(self, approve: bool):
         if not is_facility_or_admin(self.user.roles):
@@ -178,10 +339,19 @@ class MainWindow(ttk.Frame):
             return
         sel=self.tree_a.selection()
         if not sel:
-            messagebox.showwarning("Согласования","Выберите заявку.")
+            messagebox.showwarning("Согласования","Выберите заявки.")
             return
-        aid=int(self.tree_a.item(sel[0],"values")[0])
-        decide_approval(self.db, aid, approve)
+        aids=[int(self.tree_a.item(i,"values")[0]) for i in sel]
+        uid=self.user.user_id
+        self.runner.submit("decide_approvals", lambda db: decide_approvals(db, aids, approve, uid), self._decided,
+                           supersede=False)
+
+    def _decided(self, res):
+        if res.conflicts or res.skipped:
+            text = res.message
+            if res.conflicts:
+                text += "\nApprovalID: " + ", ".join(map(str, res.conflicts))
+            messagebox.showinfo("Согласования", text)
         self._refresh_approvals()
         self._refresh_bookings()
 
@@ -210,20 +380,43 @@ class MainWindow(ttk.Frame):
         self.txt=tk.Text(tab, height=14); self.txt.pack(fill="both", expand=True, pady=8)
 
     def _calc(self):
-        s=self._parse_dt(self.va_s.get()); e=self._parse_dt(self.va_e.get())
-        df=bookings_df(self.db, s, e)
-        self.util_df=utilization_by_day(df, s, e)
-        self.top_df=top_resources(df, 10)
+        try:
+            s=self._parse_dt(self.va_s.get()); e=self._parse_dt(self.va_e.get())
+        except ValueError as ex:
+            messagebox.showerror("Ошибка", str(ex))
+            return
+        cache=self.analytics_cache
+        self.runner.submit("analytics", lambda db: self._compute_analytics(db, s, e, cache), self._show_analytics)
+
+    @staticmethod
+    def _compute_analytics(db, s, e, cache):
+        # выполняется в рабочем потоке: только БД и pandas, без виджетов
+        if getattr(config, "ANALYTICS_USE_ROLLUPS", False) and (e - s).days >= config.ANALYTICS_ROLLUP_MIN_DAYS:
+            # длинный период — из дневных агрегатов, без чтения сырых броней
+            refresh_rollups(db)
+            roll=load_rollups(db, s.date(), e.date())
+            return (utilization_from_rollups(roll, s, e), top_resources_from_rollups(roll, 10), None,
+                    "Источник: дневные агрегаты (по целым дням)")
+        df=bookings_df(db, s, e, cache=cache)
+        cube=build_cube(df, s, e, resources_frame(list_resources(db)))
+        return (utilization_by_day(df, s, e), top_resources(df, 10), cube,
+                f"Броней (APPROVED/PENDING): {len(df)}")
+
+    def _show_analytics(self, result):
+        self.util_df, self.top_df, self.cube, header = result
         self.txt.delete("1.0","end")
-        self.txt.insert("end", f"Броней (APPROVED/PENDING): {len(df)}\n\n")
+        self.txt.insert("end", header+"\n\n")
         self.txt.insert("end", self.util_df.to_string(index=False)+"\n\n")
         self.txt.insert("end", self.top_df.to_string(index=False))
+        if self.cube is not None:
+            self.txt.insert("end", "\n\n"+self.cube.rollup(["Floor","Zone"]).to_string(index=False))
 
     def _export_csv(self):
         path=filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV","*.csv")])
         if not path: return
-        save_csv(self.util_df, Path(path))
-        messagebox.showinfo("Экспорт","CSV сохранён.")
+        util_df=self.util_df
+        self.runner.submit("export_csv", lambda: save_csv(util_df, Path(path)),
+                           lambda _: messagebox.showinfo("Экспорт","CSV сохранён."), use_db=False, supersede=False)
 
     def _export_docx(self):
         out=filedialog.asksaveasfilename(defaultextension=".docx", filetypes=[("DOCX","*.docx")])
@@ -231,6 +424,12 @@ class MainWindow(ttk.Frame):
         s=self._parse_dt(self.va_s.get()); e=self._parse_dt(self.va_e.get())
         outp=Path(out)
         png=outp.with_suffix(".png")
-        save_util_chart(self.util_df, png)
-        save_docx_summary(s, e, self.util_df, self.top_df, png, outp)
-        messagebox.showinfo("Отчёт","DOCX сформирован.")
+        util_df, top_df, cube = self.util_df, self.top_df, self.cube
+
+        def build():
+            save_util_chart(util_df, png)
+            save_docx_summary(s, e, util_df, top_df, png, outp, cube)
+
+        self.runner.submit("export_docx", build,
+                           lambda _: messagebox.showinfo("Отчёт","DOCX сформирован."), use_db=False,
+                           supersede=False)
@@ -0,0 +1,124 @@
+from typing import Any, Callable, Hashable, Iterable, Optional, Sequence
+from tkinter import ttk
+import config
+
+# Treeview, который не перестраивается целиком.
+# apply() сравнивает новый набор строк с показанным по ключу (BookingID и т.п.)
+# и делает только insert/item/delete/move для изменившихся строк.
+# Если задан fetch, строки подгружаются страницами: первая — при reload(),
+# следующие — когда прокрутка подходит к концу уже загруженного.
+
+def plan_diff(old: dict[str, tuple], new: Sequence[tuple[str, tuple]]) -> tuple[list[str], list[str], list[str]]:
+    # (добавить, обновить, удалить) по ключам
+    keys = {k for k, _ in new}
+    inserts = [k for k, _ in new if k not in old]
+    updates = [k for k, v in new if k in old and old[k] != v]
+    deletes = [k for k in old if k not in keys]
+    return inserts, updates, deletes
+
+class PagedTree:
+    def __init__(
+        self,
+        tree: ttk.Treeview,
+        row_key: Callable[[Any], Hashable],
+        row_values: Callable[[Any], Iterable[Any]],
+        fetch: Optional[Callable[[int, int, Callable[[list], None], Callable[[Optional[BaseException]], None]],
+                                 None]] = None,
+        page_size: Optional[int] = None,
+        scrollbar: Optional[ttk.Scrollbar] = None,
+        prefetch_at: float = 0.9,
+    ):
+        # fetch(offset, limit, on_rows, on_error) запускает загрузку страницы и вызывает в главном
+        # потоке on_rows или — при ошибке или отказе от загрузки — on_error(ex или None)
+        self.tree = tree
+        self.row_key = row_key
+        self.row_values = row_values
+        self.fetch = fetch
+        self.page_size = page_size or getattr(config, "UI_PAGE_SIZE", 200)
+        self.scrollbar = scrollbar
+        self.prefetch_at = prefetch_at
+        self._values: dict[str, tuple] = {}
+        self._rows: list = []
+        self._has_more = False
+        self._loading = False
+        if scrollbar is not None:
+            scrollbar.configure(command=tree.yview)
+        tree.configure(yscrollcommand=self._on_scroll)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def rows(self) -> list:
+        return list(self._rows)
+
+    def apply(self, rows: Sequence[Any]) -> tuple[int, int, int]:
+        new = [(str(self.row_key(r)), tuple(str(v) for v in self.row_values(r))) for r in rows]
+        inserts, updates, deletes = plan_diff(self._values, new)
+        tree = self.tree
+        values = dict(new)
+        if deletes:
+            tree.delete(*deletes)
+        for iid in updates:
+            tree.item(iid, values=values[iid])
+        for iid in inserts:
+            tree.insert("", "end", iid=iid, values=values[iid])
+        # порядок: двигаем только начиная с первого расхождения
+        order = [k for k, _ in new]
+        current = tree.get_children()
+        for pos, iid in enumerate(order):
+            if pos >= len(current) or current[pos] != iid:
+                for p in range(pos, len(order)):
+                    tree.move(order[p], "", p)
+                break
+        self._values = values
+        self._rows = list(rows)
+        return len(inserts), len(updates), len(deletes)
+
+    def reload(self) -> None:
+        # перечитываем уже загруженный объём, чтобы прокрутка не сбрасывалась
+        if self.fetch is None:
+            return
+        limit = max(self.page_size, len(self._rows))
+        self._start(0, limit, lambda rows: self._on_reload(rows, limit))
+
+    def reset(self) -> None:
+        # новая сортировка/фильтр: начинаем с первой страницы
+        self._has_more = False
+        self.apply([])
+        self.tree.yview_moveto(0)
+        self.reload()
+
+    def _on_reload(self, rows: list, limit: int) -> None:
+        self._loading = False
+        self._has_more = len(rows) >= limit
+        self.apply(rows)
+
+    def _on_page(self, rows: list) -> None:
+        self._loading = False
+        self._has_more = len(rows) >= self.page_size
+        known = {str(self.row_key(r)) for r in self._rows}
+        self.apply(self._rows + [r for r in rows if str(self.row_key(r)) not in known])
+
+    def load_more(self) -> None:
+        if self.fetch is None or self._loading or not self._has_more:
+            return
+        self._start(len(self._rows), self.page_size, self._on_page)
+
+    def _start(self, offset: int, limit: int, on_rows: Callable[[list], None]) -> None:
+        self._loading = True
+        try:
+            self.fetch(offset, limit, on_rows, self._on_error)
+        except BaseException:
+            self._loading = False
+            raise
+
+    def _on_error(self, ex: Optional[BaseException] = None) -> None:
+        # страница не пришла: следующая прокрутка или reload() попробуют снова
+        self._loading = False
+
+    def _on_scroll(self, first: str, last: str) -> None:
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if float(last) >= self.prefetch_at:
+            self.load_more()
@@ -0,0 +1,127 @@
+import queue
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from tkinter import messagebox
+from typing import Any, Callable, Optional
+from db import ConnectionPool, query_stats
+import config
+
+# Фоновое выполнение запросов и отчётов для Tk.
+# Задача работает в пуле потоков на своём соединении из ConnectionPool,
+# результат возвращается в главный поток через очередь, которую опрашивает after().
+# Задачи с одинаковым ключом вытесняют друг друга: не начатая отменяется,
+# а результат уже запущенной просто отбрасывается. Это только для чтения:
+# записи отправляются с supersede=False — выполняются все, результат каждой доходит.
+class TaskRunner:
+    def __init__(self, widget, pool: ConnectionPool, max_workers: Optional[int] = None, poll_ms: int = 30):
+        self.widget = widget
+        self.pool = pool
+        self.poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(max_workers or getattr(config, "UI_WORKERS", 4),
+                                            thread_name_prefix="ui-task")
+        self._results: queue.SimpleQueue = queue.SimpleQueue()
+        self._generation: dict[str, int] = {}
+        self._pending: dict[str, Future] = {}
+        self._busy = 0
+        self._busy_listeners: list[Callable[[bool], None]] = []
+        self._closed = False
+        self.widget.after(self.poll_ms, self._poll)
+
+    def submit(
+        self,
+        key: str,
+        fn: Callable[..., Any],
+        on_done: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[BaseException], None]] = None,
+        use_db: bool = True,
+        quiet: bool = False,
+        supersede: bool = True,
+    ) -> Future:
+        # fn(db) при use_db=True, иначе fn(); quiet — фоновый опрос без индикатора занятости;
+        # supersede=False — запись: не вытесняет и не вытесняется, ключ — только для query_stats
+        gen = None
+        if supersede:
+            gen = self._generation.get(key, 0) + 1
+            self._generation[key] = gen
+            prev = self._pending.get(key)
+            if prev is not None:
+                prev.cancel()
+
+        def run():
+            # ключ задачи — логическая операция для query_stats
+            with query_stats.operation(key):
+                if not use_db:
+                    return fn()
+                with self.pool.lease() as db:
+                    return fn(db)
+
+        fut = self._executor.submit(run)
+        if supersede:
+            self._pending[key] = fut
+        busy = 0 if quiet else 1
+        self._set_busy(+busy)
+        fut.add_done_callback(lambda f: self._results.put((key, gen, f, on_done, on_error, busy)))
+        return fut
+
+    def cancel(self, key: str) -> None:
+        # результат уже запущенной задачи тоже будет отброшен
+        self._generation[key] = self._generation.get(key, 0) + 1
+        fut = self._pending.pop(key, None)
+        if fut is not None:
+            fut.cancel()
+
+    def add_busy_listener(self, fn: Callable[[bool], None]) -> None:
+        self._busy_listeners.append(fn)
+        fn(self._busy > 0)
+
+    @property
+    def busy(self) -> bool:
+        return self._busy > 0
+
+    def _set_busy(self, delta: int) -> None:
+        was = self._busy > 0
+        self._busy += delta
+        if was != (self._busy > 0):
+            for fn in list(self._busy_listeners):
+                try:
+                    fn(self._busy > 0)
+                except Exception:
+                    self._busy_listeners.remove(fn)   # виджет уже уничтожен
+
+    def _poll(self) -> None:
+        if self._closed:
+            return
+        try:
+            self._drain()
+        finally:
+            self.widget.after(self.poll_ms, self._poll)
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                key, gen, fut, on_done, on_error, busy = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._set_busy(-busy)
+            if self._pending.get(key) is fut:
+                del self._pending[key]
+            if (gen is not None and gen != self._generation.get(key)) or fut.cancelled():
+                continue
+            try:
+                result = fut.result()
+            except CancelledError:
+                continue
+            except BaseException as ex:
+                (on_error or self._show_error)(ex)
+                continue
+            if on_done is not None:
+                try:
+                    on_done(result)
+                except Exception as ex:
+                    self._show_error(ex)
+
+    def _show_error(self, ex: BaseException) -> None:
+        messagebox.showerror("Ошибка", str(ex))
+
+    def close(self) -> None:
+        self._closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)